@@ -1,6 +1,6 @@
 import asyncio
 import os
-from adaptive_llm_router.llm import invoke
+from adaptive_llm_router.llm import invoke, invoke_many
 
 # Mock litellm because we don't have API keys in the test environment
 # and we are not testing litellm itself, but the router logic.
@@ -65,6 +65,13 @@ async def main():
     response4 = await invoke(prompt4, meta4)
     print(f"Response: {response4}")
 
+    # Test Case 5: Batched Invocation
+    print("\n--- Test Case 5: Batched Invocation ---")
+    prompts5 = [f"Categorize transaction #{i}." for i in range(3)]
+    meta5 = {"agent_name": "test_agent"}
+    async for index, response5 in invoke_many(prompts5, meta5):
+        print(f"Response {index}: {response5}")
+
     print("\n--- Adaptive LLM Router Example Complete ---")
 
 if __name__ == "__main__":
@@ -2,30 +2,84 @@
 Hard-stop gate that returns BudgetExceededError or forces downgrade when the monthly cap is reached.
 """
 
-from .config import MONTHLY_BUDGET_CAP
+import calendar
+import itertools
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Deque, Dict, Optional, Tuple
+
+from .config import (
+    BUDGET_BURN_SAMPLE_INTERVAL_SECONDS,
+    BUDGET_BURN_WINDOW_SECONDS,
+    BUDGET_DOWNGRADE_FORECAST_RATIO,
+    MONTHLY_BUDGET_CAP,
+)
 from .usage_ledger import UsageLedger, usage_ledger
 
 class BudgetExceededError(Exception):
     """Custom exception for when the budget is exceeded."""
     pass
 
+@dataclass
+class BudgetReservation:
+    """Estimated cost held against the budget while a call is in flight."""
+    id: int
+    amount: float
+
 class BudgetManager:
     """
     Manages the LLM budget by checking usage against a monthly cap.
+
+    Calls reserve their estimated cost before they start, so concurrent calls
+    cannot all pass the check and overshoot the cap together. A reservation
+    is released once the call's real cost is in the ledger (or it failed).
+    The manager also forecasts month-end spend from the current burn rate so
+    routing can downgrade to cheaper models before the cap is reached.
     """
-    def __init__(self, monthly_cap: float, ledger: UsageLedger):
+    def __init__(
+        self,
+        monthly_cap: float,
+        ledger: UsageLedger,
+        burn_window_seconds: float = BUDGET_BURN_WINDOW_SECONDS,
+        downgrade_ratio: float = BUDGET_DOWNGRADE_FORECAST_RATIO,
+        sample_interval: float = BUDGET_BURN_SAMPLE_INTERVAL_SECONDS,
+    ):
         self.monthly_cap = monthly_cap
         self.ledger = ledger
+        self.burn_window_seconds = burn_window_seconds
+        self.downgrade_ratio = downgrade_ratio
+        self.sample_interval = sample_interval
+        self._lock = threading.Lock()
+        self._reservations: Dict[int, BudgetReservation] = {}
+        self._reserved = 0.0
+        self._ids = itertools.count(1)
+        self._spend_samples: Deque[Tuple[float, float]] = deque()
+
+    @property
+    def reserved(self) -> float:
+        """Total cost currently held by in-flight reservations."""
+        return self._reserved
+
+    def committed_spend(self) -> float:
+        """Spend recorded in the ledger this month plus outstanding reservations."""
+        return self.ledger.get_total_cost_for_current_month() + self._reserved
+
+    def headroom(self) -> float:
+        """USD that can still be reserved before the cap is reached."""
+        return max(0.0, self.monthly_cap - self.committed_spend())
 
     def get_remaining_budget_percentage(self) -> float:
         """
-        Calculates the percentage of the budget that remains.
+        Calculates the percentage of the budget that remains, counting
+        in-flight reservations as spent.
         """
         if self.monthly_cap <= 0:
             return 0.0
 
-        current_spend = self.ledger.get_total_cost_for_current_month()
-        remaining = self.monthly_cap - current_spend
+        remaining = self.monthly_cap - self.committed_spend()
 
         if remaining <= 0:
             return 0.0
@@ -45,5 +99,79 @@ class BudgetManager:
         if self.is_budget_exceeded():
             raise BudgetExceededError(f"Monthly budget of ${self.monthly_cap} has been exceeded.")
 
+    def reserve(self, amount: float) -> BudgetReservation:
+        """
+        Atomically holds `amount` USD against the budget.
+        Raises a BudgetExceededError if it does not fit under the cap.
+        """
+        spend = self.ledger.get_total_cost_for_current_month()
+        with self._lock:
+            if spend + self._reserved + amount > self.monthly_cap:
+                raise BudgetExceededError(
+                    f"Reserving ${amount:.4f} would exceed the monthly budget of ${self.monthly_cap}."
+                )
+            reservation = BudgetReservation(next(self._ids), amount)
+            self._reservations[reservation.id] = reservation
+            self._reserved += amount
+            return reservation
+
+    def release(self, reservation: BudgetReservation):
+        """Drops a reservation; releasing one twice is a no-op."""
+        with self._lock:
+            if self._reservations.pop(reservation.id, None) is not None:
+                self._reserved = max(0.0, self._reserved - reservation.amount)
+
+    def reconcile(self, reservation: BudgetReservation, actual_cost: float) -> float:
+        """
+        Releases a reservation once the call's real cost has been written to
+        the ledger. Returns how far the estimate was off (actual - reserved).
+        """
+        self.release(reservation)
+        return actual_cost - reservation.amount
+
+    def burn_rate(self, now: Optional[float] = None) -> float:
+        """
+        Returns the spend rate in USD per second: the larger of the
+        month-to-date average and the rate over the trailing burn window.
+        Both are measured over at least the burn window, so a few cents
+        spent in the first minutes of a month do not project to the cap.
+        At most one spend sample is kept per `sample_interval`.
+        """
+        now = time.time() if now is None else now
+        spend = self.ledger.get_total_cost_for_current_month()
+        current = datetime.fromtimestamp(now)
+        elapsed = now - datetime(current.year, current.month, 1).timestamp()
+        month_rate = spend / max(elapsed, self.burn_window_seconds)
+
+        with self._lock:
+            if self._spend_samples and spend < self._spend_samples[-1][1]:
+                # A new month started; earlier samples no longer apply.
+                self._spend_samples.clear()
+            if not self._spend_samples or now - self._spend_samples[-1][0] >= self.sample_interval:
+                self._spend_samples.append((now, spend))
+            # Keep one sample at or before the window start to measure from.
+            while len(self._spend_samples) > 1 and self._spend_samples[1][0] <= now - self.burn_window_seconds:
+                self._spend_samples.popleft()
+            oldest_ts, oldest_spend = self._spend_samples[0]
+
+        if now - oldest_ts < self.burn_window_seconds:
+            # Too little history for a trailing rate; short bursts would dominate it.
+            return month_rate
+        return max(month_rate, (spend - oldest_spend) / (now - oldest_ts))
+
+    def forecast_month_end_spend(self, now: Optional[float] = None) -> float:
+        """Projects this month's total spend if the current burn rate continues."""
+        now = time.time() if now is None else now
+        current = datetime.fromtimestamp(now)
+        days = calendar.monthrange(current.year, current.month)[1]
+        month_end = datetime(current.year, current.month, days, 23, 59, 59).timestamp()
+        return self.committed_spend() + self.burn_rate(now) * max(0.0, month_end - now)
+
+    def should_downgrade(self) -> bool:
+        """True when the forecast says the cap will be reached before month end."""
+        if self.monthly_cap <= 0:
+            return True
+        return self.forecast_month_end_spend() > self.monthly_cap * self.downgrade_ratio
+
 # Initialize a default budget manager instance
 budget_manager = BudgetManager(MONTHLY_BUDGET_CAP, usage_ledger)
@@ -0,0 +1,252 @@
+"""
+Keyed circuit breakers for LLM providers and other external APIs.
+
+Each dependency (an LLM provider/model, DigitalOcean, Cloudflare, ...) gets
+its own breaker, so one failing upstream does not stop calls to the others.
+A breaker opens when the failure rate over a rolling window crosses a
+threshold, rejects calls while open, and after a cool-down lets a limited
+number of probe calls through (half-open). It closes once the probes
+succeed and reopens as soon as one fails. The router skips providers whose
+breaker is rejecting calls.
+"""
+
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Deque, Dict, List, Optional
+
+from .config import (
+    CIRCUIT_BREAKER_FAILURE_RATE,
+    CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+    CIRCUIT_BREAKER_MIN_REQUESTS,
+    CIRCUIT_BREAKER_OPEN_SECONDS,
+    CIRCUIT_BREAKER_WINDOW_SECONDS,
+)
+from .data_models import LLMProvider
+from .metrics import MetricsRegistry, metrics_registry
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpenError(Exception):
+    """Raised when a call is rejected because the dependency's breaker is open."""
+    pass
+
+@dataclass
+class BreakerSnapshot:
+    """A point-in-time view of one breaker."""
+    state: str
+    requests: int
+    failure_rate: float
+    opened_count: int
+
+class CircuitBreaker:
+    """
+    Failure-rate circuit breaker. Outcomes are counted in one-second buckets
+    covering the last `window_seconds`, so recording is O(1) and old
+    failures age out on their own. Callers ask `allow()` before a call and
+    then report exactly one of `record_success`, `record_failure` or
+    `release` (for calls that ended without a verdict, e.g. cancelled).
+    """
+    def __init__(
+        self,
+        window_seconds: float = CIRCUIT_BREAKER_WINDOW_SECONDS,
+        min_requests: int = CIRCUIT_BREAKER_MIN_REQUESTS,
+        failure_rate: float = CIRCUIT_BREAKER_FAILURE_RATE,
+        open_seconds: float = CIRCUIT_BREAKER_OPEN_SECONDS,
+        half_open_probes: int = CIRCUIT_BREAKER_HALF_OPEN_PROBES,
+    ):
+        self.window_seconds = window_seconds
+        self.min_requests = min_requests
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = half_open_probes
+        self.opened_count = 0
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        # [second, successes, failures] per bucket, oldest first
+        self._buckets: Deque[List[int]] = deque()
+        self._successes = 0
+        self._failures = 0
+        self._lock = threading.Lock()
+
+    def _prune(self, now: float):
+        cutoff = int(now - self.window_seconds)
+        while self._buckets and self._buckets[0][0] <= cutoff:
+            _, successes, failures = self._buckets.popleft()
+            self._successes -= successes
+            self._failures -= failures
+
+    def _count(self, now: float, ok: bool):
+        second = int(now)
+        if not self._buckets or self._buckets[-1][0] != second:
+            self._buckets.append([second, 0, 0])
+        if ok:
+            self._buckets[-1][1] += 1
+            self._successes += 1
+        else:
+            self._buckets[-1][2] += 1
+            self._failures += 1
+        self._prune(now)
+
+    def _refresh(self, now: float):
+        if self._state == OPEN and now - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+
+    def _open(self, now: float):
+        self._state = OPEN
+        self._opened_at = now
+        self.opened_count += 1
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            self._refresh(time.monotonic())
+            return self._state
+
+    def is_available(self) -> bool:
+        """Whether a call would currently be allowed, without claiming a probe."""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            return self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes
+
+    def allow(self) -> bool:
+        """Claims permission for one call (a probe slot while half-open)."""
+        with self._lock:
+            self._refresh(time.monotonic())
+            if self._state == CLOSED:
+                return True
+            if self._state == HALF_OPEN and self._probes_in_flight < self.half_open_probes:
+                self._probes_in_flight += 1
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+                self._probe_successes += 1
+                if self._probe_successes >= self.half_open_probes:
+                    self._state = CLOSED
+                    self._buckets.clear()
+                    self._successes = self._failures = 0
+                return
+            self._count(now, ok=True)
+
+    def record_failure(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == HALF_OPEN:
+                self._open(now)
+                return
+            self._count(now, ok=False)
+            if self._state != CLOSED:
+                return
+            total = self._successes + self._failures
+            if total >= self.min_requests and self._failures / total >= self.failure_rate:
+                self._open(now)
+
+    def release(self):
+        """Gives back a probe slot for a call that ended without a verdict."""
+        with self._lock:
+            if self._state == HALF_OPEN:
+                self._probes_in_flight = max(0, self._probes_in_flight - 1)
+
+    def snapshot(self) -> BreakerSnapshot:
+        with self._lock:
+            now = time.monotonic()
+            self._refresh(now)
+            self._prune(now)
+            total = self._successes + self._failures
+            return BreakerSnapshot(
+                state=self._state,
+                requests=total,
+                failure_rate=self._failures / total if total else 0.0,
+                opened_count=self.opened_count,
+            )
+
+class CircuitBreakerRegistry:
+    """
+    Creates and holds one breaker per dependency key. With a metrics
+    `registry`, each breaker's state and trip count are exported, labeled
+    by key.
+    """
+    def __init__(self, registry: Optional[MetricsRegistry] = None, **breaker_settings):
+        self.breaker_settings = breaker_settings
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        if registry is not None:
+            self._state = registry.gauge("circuit_breaker_state", "1 for the breaker's current state, else 0", ("key", "state"))
+            self._opened = registry.counter("circuit_breaker_opened_total", "Times the breaker opened", ("key",))
+
+    @staticmethod
+    def provider_key(provider: LLMProvider) -> str:
+        return f"llm:{provider.name}:{provider.model}"
+
+    def get(self, key: str) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is None:
+            with self._lock:
+                breaker = self._breakers.get(key)
+                if breaker is None:
+                    breaker = self._breakers[key] = CircuitBreaker(**self.breaker_settings)
+                    if self.registry is not None:
+                        self._export(key, breaker)
+        return breaker
+
+    def _export(self, key: str, breaker: CircuitBreaker):
+        for state in (CLOSED, OPEN, HALF_OPEN):
+            self._state.labels(key=key, state=state).set_function(lambda state=state: float(breaker.state == state))
+        self._opened.labels(key=key).set_function(lambda: breaker.opened_count)
+
+    def for_provider(self, provider: LLMProvider) -> CircuitBreaker:
+        return self.get(self.provider_key(provider))
+
+    def is_available(self, key: str) -> bool:
+        """Whether calls to `key` are currently allowed (unknown keys are)."""
+        breaker = self._breakers.get(key)
+        return breaker is None or breaker.is_available()
+
+    def provider_available(self, provider: LLMProvider) -> bool:
+        return self.is_available(self.provider_key(provider))
+
+    @asynccontextmanager
+    async def guard(self, key: str) -> AsyncIterator[CircuitBreaker]:
+        """
+        Runs the block as one call through `key`'s breaker: raises
+        CircuitOpenError if it is rejecting calls, and records the block's
+        outcome (an exception is a failure, cancellation is neither).
+        """
+        breaker = self.get(key)
+        if not breaker.allow():
+            raise CircuitOpenError(f"Circuit breaker for {key} is open")
+        try:
+            yield breaker
+        except asyncio.CancelledError:
+            breaker.release()
+            raise
+        except BaseException:
+            breaker.record_failure()
+            raise
+        breaker.record_success()
+
+    def snapshot(self) -> Dict[str, BreakerSnapshot]:
+        """Returns the state of every breaker created so far."""
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {key: breaker.snapshot() for key, breaker in breakers.items()}
+
+# Initialize the process-wide registry shared by the router and the agents
+circuit_breakers = CircuitBreakerRegistry(registry=metrics_registry)
@@ -4,3 +4,175 @@ Configuration for the Adaptive LLM Router.
 
 # The monthly budget cap for LLM usage in USD.
 MONTHLY_BUDGET_CAP = 20.00
+
+# Trailing window over which the budget guard measures the recent burn rate.
+BUDGET_BURN_WINDOW_SECONDS = 3600
+
+# Minimum spacing of the spend samples kept for the trailing burn rate, so the
+# sample history stays bounded however often routing asks for the rate.
+BUDGET_BURN_SAMPLE_INTERVAL_SECONDS = 1.0
+
+# Routing is downgraded to low-budget mode once the month-end spend forecast
+# exceeds this fraction of the monthly cap.
+BUDGET_DOWNGRADE_FORECAST_RATIO = 1.0
+
+# Number of usage ledger appends that may be batched before an fsync is forced.
+LEDGER_FSYNC_BATCH_SIZE = 32
+
+# Maximum number of seconds an appended ledger record may wait for an fsync.
+LEDGER_FSYNC_INTERVAL_SECONDS = 1.0
+
+# Number of recorded usage events between monthly spend checkpoints.
+SPEND_CHECKPOINT_INTERVAL_RECORDS = 100
+
+# Maximum number of seconds between monthly spend checkpoints.
+SPEND_CHECKPOINT_INTERVAL_SECONDS = 30.0
+
+# How often (in seconds) the provider registry checks providers.json for changes.
+PROVIDER_RELOAD_INTERVAL_SECONDS = 5.0
+
+# Cost tiers by blended (input + output) USD cost per 1k tokens, cheapest first.
+PROVIDER_COST_TIERS = [
+    ("free", 0.0),
+    ("low", 0.001),
+    ("medium", 0.005),
+    ("high", float("inf")),
+]
+
+# Maximum number of responses held by the router's response cache.
+RESPONSE_CACHE_MAX_ENTRIES = 5000
+
+# How long (in seconds) a cached response stays valid.
+RESPONSE_CACHE_TTL_SECONDS = 24 * 60 * 60
+
+# Request meta flags that change the response and are therefore part of the cache key.
+RESPONSE_CACHE_KEY_META_FLAGS = ["quality"]
+
+# Whether near-identical prompts may be served from the cache (MinHash similarity tier).
+RESPONSE_CACHE_SIMILARITY_ENABLED = False
+
+# Minimum estimated Jaccard similarity for a similarity-tier hit.
+RESPONSE_CACHE_SIMILARITY_THRESHOLD = 0.9
+
+# Maximum number of concurrent requests per provider issued by invoke_many.
+INVOKE_MANY_CONCURRENCY_PER_PROVIDER = 4
+
+# Window (in seconds) over which live provider statistics are kept.
+PROVIDER_STATS_WINDOW_SECONDS = 300.0
+
+# Smoothing factor for the per-provider EWMA latency.
+PROVIDER_STATS_EWMA_ALPHA = 0.2
+
+# Minimum samples in the window before live statistics override declared values.
+PROVIDER_STATS_MIN_SAMPLES = 5
+
+# A provider is demoted while its windowed error rate is at least this high...
+PROVIDER_DEMOTION_ERROR_RATE = 0.5
+
+# ...or while its p95 latency exceeds its declared latency by this factor.
+PROVIDER_DEMOTION_LATENCY_FACTOR = 3.0
+
+# Minimum provider quality considered for the balanced default and for high-quality requests.
+BALANCED_MIN_QUALITY = 0.75
+HIGH_QUALITY_MIN_QUALITY = 0.85
+
+# Minimum context window for requests routed as long-context.
+LONG_CONTEXT_MIN_WINDOW = 100000
+
+# Provider names reserved for confidential requests (never used for other traffic).
+CONFIDENTIAL_PROVIDER_NAMES = ["localai"]
+
+# Scoring weights used to rank eligible providers, per routing mode.
+POLICY_SCORE_WEIGHTS = {
+    "balanced": {"quality": 0.4, "cost": 0.3, "latency": 0.3},
+    "quality": {"quality": 0.7, "cost": 0.1, "latency": 0.2},
+    "long_context": {"quality": 0.4, "cost": 0.3, "latency": 0.3},
+    "low_budget": {"quality": 0.1, "cost": 0.8, "latency": 0.1},
+    "confidential": {"quality": 0.4, "cost": 0.2, "latency": 0.4},
+}
+
+# Number of ranked providers invoke may try before giving up on a request.
+FALLBACK_CHAIN_LENGTH = 3
+
+# Whether invoke races the next provider in the chain against one that is
+# slower than its p95 latency. Can be overridden per request with meta["hedge"].
+HEDGING_ENABLED = False
+
+# Prompts estimated above this many input tokens are routed as long-context.
+LONG_CONTEXT_TOKEN_THRESHOLD = 8000
+
+# Average UTF-8 bytes per token used by the cheap token estimate.
+TOKEN_ESTIMATE_BYTES_PER_TOKEN = 4.0
+
+# Relative error assumed for the cheap estimate; prompts whose estimate is
+# within this margin of a routing threshold are counted exactly.
+TOKEN_ESTIMATE_MARGIN = 0.3
+
+# Number of exact prompt token counts kept in the estimator's LRU.
+TOKEN_ESTIMATE_CACHE_SIZE = 1024
+
+# Prompts at least this long are tokenized in a worker thread.
+TOKEN_ESTIMATE_OFFLOAD_BYTES = 64 * 1024
+
+# Longest a request may queue for a provider's rate limits or concurrency
+# slots before it fails over to the next provider in the chain.
+RATE_LIMIT_MAX_WAIT_SECONDS = 30.0
+
+# Analytics event pipeline: events are queued in memory (up to
+# EVENT_PIPELINE_MAX_QUEUE) and sent by a background thread in batches of
+# EVENT_PIPELINE_BATCH_SIZE, or every EVENT_PIPELINE_FLUSH_INTERVAL_SECONDS.
+EVENT_PIPELINE_MAX_QUEUE = 10000
+EVENT_PIPELINE_BATCH_SIZE = 100
+EVENT_PIPELINE_FLUSH_INTERVAL_SECONDS = 1.0
+
+# What capture does when the queue is full: "drop_oldest", "drop_newest",
+# or "block" (waits up to EVENT_PIPELINE_BLOCK_TIMEOUT_SECONDS, then drops).
+EVENT_PIPELINE_OVERFLOW_POLICY = "drop_oldest"
+EVENT_PIPELINE_BLOCK_TIMEOUT_SECONDS = 0.1
+
+# Batches that cannot be delivered are spooled to disk, up to this many bytes,
+# and retried with exponential backoff capped at the given delay.
+EVENT_PIPELINE_MAX_SPOOL_BYTES = 50 * 1024 * 1024
+EVENT_PIPELINE_MAX_BACKOFF_SECONDS = 60.0
+EVENT_PIPELINE_HTTP_TIMEOUT_SECONDS = 5.0
+
+# Finished trace spans are buffered and written to a trace file once this
+# many have accumulated (and at exit).
+TRACE_BUFFER_MAX_SPANS = 10000
+
+# Shared HTTP connection pool for provider calls: total and per-host
+# connection caps, idle keep-alive connections kept (and for how long), and
+# consecutive transport errors to one host before the pool is replaced.
+HTTP_POOL_MAX_CONNECTIONS = 100
+HTTP_POOL_MAX_CONNECTIONS_PER_HOST = 20
+HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS = 20
+HTTP_POOL_KEEPALIVE_EXPIRY_SECONDS = 30.0
+HTTP_POOL_CONNECT_TIMEOUT_SECONDS = 10.0
+HTTP_POOL_UNHEALTHY_AFTER_ERRORS = 3
+
+# Version of the routing policy and provider catalog. It is part of agents'
+# response cache keys; bump it when a change should stop old cached answers
+# from being served.
+ROUTING_POLICY_VERSION = 1
+
+# Circuit breakers (per provider/model and per external API): a breaker opens
+# when at least CIRCUIT_BREAKER_FAILURE_RATE of the calls in the last
+# CIRCUIT_BREAKER_WINDOW_SECONDS failed (given at least
+# CIRCUIT_BREAKER_MIN_REQUESTS calls), stays open for
+# CIRCUIT_BREAKER_OPEN_SECONDS, then lets CIRCUIT_BREAKER_HALF_OPEN_PROBES probe
+# calls through and closes once they all succeed.
+CIRCUIT_BREAKER_WINDOW_SECONDS = 60.0
+CIRCUIT_BREAKER_MIN_REQUESTS = 10
+CIRCUIT_BREAKER_FAILURE_RATE = 0.5
+CIRCUIT_BREAKER_OPEN_SECONDS = 30.0
+CIRCUIT_BREAKER_HALF_OPEN_PROBES = 3
+
+# Metrics registry: counters and histograms keep METRICS_WINDOW_SLOTS ring-buffer
+# slots covering the last METRICS_WINDOW_SECONDS, for sliding-window rates and
+# recent percentiles. Histograms split every power of two into
+# METRICS_HISTOGRAM_SUB_BUCKETS buckets; quantiles are within 1/(2 * that) of
+# the true value. METRICS_QUANTILES are the percentiles exported.
+METRICS_WINDOW_SECONDS = 60.0
+METRICS_WINDOW_SLOTS = 12
+METRICS_HISTOGRAM_SUB_BUCKETS = 64
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
@@ -17,6 +17,11 @@ class LLMProvider(BaseModel):
     max_context: int = Field(..., description="Maximum context window size in tokens")
     latency_ms: int = Field(..., description="Expected latency in milliseconds")
     endpoint_env: str = Field(..., description="Environment variable for the API key")
+    quality: float = Field(0.5, description="Relative response quality from 0 (worst) to 1 (best)")
+    batch_size: Optional[int] = Field(None, description="Max prompts per batch request, if the provider accepts batches")
+    requests_per_minute: Optional[int] = Field(None, description="Request rate limit, if the provider enforces one")
+    tokens_per_minute: Optional[int] = Field(None, description="Input plus output token rate limit, if the provider enforces one")
+    max_concurrency: Optional[int] = Field(None, description="Max requests in flight at once, if limited")
 
 class LLMUsage(BaseModel):
     """
@@ -30,7 +35,7 @@ class LLMUsage(BaseModel):
     cost: float
     task_id: Optional[str] = None
     agent: Optional[str] = None
-    status: Union[str, None] = "ok" # "ok", "fallback", "error"
+    status: Union[str, None] = "ok" # "ok", "fallback", "hedged", "hedge_cancelled", "error", "cache_hit", "coalesced", "cancelled", "rate_limited", "circuit_open"
 
 class Settings(BaseModel):
     """
@@ -0,0 +1,324 @@
+"""
+Process-wide, batched analytics event pipeline.
+
+`EventPipeline.capture` has the same shape as `posthog.capture`, but only
+appends the event to a bounded in-memory queue; a background thread sends
+events to the sink in batches. Callers never wait on analytics I/O. Batches
+the sink rejects are spooled to local JSON-lines files and replayed once it
+is reachable again.
+"""
+
+import atexit
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from .config import (
+    EVENT_PIPELINE_BATCH_SIZE,
+    EVENT_PIPELINE_BLOCK_TIMEOUT_SECONDS,
+    EVENT_PIPELINE_FLUSH_INTERVAL_SECONDS,
+    EVENT_PIPELINE_HTTP_TIMEOUT_SECONDS,
+    EVENT_PIPELINE_MAX_BACKOFF_SECONDS,
+    EVENT_PIPELINE_MAX_QUEUE,
+    EVENT_PIPELINE_MAX_SPOOL_BYTES,
+    EVENT_PIPELINE_OVERFLOW_POLICY,
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_POSTHOG_HOST = "https://us.i.posthog.com"
+OVERFLOW_POLICIES = ("drop_oldest", "drop_newest", "block")
+
+class PostHogBatchSink:
+    """Sends batches of events to PostHog's `/batch/` endpoint."""
+    def __init__(
+        self,
+        api_key: str,
+        host: str = DEFAULT_POSTHOG_HOST,
+        timeout: float = EVENT_PIPELINE_HTTP_TIMEOUT_SECONDS,
+    ):
+        self.api_key = api_key
+        self.host = host.rstrip("/")
+        self.timeout = timeout
+
+    def send(self, events: List[Dict[str, Any]]):
+        """Posts one batch; raises on any network or HTTP error."""
+        import urllib.request
+
+        body = json.dumps({"api_key": self.api_key, "batch": events}).encode("utf-8")
+        request = urllib.request.Request(
+            f"{self.host}/batch/",
+            data=body,
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+@dataclass
+class PipelineStats:
+    """Counters describing what happened to captured events."""
+    captured: int = 0
+    sent: int = 0
+    dropped: int = 0
+    spooled: int = 0
+    replayed: int = 0
+    send_failures: int = 0
+
+class EventPipeline:
+    """
+    Bounded queue plus a background flusher shared by everything that emits
+    analytics events.
+
+    The flusher sends a batch as soon as `batch_size` events are queued, or
+    every `flush_interval` seconds otherwise. When the queue is full the
+    overflow policy decides which event is lost. When the sink fails, the
+    batch is spooled to `spool_dir` and sends are paused with exponential
+    backoff; spooled batches are replayed, oldest first, once a send
+    succeeds again. Without a sink (no API key configured) capture is a no-op.
+    Producers that buffer events themselves register a flush hook, which
+    runs on shutdown before the queue is drained.
+    """
+    # Spool files replayed per flush, so a large backlog does not starve live events.
+    REPLAY_FILES_PER_FLUSH = 4
+
+    def __init__(
+        self,
+        sink: Optional[Any] = None,
+        max_queue: int = EVENT_PIPELINE_MAX_QUEUE,
+        batch_size: int = EVENT_PIPELINE_BATCH_SIZE,
+        flush_interval: float = EVENT_PIPELINE_FLUSH_INTERVAL_SECONDS,
+        overflow_policy: str = EVENT_PIPELINE_OVERFLOW_POLICY,
+        block_timeout: float = EVENT_PIPELINE_BLOCK_TIMEOUT_SECONDS,
+        spool_dir: Optional[Path] = None,
+        max_spool_bytes: int = EVENT_PIPELINE_MAX_SPOOL_BYTES,
+        max_backoff: float = EVENT_PIPELINE_MAX_BACKOFF_SECONDS,
+    ):
+        if overflow_policy not in OVERFLOW_POLICIES:
+            raise ValueError(f"Unknown overflow policy '{overflow_policy}'; use one of {OVERFLOW_POLICIES}.")
+        self.sink = sink
+        self.max_queue = max_queue
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.overflow_policy = overflow_policy
+        self.block_timeout = block_timeout
+        self.spool_dir = spool_dir
+        self.max_spool_bytes = max_spool_bytes
+        self.max_backoff = max_backoff
+        self.stats = PipelineStats()
+        self._queue: Deque[Dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._stopping = False
+        self._flush_requested = False
+        self._in_progress = 0
+        self._backoff = 0.0
+        self._backoff_until = 0.0
+        self._spool_bytes: Optional[int] = None
+        self._atexit_registered = False
+        self._flush_hooks: List[Callable[[], None]] = []
+
+    def configure(self, api_key: Optional[str], host: str = DEFAULT_POSTHOG_HOST):
+        """Points the pipeline at a PostHog project (None disables sending)."""
+        self.sink = PostHogBatchSink(api_key, host) if api_key else None
+
+    def capture(
+        self,
+        distinct_id: str,
+        event: str,
+        properties: Optional[Dict[str, Any]] = None,
+        timestamp: Optional[datetime] = None,
+    ) -> bool:
+        """
+        Queues an event without waiting for it to be sent. Returns False if
+        the event was dropped (no sink, or the queue was full).
+        """
+        if self.sink is None:
+            return False
+        item = {
+            "event": event,
+            "distinct_id": distinct_id,
+            "properties": properties or {},
+            "timestamp": (timestamp or datetime.now(timezone.utc)).isoformat(),
+        }
+        with self._cond:
+            if len(self._queue) >= self.max_queue:
+                if self.overflow_policy == "block":
+                    self._cond.wait_for(lambda: len(self._queue) < self.max_queue, timeout=self.block_timeout)
+                if len(self._queue) >= self.max_queue:
+                    if self.overflow_policy != "drop_oldest":
+                        self.stats.dropped += 1
+                        return False
+                    self._queue.popleft()
+                    self.stats.dropped += 1
+            self._queue.append(item)
+            self.stats.captured += 1
+            if len(self._queue) >= self.batch_size:
+                self._cond.notify_all()
+        self._ensure_thread()
+        return True
+
+    def pending(self) -> int:
+        """Returns the number of events queued or being sent."""
+        with self._cond:
+            return len(self._queue) + self._in_progress
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Asks the flusher to send everything queued and waits for it.
+        Returns True if the queue drained within `timeout` seconds.
+        """
+        if self._thread is None:
+            return not self._queue
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            return self._cond.wait_for(lambda: not self._queue and not self._in_progress, timeout=timeout)
+
+    def add_flush_hook(self, hook: Callable[[], None]):
+        """Registers a callable that captures a producer's buffered events at shutdown."""
+        with self._cond:
+            self._flush_hooks.append(hook)
+            self._register_atexit()
+
+    def shutdown(self, timeout: float = 5.0):
+        """Runs the flush hooks, sends what is queued and stops the flusher thread."""
+        for hook in list(self._flush_hooks):
+            try:
+                hook()
+            except Exception as e:
+                logger.warning(f"Event pipeline flush hook failed: {e}")
+        thread = self._thread
+        if thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        thread.join(timeout)
+
+    def _ensure_thread(self):
+        if self._thread is not None:
+            return
+        with self._cond:
+            if self._thread is not None:
+                return
+            self._stopping = False
+            self._thread = threading.Thread(target=self._run, name="event-pipeline", daemon=True)
+            self._thread.start()
+            self._register_atexit()
+
+    def _register_atexit(self):
+        if not self._atexit_registered:
+            self._atexit_registered = True
+            atexit.register(self.shutdown)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(
+                    lambda: self._stopping or self._flush_requested or len(self._queue) >= self.batch_size,
+                    timeout=self.flush_interval,
+                )
+                batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+                self._in_progress = len(batch)
+                if not self._queue:
+                    self._flush_requested = False
+                done = self._stopping and not self._queue
+
+            try:
+                if batch:
+                    self._deliver(batch)
+                else:
+                    self._replay_spool()
+            except Exception as e:
+                logger.warning(f"Event pipeline flush failed: {e}")
+
+            with self._cond:
+                self._in_progress = 0
+                self._cond.notify_all()
+                if done:
+                    self._thread = None
+                    return
+
+    def _deliver(self, batch: List[Dict[str, Any]]):
+        if time.monotonic() < self._backoff_until or self.sink is None:
+            self._spool(batch)
+            return
+        try:
+            self.sink.send(batch)
+        except Exception as e:
+            self._on_send_failure(e)
+            self._spool(batch)
+            return
+        self._backoff = 0.0
+        self.stats.sent += len(batch)
+        self._replay_spool()
+
+    def _on_send_failure(self, error: Exception):
+        self.stats.send_failures += 1
+        self._backoff = min(self.max_backoff, max(self.flush_interval, self._backoff * 2))
+        self._backoff_until = time.monotonic() + self._backoff
+        logger.warning(f"Event sink unavailable, retrying in {self._backoff:.1f}s: {error}")
+
+    def _spool_files(self) -> List[Path]:
+        if not self.spool_dir or not self.spool_dir.exists():
+            return []
+        return sorted(self.spool_dir.glob("events-*.jsonl"))
+
+    def _spool(self, batch: List[Dict[str, Any]]):
+        if not self.spool_dir:
+            self.stats.dropped += len(batch)
+            return
+        if self._spool_bytes is None:
+            self._spool_bytes = sum(path.stat().st_size for path in self._spool_files())
+        data = "".join(json.dumps(event, separators=(",", ":")) + "\n" for event in batch).encode("utf-8")
+        if self._spool_bytes + len(data) > self.max_spool_bytes:
+            self.stats.dropped += len(batch)
+            return
+        self.spool_dir.mkdir(parents=True, exist_ok=True)
+        name = f"events-{time.time_ns():020d}-{os.getpid()}.jsonl"
+        tmp_path = self.spool_dir / f".{name}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self.spool_dir / name)
+        self._spool_bytes += len(data)
+        self.stats.spooled += len(batch)
+
+    def _replay_spool(self):
+        if time.monotonic() < self._backoff_until or self.sink is None:
+            return
+        for path in self._spool_files()[:self.REPLAY_FILES_PER_FLUSH]:
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    events = [json.loads(line) for line in f if line.strip()]
+            except (OSError, json.JSONDecodeError) as e:
+                logger.warning(f"Discarding unreadable event spool file {path}: {e}")
+                path.unlink(missing_ok=True)
+                continue
+            try:
+                self.sink.send(events)
+            except Exception as e:
+                self._on_send_failure(e)
+                return
+            size = path.stat().st_size
+            path.unlink()
+            if self._spool_bytes is not None:
+                self._spool_bytes = max(0, self._spool_bytes - size)
+            self.stats.replayed += len(events)
+
+def _sink_from_env() -> Optional[PostHogBatchSink]:
+    api_key = os.getenv("POSTHOG_API_KEY")
+    if not api_key:
+        return None
+    return PostHogBatchSink(api_key, os.getenv("POSTHOG_HOST", DEFAULT_POSTHOG_HOST))
+
+# Initialize the process-wide pipeline; the flusher thread starts on first capture
+event_spool_path = Path(__file__).parent / "event_spool"
+event_pipeline = EventPipeline(_sink_from_env(), spool_dir=event_spool_path)
@@ -0,0 +1,192 @@
+"""
+Process-wide pooled HTTP transport for LLM provider calls.
+
+Unless it is handed a client, litellm can end up opening fresh connections,
+and paying a fresh TLS handshake, for its calls. HTTPClientPool keeps one
+httpx.AsyncClient, plus one httpx.Client for batch calls made from worker
+threads, and the router installs them once as litellm's client sessions.
+asyncio connections are bound to the loop that opened them, so the async
+client routes each request to a connection pool owned by the running loop.
+That pool keeps connections alive, speaks HTTP/2 when the `h2` package is
+installed, caps connections per host, expires idle connections, and is
+replaced after repeated transport errors to a host.
+"""
+
+import asyncio
+import importlib.util
+import logging
+import threading
+import weakref
+from typing import Any, Callable, Dict, Optional
+
+import httpx
+
+from .config import (
+    HTTP_POOL_CONNECT_TIMEOUT_SECONDS,
+    HTTP_POOL_KEEPALIVE_EXPIRY_SECONDS,
+    HTTP_POOL_MAX_CONNECTIONS,
+    HTTP_POOL_MAX_CONNECTIONS_PER_HOST,
+    HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+    HTTP_POOL_UNHEALTHY_AFTER_ERRORS,
+)
+
+logger = logging.getLogger(__name__)
+
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None
+
+# litellm applies its own per-request timeouts; these only bound what it does not.
+_TIMEOUT = httpx.Timeout(600.0, connect=HTTP_POOL_CONNECT_TIMEOUT_SECONDS)
+
+def _limits() -> httpx.Limits:
+    return httpx.Limits(
+        max_connections=HTTP_POOL_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_POOL_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_POOL_KEEPALIVE_EXPIRY_SECONDS,
+    )
+
+class _ReleasingStream(httpx.AsyncByteStream):
+    """Response body that gives back its host slot when closed."""
+    def __init__(self, stream: httpx.AsyncByteStream, release: Callable[[], None]):
+        self._stream = stream
+        self._release = release
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self):
+        try:
+            await self._stream.aclose()
+        finally:
+            if not self._released:
+                self._released = True
+                self._release()
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    Connection-pooling transport with a per-host cap on concurrent requests.
+    A host's slot is held until the response body is closed, so streamed
+    responses count against the cap for as long as they are being read.
+    After `unhealthy_after` consecutive transport errors to one host the
+    transport marks itself unhealthy so the pool replaces it; it closes its
+    connections once the requests still using it have finished.
+    """
+    def __init__(
+        self,
+        max_per_host: int = HTTP_POOL_MAX_CONNECTIONS_PER_HOST,
+        unhealthy_after: int = HTTP_POOL_UNHEALTHY_AFTER_ERRORS,
+        http2: bool = HTTP2_AVAILABLE,
+    ):
+        self._inner = httpx.AsyncHTTPTransport(limits=_limits(), http2=http2)
+        self.max_per_host = max_per_host
+        self.unhealthy_after = unhealthy_after
+        self.unhealthy = False
+        self.in_flight = 0
+        self.errors: Dict[str, int] = {}
+        self._hosts: Dict[str, asyncio.Semaphore] = {}
+        self._retired = False
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        host = f"{request.url.scheme}://{request.url.netloc.decode('ascii')}"
+        semaphore = self._hosts.get(host)
+        if semaphore is None:
+            semaphore = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        await semaphore.acquire()
+        self.in_flight += 1
+
+        def release():
+            semaphore.release()
+            self.in_flight -= 1
+            if self._retired and self.in_flight == 0:
+                asyncio.get_running_loop().create_task(self._inner.aclose())
+
+        try:
+            response = await self._inner.handle_async_request(request)
+        except httpx.TransportError:
+            release()
+            self.errors[host] = self.errors.get(host, 0) + 1
+            if self.errors[host] >= self.unhealthy_after and not self.unhealthy:
+                self.unhealthy = True
+                logger.warning(f"Recycling HTTP connections after {self.errors[host]} errors talking to {host}")
+            raise
+        except BaseException:
+            release()
+            raise
+        self.errors.pop(host, None)
+        response.stream = _ReleasingStream(response.stream, release)
+        return response
+
+    def retire(self):
+        """Closes the connections once no request is using them."""
+        self._retired = True
+        if self.in_flight == 0:
+            asyncio.get_running_loop().create_task(self._inner.aclose())
+
+    async def aclose(self):
+        await self._inner.aclose()
+
+class _LoopTransport(httpx.AsyncBaseTransport):
+    """Sends each request through the pool's transport for the running loop."""
+    def __init__(self, pool: "HTTPClientPool"):
+        self._pool = pool
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self._pool.transport().handle_async_request(request)
+
+    async def aclose(self):
+        await self._pool.aclose()
+
+class HTTPClientPool:
+    """
+    Hands out the shared HTTP clients. The async client can be used from any
+    event loop; each running loop gets its own PooledTransport behind it.
+    """
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._transports: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PooledTransport]" = weakref.WeakKeyDictionary()
+        self._async_client: Optional[httpx.AsyncClient] = None
+        self._sync_client: Optional[httpx.Client] = None
+        self.recycled = 0
+
+    def client(self) -> httpx.AsyncClient:
+        """Returns the pooled async client, shared by every event loop."""
+        with self._lock:
+            if self._async_client is None:
+                self._async_client = httpx.AsyncClient(transport=_LoopTransport(self), timeout=_TIMEOUT)
+            return self._async_client
+
+    def transport(self) -> PooledTransport:
+        """Returns the running loop's transport, replacing it once it is unhealthy."""
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+        if transport is not None:
+            if not transport.unhealthy:
+                return transport
+            transport.retire()
+            self.recycled += 1
+        transport = self._transports[loop] = PooledTransport()
+        return transport
+
+    def sync_client(self) -> httpx.Client:
+        """Returns the pooled client for blocking calls; safe to share across threads."""
+        with self._lock:
+            if self._sync_client is None:
+                self._sync_client = httpx.Client(limits=_limits(), http2=HTTP2_AVAILABLE, timeout=_TIMEOUT)
+            return self._sync_client
+
+    def stats(self) -> Dict[str, Any]:
+        """Returns in-flight requests and recent error counts for the running loop's transport."""
+        transport = self._transports.get(asyncio.get_running_loop())
+        if transport is None:
+            return {"in_flight": 0, "errors": {}, "recycled": self.recycled}
+        return {"in_flight": transport.in_flight, "errors": dict(transport.errors), "recycled": self.recycled}
+
+    async def aclose(self):
+        """Closes the running loop's connections (new ones are opened on next use)."""
+        transport = self._transports.pop(asyncio.get_running_loop(), None)
+        if transport is not None:
+            await transport.aclose()
+
+# Initialize the process-wide pool; clients are created on first use
+http_pool = HTTPClientPool()
@@ -0,0 +1,291 @@
+"""
+Segmented, append-only storage engine behind the usage ledger.
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks
+    fcntl = None
+
+from .config import LEDGER_FSYNC_BATCH_SIZE, LEDGER_FSYNC_INTERVAL_SECONDS
+from .metrics import MetricsRegistry
+
+class LedgerStorage:
+    """
+    Stores usage records as JSON lines, one segment file per calendar month.
+
+    Each append is a single O_APPEND write of whole lines, so the cost of a
+    write does not depend on the size of the ledger and concurrent writers
+    (threads or processes) never clobber each other's records. Appends are
+    flushed to the OS immediately and fsync'd in batches: once
+    `fsync_batch_size` records are pending, or by a timer `fsync_interval`
+    seconds after the first unsynced append, and at interpreter exit. With a
+    metrics `registry`, the append and fsync counts are exported. `clock`
+    is the monotonic time source the fsync interval is measured with.
+    """
+    SEGMENT_PREFIX = "llm_usage-"
+    SEGMENT_SUFFIX = ".jsonl"
+    LEGACY_MARKER = ".legacy_imported"
+    LEGACY_LOCK = ".legacy_import.lock"
+
+    def __init__(
+        self,
+        segment_dir: Path,
+        fsync_batch_size: int = LEDGER_FSYNC_BATCH_SIZE,
+        fsync_interval: float = LEDGER_FSYNC_INTERVAL_SECONDS,
+        registry: Optional[MetricsRegistry] = None,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.segment_dir = segment_dir
+        self.clock = clock
+        self.fsync_batch_size = fsync_batch_size
+        self.fsync_interval = fsync_interval
+        self._lock = threading.Lock()
+        self._handles: Dict[str, Any] = {}
+        self._unsynced = 0
+        self._last_sync = clock()
+        self._sync_timer: Optional[threading.Timer] = None
+        self._atexit_registered = False
+        self.records_appended = 0
+        self.fsyncs = 0
+        if registry is not None:
+            appended = registry.counter("llm_ledger_records_appended_total", "Usage records appended to the ledger")
+            appended.labels().set_function(lambda: self.records_appended)
+            fsyncs = registry.counter("llm_ledger_fsyncs_total", "fsync calls on ledger segments")
+            fsyncs.labels().set_function(lambda: self.fsyncs)
+
+    @staticmethod
+    def segment_key_for(ts: datetime) -> str:
+        """Returns the segment key ("YYYY-MM") for a timestamp."""
+        return f"{ts.year:04d}-{ts.month:02d}"
+
+    @staticmethod
+    def _segment_key_for_record(record: Dict[str, Any]) -> str:
+        # Records carry ISO-8601 timestamps, so the month is the first 7 chars.
+        ts = record.get("ts")
+        if isinstance(ts, str) and len(ts) >= 7:
+            return ts[:7]
+        return LedgerStorage.segment_key_for(datetime.now())
+
+    def segment_path(self, segment_key: str) -> Path:
+        """Returns the path of the segment file for a given month."""
+        return self.segment_dir / f"{self.SEGMENT_PREFIX}{segment_key}{self.SEGMENT_SUFFIX}"
+
+    def list_segments(self) -> List[str]:
+        """Returns the keys of all segments on disk, oldest first."""
+        if not self.segment_dir.exists():
+            return []
+        keys = []
+        for path in self.segment_dir.glob(f"{self.SEGMENT_PREFIX}*{self.SEGMENT_SUFFIX}"):
+            keys.append(path.name[len(self.SEGMENT_PREFIX):-len(self.SEGMENT_SUFFIX)])
+        return sorted(keys)
+
+    def append(self, record: Dict[str, Any]):
+        """Appends a single record to the segment for its month."""
+        self.append_many([record])
+
+    def append_many(self, records: Iterable[Dict[str, Any]]):
+        """
+        Appends records, issuing one write per segment touched.
+        """
+        by_segment: Dict[str, List[bytes]] = {}
+        count = 0
+        for record in records:
+            line = json.dumps(record, separators=(",", ":")) + "\n"
+            by_segment.setdefault(self._segment_key_for_record(record), []).append(line.encode("utf-8"))
+            count += 1
+        if not count:
+            return
+
+        with self._lock:
+            for segment_key, lines in by_segment.items():
+                handle = self._get_handle(segment_key)
+                try:
+                    self._write_all(handle, b"".join(lines))
+                except OSError:
+                    # The write may have been cut short; reopening repairs the segment's tail.
+                    handle.close()
+                    del self._handles[segment_key]
+                    raise
+            self._unsynced += count
+            self.records_appended += count
+            if (
+                self._unsynced >= self.fsync_batch_size
+                or self.clock() - self._last_sync >= self.fsync_interval
+            ):
+                self._sync_locked()
+            elif self._sync_timer is None:
+                # Sync this batch even if no further append arrives to trigger it.
+                self._sync_timer = threading.Timer(self.fsync_interval, self._timed_sync)
+                self._sync_timer.daemon = True
+                self._sync_timer.start()
+
+    def _get_handle(self, segment_key: str):
+        """Returns an open append handle for a segment, rotating old ones out."""
+        handle = self._handles.get(segment_key)
+        if handle is not None:
+            return handle
+
+        # A new month started (or an out-of-order record arrived): make the
+        # previous segments durable and close them before opening the new one.
+        if self._handles:
+            self._sync_locked()
+            for old in self._handles.values():
+                old.close()
+            self._handles.clear()
+
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        path = self.segment_path(segment_key)
+        handle = open(path, "ab", buffering=0)
+        if not self._ends_with_newline(path):
+            # Terminate a line torn by an interrupted write, so the next record
+            # starts on its own line instead of being glued onto the fragment.
+            self._write_all(handle, b"\n")
+        self._handles[segment_key] = handle
+        if not self._atexit_registered:
+            self._atexit_registered = True
+            atexit.register(self.close)
+        return handle
+
+    @staticmethod
+    def _ends_with_newline(path: Path) -> bool:
+        """Whether the file is empty or its last byte is a newline."""
+        with open(path, "rb") as f:
+            if f.seek(0, os.SEEK_END) == 0:
+                return True
+            f.seek(-1, os.SEEK_END)
+            return f.read(1) == b"\n"
+
+    @staticmethod
+    def _write_all(handle, data: bytes):
+        view = memoryview(data)
+        while view:
+            written = handle.write(view)
+            view = view[written:]
+
+    def _sync_locked(self):
+        if self._sync_timer is not None:
+            self._sync_timer.cancel()
+            self._sync_timer = None
+        for handle in self._handles.values():
+            os.fsync(handle.fileno())
+            self.fsyncs += 1
+        self._unsynced = 0
+        self._last_sync = self.clock()
+
+    def _timed_sync(self):
+        with self._lock:
+            self._sync_timer = None
+            if self._unsynced:
+                self._sync_locked()
+
+    def sync(self):
+        """Forces any batched appends to stable storage."""
+        with self._lock:
+            self._sync_locked()
+
+    def close(self):
+        """Syncs and closes all open segment handles."""
+        with self._lock:
+            self._sync_locked()
+            for handle in self._handles.values():
+                handle.close()
+            self._handles.clear()
+
+    def iter_records(self, segment_key: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields records from one segment, or from every segment when no key is given.
+        A torn trailing line from an interrupted write is skipped.
+        """
+        keys = [segment_key] if segment_key else self.list_segments()
+        for key in keys:
+            path = self.segment_path(key)
+            if not path.exists():
+                continue
+            with open(path, "rb") as f:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    try:
+                        yield json.loads(line)
+                    except json.JSONDecodeError:
+                        continue
+
+    def iter_records_from(self, segment_key: str, offset: int = 0) -> Iterator[Tuple[Dict[str, Any], int]]:
+        """
+        Yields (record, end_offset) for complete lines of a segment starting at
+        a byte offset, so callers can resume a scan where a previous one ended.
+        Reading stops before an incomplete trailing line; the next writer to
+        open the segment terminates it, and it is then skipped as malformed.
+        """
+        path = self.segment_path(segment_key)
+        if not path.exists():
+            return
+        with open(path, "rb") as f:
+            f.seek(offset)
+            position = offset
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                position += len(line)
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield record, position
+
+    def segment_size(self, segment_key: str) -> int:
+        """Returns the size in bytes of a segment, or 0 if it does not exist."""
+        path = self.segment_path(segment_key)
+        return path.stat().st_size if path.exists() else 0
+
+    def import_legacy(self, legacy_file: Path) -> int:
+        """
+        Imports a legacy JSON-array ledger into segments exactly once.
+        Returns the number of records imported.
+
+        Processes starting together serialize on an exclusive lock file, so
+        only the first imports and the others find the marker once it is
+        released.
+        """
+        marker = self.segment_dir / self.LEGACY_MARKER
+        if marker.exists() or not legacy_file.exists():
+            return 0
+
+        self.segment_dir.mkdir(parents=True, exist_ok=True)
+        with open(self.segment_dir / self.LEGACY_LOCK, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            if marker.exists():
+                return 0
+
+            with open(legacy_file, 'r') as f:
+                try:
+                    records = json.load(f)
+                except json.JSONDecodeError:
+                    records = []
+            if not isinstance(records, list):
+                records = []
+
+            self.append_many(records)
+            self.sync()
+            tmp_marker = marker.with_name(f"{marker.name}.{os.getpid()}.tmp")
+            tmp_marker.write_text(json.dumps({
+                "source": str(legacy_file),
+                "records": len(records),
+                "imported_at": datetime.now().isoformat(),
+            }))
+            os.replace(tmp_marker, marker)
+            # Closing the lock file releases the lock.
+        return len(records)
@@ -2,23 +2,98 @@
 The main entry point for the Adaptive LLM Router.
 """
 
-import litellm
-import tiktoken
-from typing import Dict, Any, Optional
+import asyncio
+import logging
+import threading
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional, Tuple, Union
 
-from .policy_engine import select_provider
+from .config import (
+    FALLBACK_CHAIN_LENGTH,
+    HEDGING_ENABLED,
+    INVOKE_MANY_CONCURRENCY_PER_PROVIDER,
+    LONG_CONTEXT_TOKEN_THRESHOLD,
+)
+
+from .policy_engine import rank_providers, select_provider
 from .provider_registry import provider_registry
+from .provider_stats import provider_stats
+from .rate_limiter import rate_limiter, RateLimitExceededError
 from .usage_ledger import usage_ledger
-from .budget_guard import budget_manager, BudgetExceededError
-from .data_models import LLMUsage
+from .response_cache import response_cache, cache_key
+from .single_flight import SingleFlight
+from .budget_guard import budget_manager, BudgetExceededError, BudgetReservation
+from .circuit_breaker import circuit_breakers, CircuitOpenError
+from .data_models import LLMProvider, LLMUsage
+from .token_estimator import TokenEstimator
+from .tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+def _litellm():
+    """
+    Returns the litellm module, importing it on first use. litellm takes
+    seconds to import, so keeping it off the import path lets agents start
+    without paying for it until their first LLM call.
+    """
+    import litellm
+    return litellm
+
+_sessions_lock = threading.Lock()
+_sessions_installed = False
+
+def _pooled_litellm():
+    """
+    Returns litellm with the process-wide pooled HTTP clients installed as
+    its client sessions. They are module globals in litellm, so they are set
+    once; the async client serves every event loop.
+    """
+    global _sessions_installed
+    litellm = _litellm()
+    if not _sessions_installed:
+        from .http_pool import http_pool
+
+        with _sessions_lock:
+            if not _sessions_installed:
+                litellm.aclient_session = http_pool.client()
+                litellm.client_session = http_pool.sync_client()
+                _sessions_installed = True
+    return litellm
+
+async def _acompletion(**kwargs):
+    """Calls litellm.acompletion over the pooled HTTP client."""
+    return await _pooled_litellm().acompletion(**kwargs)
 
-# Initialize the tokenizer
-tokenizer = tiktoken.get_encoding("cl100k_base")
+def _batch_completion(**kwargs):
+    """Calls litellm.batch_completion (blocking) over the pooled sync HTTP client."""
+    return _pooled_litellm().batch_completion(**kwargs)
+
+# Initialize the token estimator; the tokenizer itself is loaded on first exact count
+token_estimator = TokenEstimator("cl100k_base")
+
+def _token_thresholds() -> List[int]:
+    """
+    Input token counts at which the routing decision can change: the
+    long-context cut-off, and the point where input plus the estimated
+    output (half the input) no longer fits each provider's context window.
+    """
+    thresholds = [LONG_CONTEXT_TOKEN_THRESHOLD]
+    thresholds.extend(p.max_context * 2 // 3 for p in provider_registry.list_providers())
+    return thresholds
 
 def estimate_tokens(text: str) -> int:
     """Estimates the number of tokens in a given text."""
-    return len(tokenizer.encode(text))
+    return token_estimator.estimate(text, _token_thresholds())
+
+async def estimate_tokens_async(text: str) -> int:
+    """Estimates the number of tokens in a given text without blocking the event loop."""
+    return await token_estimator.estimate_async(text, _token_thresholds())
 
+# Shared by all callers in the process so identical concurrent requests
+# result in a single provider call.
+_single_flight = SingleFlight()
+
+@tracer.traced("llm.invoke")
 async def invoke(
     prompt: str,
     meta: Dict[str, Any],
@@ -30,62 +105,563 @@ async def invoke(
     It selects a provider, makes the LLM call, and records the usage.
     """
     # 1. Estimate input tokens
-    est_in = estimate_tokens(prompt)
+    est_in = await estimate_tokens_async(prompt)
     # For now, we'll estimate output tokens as a fraction of input, this can be improved.
     est_out = est_in // 2
 
-    # 2. Select the best provider
-    selected_model = select_provider(meta, est_in, est_out)
-    provider_name, model_name = selected_model.split(":")
+    # 2. Rank providers; the best one is the selection, the rest form the fallback chain
+    chain = rank_providers(meta, est_in, est_out)[:FALLBACK_CHAIN_LENGTH]
+    if not chain:
+        raise ValueError("No eligible LLM provider for this request.")
+    provider_details = chain[0]
+    provider_name, model_name = provider_details.name, provider_details.model
+    selected_model = f"{provider_name}:{model_name}"
 
-    provider_details = provider_registry.get_provider(provider_name, model_name)
-    if not provider_details:
-        raise ValueError(f"Provider {selected_model} not found in registry.")
+    # 3. Serve repeated prompts from the response cache. Confidential requests
+    # are never cached, and callers can opt out with meta["cache"] = False.
+    use_cache = meta.get("cache", True) and not meta.get("confidential")
+    if use_cache:
+        cached = response_cache.get(prompt, selected_model, meta)
+        if cached is not None:
+            _record_free_usage(provider_name, model_name, meta, "cache_hit")
+            return cached
 
-    # 3. Check the budget
-    try:
-        budget_manager.check_budget()
-    except BudgetExceededError as e:
-        # Here you could implement a fallback to a free model or just raise
-        raise e
+    # 4. Coalesce concurrent identical requests into one provider call
+    if not meta.get("cache", True):
+        return await _complete(prompt, meta, chain, est_in, use_cache)
 
-    # 4. Make the LLM call using litellm
-    try:
-        response = await litellm.acompletion(
-            model=f"{provider_name}/{model_name}",
-            messages=[{"role": "user", "content": prompt}],
-        )
+    key = cache_key(prompt, selected_model, meta)
+    content, shared = await _single_flight.do(
+        key,
+        lambda: _complete(prompt, meta, chain, est_in, use_cache),
+    )
+    if shared:
+        _record_free_usage(provider_name, model_name, meta, "coalesced")
+    return content
 
-        # Extract usage details from the response
-        usage = response.usage
-        tokens_in = usage.prompt_tokens
-        tokens_out = usage.completion_tokens
-        status = "ok"
+def _free_usage(provider_name: str, model_name: str, meta: Dict[str, Any], status: str) -> LLMUsage:
+    """Builds the usage record for a request answered without a provider call."""
+    return LLMUsage(
+        provider=provider_name,
+        model=model_name,
+        tokens_in=0,
+        tokens_out=0,
+        cost=0.0,
+        task_id=meta.get("task_id"),
+        agent=meta.get("agent_name"),
+        status=status,
+    )
 
-    except Exception as e:
-        # Handle fallback or error
-        tokens_in = est_in
-        tokens_out = 0
-        status = "error"
-        raise e
+def _record_free_usage(provider_name: str, model_name: str, meta: Dict[str, Any], status: str):
+    """Records a request that was answered without a provider call."""
+    usage_ledger.record_usage(_free_usage(provider_name, model_name, meta, status))
 
-    # 5. Calculate cost
-    cost = (
+def calculate_cost(provider_details: LLMProvider, tokens_in: int, tokens_out: int) -> float:
+    """Returns the USD cost of a call given its token counts."""
+    return (
         (tokens_in / 1000) * provider_details.cost_in +
         (tokens_out / 1000) * provider_details.cost_out
     )
 
-    # 6. Record usage
-    usage_data = LLMUsage(
-        provider=provider_name,
-        model=model_name,
+def _usage(
+    provider_details: LLMProvider,
+    meta: Dict[str, Any],
+    tokens_in: int,
+    tokens_out: int,
+    status: str,
+) -> LLMUsage:
+    return LLMUsage(
+        provider=provider_details.name,
+        model=provider_details.model,
         tokens_in=tokens_in,
         tokens_out=tokens_out,
-        cost=cost,
+        cost=calculate_cost(provider_details, tokens_in, tokens_out),
         task_id=meta.get("task_id"),
         agent=meta.get("agent_name"),
         status=status,
     )
-    usage_ledger.record_usage(usage_data)
 
-    return response.choices[0].message.content
+async def _call_provider(provider_details: LLMProvider, prompt: str, est_tokens: int):
+    """
+    Makes one LLM call using litellm through the provider's circuit breaker
+    and within its rate limits, feeding the outcome to the provider stats
+    and the breaker. Time spent queueing for the rate limiter is not counted
+    as provider latency, and a call that never reached the provider counts
+    neither for nor against the breaker.
+    """
+    model = f"{provider_details.name}/{provider_details.model}"
+    breaker = circuit_breakers.for_provider(provider_details)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit breaker for {model} is open")
+    judged = False
+    try:
+        with tracer.span("llm.call", model=model, est_tokens=est_tokens) as span:
+            async with rate_limiter.limit(provider_details, est_tokens) as limiter:
+                started = time.monotonic()
+                span.set_attribute("queue_seconds", span.duration)
+                try:
+                    response = await _acompletion(
+                        model=model,
+                        messages=[{"role": "user", "content": prompt}],
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception:
+                    provider_stats.record(provider_details, (time.monotonic() - started) * 1000, ok=False)
+                    breaker.record_failure()
+                    judged = True
+                    raise
+                provider_stats.record(provider_details, (time.monotonic() - started) * 1000, ok=True)
+                breaker.record_success()
+                judged = True
+                tokens = response.usage.prompt_tokens + response.usage.completion_tokens
+                span.set_attribute("tokens", tokens)
+                if limiter is not None:
+                    limiter.settle(est_tokens, tokens)
+                return response
+    finally:
+        if not judged:
+            breaker.release()
+
+def _reserve_budget(
+    chain: List[LLMProvider],
+    est_in: int,
+    est_out: int,
+) -> Tuple[List[LLMProvider], BudgetReservation]:
+    """
+    Reserves the estimated cost of the most expensive provider in the chain.
+    If that does not fit in the remaining budget, the chain is narrowed to
+    the providers that do, so a nearly exhausted budget downgrades the
+    request instead of failing it.
+    """
+    costs = [calculate_cost(p, est_in, est_out) for p in chain]
+    try:
+        return chain, budget_manager.reserve(max(costs))
+    except BudgetExceededError:
+        headroom = budget_manager.headroom()
+        affordable = [(p, cost) for p, cost in zip(chain, costs) if cost <= headroom]
+        if not affordable:
+            raise
+        return [p for p, _ in affordable], budget_manager.reserve(max(cost for _, cost in affordable))
+
+def _hedge_delay(provider_details: LLMProvider) -> float:
+    """Seconds to wait for a provider before hedging: its observed p95, else its declared latency."""
+    p95 = provider_stats.health(provider_details).p95_latency_ms
+    return (p95 if p95 is not None else provider_details.latency_ms) / 1000
+
+async def _complete(
+    prompt: str,
+    meta: Dict[str, Any],
+    chain: List[LLMProvider],
+    est_in: int,
+    use_cache: bool,
+) -> str:
+    """
+    Reserves budget, calls providers down the fallback chain, records usage
+    and caches the response under the model that answered it.
+
+    Providers are tried in order; a failure moves on to the next one. With
+    hedging enabled (config or meta["hedge"]), a provider that has not
+    answered within its p95 latency gets the next provider raced against it
+    and the loser is cancelled. Every attempt is written to the ledger in one
+    append: "ok" for the primary, "fallback" or "hedged" for a backup that
+    answered, "hedge_cancelled" for a cancelled racer, "rate_limited" for a
+    provider whose rate-limit queue was too long, "circuit_open" for a
+    provider whose circuit breaker rejected the call and "error" for failures.
+    """
+    # 1. Hold the estimated cost against the budget until the real cost is recorded
+    chain, reservation = _reserve_budget(chain, est_in, est_in // 2)
+
+    hedging = meta.get("hedge", HEDGING_ENABLED)
+    remaining = list(chain)
+    running: Dict[asyncio.Task, LLMProvider] = {}
+    hedges = set()
+    usage_records: List[LLMUsage] = []
+    last_error: Optional[Exception] = None
+
+    def launch(as_hedge: bool = False):
+        provider = remaining.pop(0)
+        task = asyncio.ensure_future(_call_provider(provider, prompt, est_in + est_in // 2))
+        running[task] = provider
+        if as_hedge:
+            hedges.add(id(provider))
+
+    # 2. Call providers until one answers
+    try:
+        launch()
+        while running:
+            timeout = None
+            if hedging and remaining and len(running) == 1 and not hedges:
+                timeout = _hedge_delay(next(iter(running.values())))
+            done, _ = await asyncio.wait(running, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                launch(as_hedge=True)
+                continue
+
+            for task in done:
+                provider = running.pop(task)
+                if task.exception() is not None:
+                    last_error = task.exception()
+                    if isinstance(last_error, RateLimitExceededError):
+                        usage_records.append(_usage(provider, meta, 0, 0, "rate_limited"))
+                    elif isinstance(last_error, CircuitOpenError):
+                        usage_records.append(_usage(provider, meta, 0, 0, "circuit_open"))
+                    else:
+                        usage_records.append(_usage(provider, meta, est_in, 0, "error"))
+                    continue
+
+                # 3. Record the winner and what the losing racers cost us
+                for loser_task, loser in running.items():
+                    loser_task.cancel()
+                    usage_records.append(_usage(loser, meta, est_in, 0, "hedge_cancelled"))
+                running.clear()
+
+                if provider is chain[0]:
+                    status = "ok"
+                elif id(provider) in hedges:
+                    status = "hedged"
+                else:
+                    status = "fallback"
+                response = task.result()
+                usage = response.usage
+                usage_records.append(_usage(provider, meta, usage.prompt_tokens, usage.completion_tokens, status))
+                usage_ledger.record_usage_batch(usage_records)
+                budget_manager.reconcile(reservation, sum(u.cost for u in usage_records))
+
+                content = response.choices[0].message.content
+                if use_cache:
+                    response_cache.set(prompt, f"{provider.name}:{provider.model}", meta, content)
+                return content
+
+            if not running and remaining:
+                launch()
+
+        # 4. Every provider in the chain failed
+        usage_ledger.record_usage_batch(usage_records)
+        raise last_error
+    finally:
+        for task in running:
+            task.cancel()
+        # No-op if the reservation was already reconciled.
+        budget_manager.release(reservation)
+
+async def invoke_many(
+    prompts: List[str],
+    meta: Dict[str, Any],
+    user_id: Optional[str] = None,
+    max_concurrency_per_provider: int = INVOKE_MANY_CONCURRENCY_PER_PROVIDER,
+) -> AsyncIterator[Tuple[int, Union[str, Exception]]]:
+    """
+    Routes a batch of prompts and yields (index, result) pairs as they finish.
+
+    Prompts are grouped by their selected provider. Providers that declare a
+    `batch_size` are sent batched requests; the rest are called concurrently,
+    at most `max_concurrency_per_provider` at a time. Cache hits are yielded
+    first and duplicate prompts in the batch share a single call. A prompt
+    whose call fails yields the exception instead of a string, so one failure
+    does not abort the stream. Usage for the whole batch is written to the
+    ledger in a single append once the stream is finished or closed.
+    """
+    usage_records: List[LLMUsage] = []
+    use_cache = meta.get("cache", True) and not meta.get("confidential")
+
+    # 1. Route every prompt and answer what we can from the cache.
+    groups: Dict[str, Dict[str, List[int]]] = {}
+    providers: Dict[str, LLMProvider] = {}
+    estimates: Dict[str, int] = {}
+    ready: List[Tuple[int, Union[str, Exception]]] = []
+    for index, prompt in enumerate(prompts):
+        est_in = await estimate_tokens_async(prompt)
+        selected_model = select_provider(meta, est_in, est_in // 2)
+        provider_name, model_name = selected_model.split(":")
+        provider_details = provider_registry.get_provider(provider_name, model_name)
+        if not provider_details:
+            ready.append((index, ValueError(f"Provider {selected_model} not found in registry.")))
+            continue
+
+        if use_cache:
+            cached = response_cache.get(prompt, selected_model, meta)
+            if cached is not None:
+                usage_records.append(_free_usage(provider_name, model_name, meta, "cache_hit"))
+                ready.append((index, cached))
+                continue
+
+        providers[selected_model] = provider_details
+        key = cache_key(prompt, selected_model, meta)
+        estimates[key] = est_in
+        by_prompt = groups.setdefault(selected_model, {})
+        if key in by_prompt:
+            usage_records.append(_free_usage(provider_name, model_name, meta, "coalesced"))
+        by_prompt.setdefault(key, []).append(index)
+
+    pending: List[asyncio.Task] = []
+    reservations: List[BudgetReservation] = []
+    try:
+        for item in ready:
+            yield item
+
+        if not groups:
+            return
+        budget_manager.check_budget()
+
+        # 2. Fan out per provider, batched where the provider supports it.
+        for selected_model, by_prompt in groups.items():
+            provider_details = providers[selected_model]
+            semaphore = asyncio.Semaphore(max_concurrency_per_provider)
+            work = [(prompts[indices[0]], indices, estimates[key]) for key, indices in by_prompt.items()]
+            if provider_details.batch_size:
+                for start in range(0, len(work), provider_details.batch_size):
+                    chunk = work[start:start + provider_details.batch_size]
+                    pending.append(asyncio.create_task(
+                        _complete_batch(chunk, meta, selected_model, provider_details, semaphore, use_cache, usage_records, reservations)
+                    ))
+            else:
+                for item in work:
+                    pending.append(asyncio.create_task(
+                        _complete_batch([item], meta, selected_model, provider_details, semaphore, use_cache, usage_records, reservations)
+                    ))
+
+        # 3. Stream results back in completion order.
+        for finished in asyncio.as_completed(pending):
+            for index, result in await finished:
+                yield index, result
+    finally:
+        for task in pending:
+            task.cancel()
+        if usage_records:
+            usage_ledger.record_usage_batch(usage_records)
+        for reservation in reservations:
+            budget_manager.release(reservation)
+
+@tracer.traced("llm.batch")
+async def _complete_batch(
+    work: List[Tuple[str, List[int], int]],
+    meta: Dict[str, Any],
+    selected_model: str,
+    provider_details: LLMProvider,
+    semaphore: asyncio.Semaphore,
+    use_cache: bool,
+    usage_records: List[LLMUsage],
+    reservations: List[BudgetReservation],
+) -> List[Tuple[int, Union[str, Exception]]]:
+    """
+    Sends one request (or one provider batch request) for a group of prompts
+    and returns results for every prompt index it covers. Usage, including
+    "error" records for prompts that failed, is appended to `usage_records`
+    rather than written to the ledger, and the budget reservation to
+    `reservations`, for the caller to release once it has.
+    """
+    provider_name, model_name = provider_details.name, provider_details.model
+    model = f"{provider_name}/{model_name}"
+    # A batch is one request to the provider, reserving the tokens of all its prompts.
+    est_tokens = sum(est_in + est_in // 2 for _, _, est_in in work)
+    breaker = circuit_breakers.for_provider(provider_details)
+    async with semaphore:
+        try:
+            reservation = budget_manager.reserve(sum(
+                calculate_cost(provider_details, est_in, est_in // 2) for _, _, est_in in work
+            ))
+        except BudgetExceededError as e:
+            return [(index, e) for _, indices, _ in work for index in indices]
+        reservations.append(reservation)
+        if not breaker.allow():
+            e = CircuitOpenError(f"Circuit breaker for {model} is open")
+            usage_records.extend(_free_usage(provider_name, model_name, meta, "circuit_open") for _ in work)
+            return [(index, e) for _, indices, _ in work for index in indices]
+        try:
+            limiter = await rate_limiter.acquire(provider_details, est_tokens)
+        except RateLimitExceededError as e:
+            breaker.release()
+            usage_records.extend(_free_usage(provider_name, model_name, meta, "rate_limited") for _ in work)
+            return [(index, e) for _, indices, _ in work for index in indices]
+        except BaseException:
+            breaker.release()
+            raise
+        started = time.monotonic()
+        try:
+            if len(work) == 1:
+                responses = [await _acompletion(
+                    model=model,
+                    messages=[{"role": "user", "content": work[0][0]}],
+                )]
+            else:
+                responses = await asyncio.to_thread(
+                    _batch_completion,
+                    model=model,
+                    messages=[[{"role": "user", "content": prompt}] for prompt, _, _ in work],
+                )
+        except Exception as e:
+            provider_stats.record(provider_details, (time.monotonic() - started) * 1000, ok=False)
+            breaker.record_failure()
+            usage_records.extend(_usage(provider_details, meta, est_in, 0, "error") for _, _, est_in in work)
+            return [(index, e) for _, indices, _ in work for index in indices]
+        except BaseException:
+            breaker.release()
+            raise
+        finally:
+            if limiter is not None:
+                limiter.release()
+        latency_ms = (time.monotonic() - started) * 1000
+        # One request, one verdict: it failed only if every prompt in it failed.
+        if all(isinstance(r, Exception) for r in responses):
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+
+    if limiter is not None:
+        limiter.settle(est_tokens, sum(
+            r.usage.prompt_tokens + r.usage.completion_tokens
+            for r in responses if not isinstance(r, Exception)
+        ))
+
+    results: List[Tuple[int, Union[str, Exception]]] = []
+    for (prompt, indices, est_in), response in zip(work, responses):
+        provider_stats.record(provider_details, latency_ms, ok=not isinstance(response, Exception))
+        if isinstance(response, Exception):
+            usage_records.append(_usage(provider_details, meta, est_in, 0, "error"))
+            results.extend((index, response) for index in indices)
+            continue
+        usage_records.append(_usage(
+            provider_details, meta, response.usage.prompt_tokens, response.usage.completion_tokens, "ok"
+        ))
+        content = response.choices[0].message.content
+        if use_cache:
+            response_cache.set(prompt, selected_model, meta, content)
+        results.extend((index, content) for index in indices)
+    return results
+
+async def invoke_stream(
+    prompt: str,
+    meta: Dict[str, Any],
+    user_id: Optional[str] = None
+) -> AsyncIterator[str]:
+    """
+    Streaming variant of `invoke` that yields response text as it arrives.
+
+    Output tokens are counted as chunks arrive, and a single ledger record is
+    written when the stream ends: with the provider-reported usage when it
+    completes, or with the partial counts (status "cancelled") if the caller
+    stops consuming or is cancelled part-way.
+    """
+    est_in = await estimate_tokens_async(prompt)
+    est_out = est_in // 2
+
+    selected_model = select_provider(meta, est_in, est_out)
+    provider_name, model_name = selected_model.split(":")
+    provider_details = provider_registry.get_provider(provider_name, model_name)
+    if not provider_details:
+        raise ValueError(f"Provider {selected_model} not found in registry.")
+
+    use_cache = meta.get("cache", True) and not meta.get("confidential")
+    if use_cache:
+        cached = response_cache.get(prompt, selected_model, meta)
+        if cached is not None:
+            _record_free_usage(provider_name, model_name, meta, "cache_hit")
+            yield cached
+            return
+
+    breaker = circuit_breakers.for_provider(provider_details)
+    if not breaker.allow():
+        raise CircuitOpenError(f"Circuit breaker for {selected_model} is open")
+    try:
+        reservation = budget_manager.reserve(calculate_cost(provider_details, est_in, est_out))
+    except BaseException:
+        breaker.release()
+        raise
+    try:
+        limiter = await rate_limiter.acquire(provider_details, est_in + est_out)
+    except BaseException:
+        breaker.release()
+        budget_manager.release(reservation)
+        raise
+
+    tokens_in = est_in
+    tokens_out = 0
+    reported_usage = None
+    parts: List[str] = []
+    status = "error"
+    stream = None
+    started = time.monotonic()
+    first_chunk_ms = None
+    try:
+        stream = await _acompletion(
+            model=f"{provider_name}/{model_name}",
+            messages=[{"role": "user", "content": prompt}],
+            stream=True,
+            stream_options={"include_usage": True},
+        )
+        async for chunk in stream:
+            usage = getattr(chunk, "usage", None)
+            if usage:
+                reported_usage = usage
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if delta:
+                if first_chunk_ms is None:
+                    # Time to first token is what interactive callers wait on.
+                    first_chunk_ms = (time.monotonic() - started) * 1000
+                    provider_stats.record(provider_details, first_chunk_ms, ok=True)
+                    breaker.record_success()
+                # No thresholds apply to output chunks, so this is the cheap heuristic.
+                tokens_out += token_estimator.estimate(delta)
+                parts.append(delta)
+                yield delta
+        status = "ok"
+    except (GeneratorExit, asyncio.CancelledError):
+        status = "cancelled"
+        raise
+    except Exception:
+        if first_chunk_ms is None:
+            provider_stats.record(provider_details, (time.monotonic() - started) * 1000, ok=False)
+            breaker.record_failure()
+        raise
+    finally:
+        if first_chunk_ms is None and status != "error":
+            # Finished or cancelled without producing text: no verdict on the provider.
+            breaker.release()
+        if stream is not None and status != "ok" and hasattr(stream, "aclose"):
+            try:
+                await stream.aclose()
+            except Exception:
+                pass
+        if status == "ok" and reported_usage:
+            tokens_in = reported_usage.prompt_tokens
+            tokens_out = reported_usage.completion_tokens
+        if limiter is not None:
+            limiter.release()
+            limiter.settle(est_in + est_out, tokens_in + tokens_out)
+        usage_ledger.record_usage(LLMUsage(
+            provider=provider_name,
+            model=model_name,
+            tokens_in=tokens_in,
+            tokens_out=tokens_out,
+            cost=calculate_cost(provider_details, tokens_in, tokens_out),
+            task_id=meta.get("task_id"),
+            agent=meta.get("agent_name"),
+            status=status,
+        ))
+        budget_manager.reconcile(reservation, calculate_cost(provider_details, tokens_in, tokens_out))
+
+    if use_cache:
+        response_cache.set(prompt, selected_model, meta, "".join(parts))
+
+async def warm_up(probe: bool = False):
+    """
+    Loads everything the router defers until first use: litellm, the
+    tokenizer, the provider catalog, the usage ledger and the response cache.
+    Call it at service start to take the cost off the first request's latency.
+    With `probe=True`, also sends a one-token request to the top-ranked provider.
+    """
+    await asyncio.to_thread(_litellm)
+    await asyncio.to_thread(lambda: token_estimator.encoding)
+    provider_registry.list_providers()
+    await asyncio.to_thread(lambda: usage_ledger.spend)
+    await asyncio.to_thread(len, response_cache)
+    if probe:
+        chain = rank_providers({}, 1, 1)
+        if chain:
+            try:
+                await _call_provider(chain[0], "ping", 2)
+            except Exception as e:
+                logger.warning(f"Warm-up probe to {chain[0].name}/{chain[0].model} failed: {e}")
@@ -0,0 +1,365 @@
+"""
+Process-wide metrics registry with Prometheus text exposition.
+
+Metrics are labeled families of counters, gauges and histograms. Updates
+take no lock: each thread writes to its own shard of a metric, and readers
+merge the shards when a value is asked for, so recording from asyncio code
+or worker threads costs a few dict lookups and an add. Counters and
+histograms also keep a ring buffer of time slots covering the last
+METRICS_WINDOW_SECONDS, which gives sliding-window rates and recent
+percentiles without keeping or scanning individual events. Histograms use
+HDR-style log-linear buckets, so their percentiles are within a fixed
+relative error whatever the range of the values.
+
+The router's default rate limiter, circuit breakers, response cache, usage
+ledger and provider tracker export their series to `metrics_registry`.
+`MetricsRegistry.wsgi_app` serves the exposition to processes without a
+web framework.
+"""
+
+import logging
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from .config import (
+    METRICS_HISTOGRAM_SUB_BUCKETS,
+    METRICS_QUANTILES,
+    METRICS_WINDOW_SECONDS,
+    METRICS_WINDOW_SLOTS,
+)
+
+logger = logging.getLogger(__name__)
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Histogram bucket for zero and negative values, below every real bucket.
+_ZERO_BUCKET = -(1 << 30)
+
+class _Window:
+    """Maps the monotonic clock onto ring-buffer slots covering the last `seconds`."""
+    def __init__(self, seconds: float, slots: int):
+        self.seconds = seconds
+        self.slots = slots
+        self.slot_seconds = seconds / slots
+
+    def epoch(self, now: float) -> int:
+        return int(now // self.slot_seconds)
+
+    def elapsed(self, now: float) -> float:
+        """Seconds covered by the live slots: the full ones plus the current partial one."""
+        return (self.slots - 1) * self.slot_seconds + now % self.slot_seconds
+
+class _CounterShard:
+    __slots__ = ("total", "values", "epochs")
+
+    def __init__(self, slots: int):
+        self.total = 0.0
+        self.values = [0.0] * slots
+        self.epochs = [-1] * slots
+
+class _HistogramShard:
+    __slots__ = ("count", "sum", "buckets", "epochs")
+
+    def __init__(self, slots: int):
+        self.count = 0
+        self.sum = 0.0
+        self.buckets: List[Dict[int, int]] = [{} for _ in range(slots)]
+        self.epochs = [-1] * slots
+
+class _Sharded(ABC):
+    """Per-thread shards; only the owning thread writes to a shard."""
+    def __init__(self, window: _Window):
+        self._window = window
+        self._shards: Dict[int, object] = {}
+
+    @abstractmethod
+    def _new_shard(self):
+        """Returns an empty shard for the calling thread."""
+
+    def _shard(self):
+        tid = threading.get_ident()
+        shard = self._shards.get(tid)
+        if shard is None:
+            shard = self._shards.setdefault(tid, self._new_shard())
+        return shard
+
+    def _all_shards(self) -> list:
+        return list(self._shards.values())
+
+class Counter(_Sharded):
+    """A monotonically increasing value with a sliding-window rate."""
+    def __init__(self, window: _Window):
+        super().__init__(window)
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_shard(self) -> _CounterShard:
+        return _CounterShard(self._window.slots)
+
+    def inc(self, amount: float = 1.0):
+        shard = self._shard()
+        epoch = self._window.epoch(time.monotonic())
+        slot = epoch % self._window.slots
+        if shard.epochs[slot] != epoch:
+            shard.epochs[slot] = epoch
+            shard.values[slot] = 0.0
+        shard.values[slot] += amount
+        shard.total += amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Reports a total that another object already counts, read at scrape time."""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return sum(shard.total for shard in self._all_shards())
+
+    def rate(self) -> float:
+        """Increments per second over the sliding window."""
+        now = time.monotonic()
+        oldest = self._window.epoch(now) - self._window.slots
+        total = 0.0
+        for shard in self._all_shards():
+            for epoch, value in zip(list(shard.epochs), list(shard.values)):
+                if epoch > oldest:
+                    total += value
+        return total / self._window.elapsed(now)
+
+class Gauge:
+    """A value that goes up and down; the last write wins."""
+    def __init__(self):
+        self._value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self._value = value
+
+    def inc(self, amount: float = 1.0):
+        self._value += amount
+
+    def dec(self, amount: float = 1.0):
+        self._value -= amount
+
+    def set_function(self, function: Callable[[], float]):
+        """Computes the value at scrape time instead of storing it."""
+        self._function = function
+
+    @property
+    def value(self) -> float:
+        if self._function is not None:
+            return self._function()
+        return self._value
+
+class Histogram(_Sharded):
+    """
+    Log-linear histogram: every power of two is split into `sub_buckets`
+    equal-width buckets, like HdrHistogram. The count and sum are kept since
+    creation; bucket counts only for the sliding window, so percentiles
+    describe recent values.
+    """
+    def __init__(self, window: _Window, sub_buckets: int = METRICS_HISTOGRAM_SUB_BUCKETS):
+        super().__init__(window)
+        self.sub_buckets = sub_buckets
+
+    def _new_shard(self) -> _HistogramShard:
+        return _HistogramShard(self._window.slots)
+
+    def _index(self, value: float) -> int:
+        if value <= 0:
+            return _ZERO_BUCKET
+        mantissa, exponent = math.frexp(value)
+        return exponent * self.sub_buckets + int((mantissa * 2 - 1) * self.sub_buckets)
+
+    def _bucket_value(self, index: int) -> float:
+        """The midpoint of a bucket."""
+        if index == _ZERO_BUCKET:
+            return 0.0
+        exponent, sub = divmod(index, self.sub_buckets)
+        return 2.0 ** (exponent - 1) * (1 + (sub + 0.5) / self.sub_buckets)
+
+    def observe(self, value: float):
+        shard = self._shard()
+        index = self._index(value)
+        epoch = self._window.epoch(time.monotonic())
+        slot = epoch % self._window.slots
+        buckets = shard.buckets[slot]
+        if shard.epochs[slot] != epoch:
+            buckets = shard.buckets[slot] = {}
+            shard.epochs[slot] = epoch
+        buckets[index] = buckets.get(index, 0) + 1
+        shard.count += 1
+        shard.sum += value
+
+    @property
+    def count(self) -> int:
+        return sum(shard.count for shard in self._all_shards())
+
+    @property
+    def sum(self) -> float:
+        return sum(shard.sum for shard in self._all_shards())
+
+    def window_counts(self) -> Dict[int, int]:
+        """Bucket counts over the sliding window, merged across threads."""
+        oldest = self._window.epoch(time.monotonic()) - self._window.slots
+        merged: Dict[int, int] = {}
+        for shard in self._all_shards():
+            for epoch, buckets in zip(list(shard.epochs), list(shard.buckets)):
+                if epoch > oldest:
+                    for index, count in buckets.copy().items():
+                        merged[index] = merged.get(index, 0) + count
+        return merged
+
+    def quantiles(self, quantiles: Sequence[float] = METRICS_QUANTILES) -> Dict[float, float]:
+        return merged_quantiles([self], quantiles)
+
+def merged_quantiles(histograms: Iterable[Histogram], quantiles: Sequence[float] = METRICS_QUANTILES) -> Dict[float, float]:
+    """
+    Quantiles over the sliding windows of several histograms (e.g. all task
+    types of one agent) taken together; NaN when they saw no values.
+    """
+    histograms = list(histograms)
+    merged: Dict[int, int] = {}
+    for histogram in histograms:
+        for index, count in histogram.window_counts().items():
+            merged[index] = merged.get(index, 0) + count
+    total = sum(merged.values())
+    if total == 0:
+        return {q: math.nan for q in quantiles}
+
+    bucket_value = histograms[0]._bucket_value
+    indices = sorted(merged)
+    results = {}
+    for q in quantiles:
+        rank = q * (total - 1)
+        seen = 0
+        for index in indices:
+            seen += merged[index]
+            if rank < seen:
+                results[q] = bucket_value(index)
+                break
+    return results
+
+class MetricFamily:
+    """All the labeled children of one metric name."""
+    def __init__(self, name: str, help_text: str, kind: str, labelnames: Tuple[str, ...], factory: Callable[[], object]):
+        self.name = name
+        self.help_text = help_text
+        self.kind = kind
+        self.labelnames = labelnames
+        self._factory = factory
+        self._children: Dict[Tuple[str, ...], object] = {}
+
+    def labels(self, **labels: str):
+        """Returns the child for these label values, creating it on first use."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Metric {self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(key)
+        if child is None:
+            child = self._children.setdefault(key, self._factory())
+        return child
+
+    def remove(self, **labels: str):
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        self._children.pop(key, None)
+
+    def children(self) -> List[Tuple[Dict[str, str], object]]:
+        return [(dict(zip(self.labelnames, key)), child) for key, child in list(self._children.items())]
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(value)
+
+class MetricsRegistry:
+    """
+    Creates and holds metric families. Asking again for an existing name
+    returns the same family, so every agent can declare the metrics it uses.
+    """
+    def __init__(
+        self,
+        window_seconds: float = METRICS_WINDOW_SECONDS,
+        window_slots: int = METRICS_WINDOW_SLOTS,
+        sub_buckets: int = METRICS_HISTOGRAM_SUB_BUCKETS,
+        quantiles: Sequence[float] = METRICS_QUANTILES,
+    ):
+        self.window = _Window(window_seconds, window_slots)
+        self.sub_buckets = sub_buckets
+        self.quantiles = tuple(quantiles)
+        self._lock = threading.Lock()
+        self._families: Dict[str, MetricFamily] = {}
+
+    def _register(self, name: str, help_text: str, kind: str, labelnames: Sequence[str], factory: Callable[[], object]) -> MetricFamily:
+        labelnames = tuple(labelnames)
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = self._families[name] = MetricFamily(name, help_text, kind, labelnames, factory)
+            elif family.kind != kind or family.labelnames != labelnames:
+                raise ValueError(f"Metric {name} is already registered as a {family.kind} with labels {family.labelnames}")
+            return family
+
+    def counter(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help_text, "counter", labelnames, lambda: Counter(self.window))
+
+    def gauge(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help_text, "gauge", labelnames, Gauge)
+
+    def histogram(self, name: str, help_text: str, labelnames: Sequence[str] = ()) -> MetricFamily:
+        return self._register(name, help_text, "histogram", labelnames, lambda: Histogram(self.window, self.sub_buckets))
+
+    def exposition(self) -> str:
+        """
+        Renders every metric in the Prometheus text format. Histograms are
+        exported as summaries: windowed quantiles plus the lifetime sum and
+        count. Values computed by callbacks that fail are left out.
+        """
+        with self._lock:
+            families = sorted(self._families.values(), key=lambda f: f.name)
+        lines = []
+        for family in families:
+            lines.append(f"# HELP {family.name} {_escape(family.help_text)}")
+            lines.append(f"# TYPE {family.name} {'summary' if family.kind == 'histogram' else family.kind}")
+            for labels, child in family.children():
+                if family.kind == "histogram":
+                    for q, value in child.quantiles(self.quantiles).items():
+                        lines.append(f"{family.name}{_format_labels({**labels, 'quantile': str(q)})} {_format_value(value)}")
+                    lines.append(f"{family.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                    lines.append(f"{family.name}_count{_format_labels(labels)} {child.count}")
+                    continue
+                try:
+                    value = child.value
+                except Exception as e:
+                    logger.debug(f"Skipping {family.name}{_format_labels(labels)}: {e}")
+                    continue
+                if value is not None:
+                    lines.append(f"{family.name}{_format_labels(labels)} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+    def wsgi_app(self, environ, start_response):
+        """WSGI application that answers every GET with the exposition."""
+        method = environ.get("REQUEST_METHOD", "GET")
+        if method not in ("GET", "HEAD"):
+            start_response("405 Method Not Allowed", [("Allow", "GET, HEAD"), ("Content-Length", "0")])
+            return [b""]
+        body = self.exposition().encode("utf-8")
+        start_response("200 OK", [("Content-Type", PROMETHEUS_CONTENT_TYPE), ("Content-Length", str(len(body)))])
+        return [b""] if method == "HEAD" else [body]
+
+# Initialize the process-wide registry exported by the /metrics endpoint
+metrics_registry = MetricsRegistry()
@@ -2,32 +2,123 @@
 The policy engine decides which model to call using a decision graph.
 """
 
-from typing import Dict, Any
+from typing import Dict, Any, List, Tuple
 
 from .budget_guard import budget_manager
+from .circuit_breaker import circuit_breakers
+from .config import (
+    BALANCED_MIN_QUALITY,
+    CONFIDENTIAL_PROVIDER_NAMES,
+    HIGH_QUALITY_MIN_QUALITY,
+    LONG_CONTEXT_MIN_WINDOW,
+    LONG_CONTEXT_TOKEN_THRESHOLD,
+    POLICY_SCORE_WEIGHTS,
+)
+from .data_models import LLMProvider
+from .provider_registry import provider_registry
+from .provider_stats import ProviderHealth, provider_stats
 
-def select_provider(meta: Dict[str, Any], est_in: int, est_out: int) -> str:
+def _routing_mode(meta: Dict[str, Any], est_in: int, budget_percentage: float, downgrade: bool = False) -> str:
     """
-    Selects the best provider and model based on task metadata and budget.
-    This is a simplified implementation of the decision graph.
+    Walks the decision graph and returns the routing mode for a request.
+    `downgrade` is set when the burn-rate forecast says the budget will run
+    out before month end.
     """
-    budget_percentage = budget_manager.get_remaining_budget_percentage()
-
     # 1. Privacy Flag: forces LocalAI
     if meta.get("confidential"):
-        return "localai:phi-4-14b"
+        return "confidential"
 
     # 2. Task Criticality: high-quality model for critical tasks if budget allows
-    if meta.get("quality") == "high" and budget_percentage > 0.20:
-        return "openrouter:gpt-4o-mini"
+    if meta.get("quality") == "high" and budget_percentage > 0.20 and not downgrade:
+        return "quality"
 
     # 3. Context Length: long-context model for large inputs
-    if est_in > 8000:
-        return "requesty:claude-3-sonnet"
+    if est_in > LONG_CONTEXT_TOKEN_THRESHOLD:
+        return "long_context"
 
-    # 4. Low Budget Mode: cheapest model when budget is low
-    if budget_percentage < 0.05:
-        return "openrouter:mistral-7b"
+    # 4. Low Budget Mode: cheapest model when budget is low or forecast to run out
+    if budget_percentage < 0.05 or downgrade:
+        return "low_budget"
 
     # 5. Balanced Default: the default choice for all other cases
-    return "openrouter:qwen2-72b"
+    return "balanced"
+
+def _is_eligible(provider: LLMProvider, mode: str) -> bool:
+    if mode == "confidential":
+        return provider.name in CONFIDENTIAL_PROVIDER_NAMES
+    if provider.name in CONFIDENTIAL_PROVIDER_NAMES:
+        return False
+    if mode == "quality":
+        return provider.quality >= HIGH_QUALITY_MIN_QUALITY
+    if mode == "long_context":
+        return provider.max_context >= LONG_CONTEXT_MIN_WINDOW
+    if mode == "balanced":
+        return provider.quality >= BALANCED_MIN_QUALITY
+    return True
+
+def _score(
+    candidates: List[LLMProvider],
+    mode: str,
+    health: Dict[int, ProviderHealth],
+) -> List[Tuple[float, LLMProvider]]:
+    """
+    Scores providers by quality, blended cost and expected latency, each cost
+    and latency normalized against the worst candidate, minus the recent
+    error rate. Higher is better. `health` maps id(provider) to its snapshot.
+    """
+    weights = POLICY_SCORE_WEIGHTS[mode]
+    costs = {id(p): p.cost_in + p.cost_out for p in candidates}
+    latencies = {id(p): provider_stats.expected_latency_ms(p, health[id(p)]) for p in candidates}
+    max_cost = max(costs.values()) or 1.0
+    max_latency = max(latencies.values()) or 1.0
+
+    scored = []
+    for provider in candidates:
+        score = (
+            weights["quality"] * provider.quality
+            - weights["cost"] * costs[id(provider)] / max_cost
+            - weights["latency"] * latencies[id(provider)] / max_latency
+            - health[id(provider)].error_rate
+        )
+        scored.append((score, provider))
+    scored.sort(key=lambda item: item[0], reverse=True)
+    return scored
+
+def rank_providers(meta: Dict[str, Any], est_in: int, est_out: int) -> List[LLMProvider]:
+    """
+    Returns the providers eligible for a request, best first. Providers whose
+    circuit breaker is open are left out. Providers that are currently
+    demoted for errors or latency are ranked after all healthy ones, so they
+    are only used when nothing else is available.
+    """
+    budget_percentage = budget_manager.get_remaining_budget_percentage()
+    mode = _routing_mode(meta, est_in, budget_percentage, budget_manager.should_downgrade())
+
+    fitting = provider_registry.providers_with_context(est_in + est_out)
+    if not fitting:
+        # Nothing can hold the whole request; the largest window is the best we can do.
+        fitting = provider_registry.providers_with_context(0)[-1:]
+
+    fitting = [p for p in fitting if circuit_breakers.provider_available(p)]
+    candidates = [p for p in fitting if _is_eligible(p, mode)]
+    if not candidates and mode != "confidential":
+        # No provider matches the mode's requirements; fall back to any non-reserved provider.
+        candidates = [p for p in fitting if p.name not in CONFIDENTIAL_PROVIDER_NAMES]
+    if not candidates:
+        return []
+
+    # One health snapshot per provider serves the whole decision.
+    health = {id(p): provider_stats.health(p) for p in candidates}
+    ranked = [provider for _, provider in _score(candidates, mode, health)]
+    demoted = {id(p) for p in ranked if provider_stats.is_demoted(p, health[id(p)])}
+    return [p for p in ranked if id(p) not in demoted] + [p for p in ranked if id(p) in demoted]
+
+def select_provider(meta: Dict[str, Any], est_in: int, est_out: int) -> str:
+    """
+    Selects the best provider and model based on task metadata, budget and
+    live provider health. Returns a "provider:model" string.
+    """
+    ranked = rank_providers(meta, est_in, est_out)
+    if not ranked:
+        raise ValueError("No eligible LLM provider for this request.")
+    return f"{ranked[0].name}:{ranked[0].model}"
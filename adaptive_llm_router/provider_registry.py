@@ -2,19 +2,74 @@
 Manages the catalog of available LLM providers.
 """
 
+import bisect
 import json
+import logging
+import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Dict, List, Optional, Tuple
 
+from .config import PROVIDER_COST_TIERS, PROVIDER_RELOAD_INTERVAL_SECONDS
 from .data_models import LLMProvider
 
+logger = logging.getLogger(__name__)
+
+def cost_tier(provider: LLMProvider) -> str:
+    """
+    Returns the name of the cost tier a provider falls into, based on its
+    blended (input + output) cost per 1k tokens.
+    """
+    blended = provider.cost_in + provider.cost_out
+    for tier, ceiling in PROVIDER_COST_TIERS:
+        if blended <= ceiling:
+            return tier
+    return PROVIDER_COST_TIERS[-1][0]
+
+class ProviderIndex:
+    """
+    An immutable snapshot of the provider catalog with lookup indexes.
+    """
+    def __init__(self, providers: List[LLMProvider], mtime: Optional[float] = None):
+        self.providers = providers
+        self.mtime = mtime
+        self.by_key: Dict[Tuple[str, str], LLMProvider] = {
+            (p.name, p.model): p for p in providers
+        }
+        self.by_max_context: List[LLMProvider] = sorted(providers, key=lambda p: p.max_context)
+        self._max_contexts = [p.max_context for p in self.by_max_context]
+        self.by_latency: List[LLMProvider] = sorted(providers, key=lambda p: p.latency_ms)
+        self.by_cost_tier: Dict[str, List[LLMProvider]] = {tier: [] for tier, _ in PROVIDER_COST_TIERS}
+        for provider in sorted(providers, key=lambda p: p.cost_in + p.cost_out):
+            self.by_cost_tier[cost_tier(provider)].append(provider)
+
+    def with_min_context(self, tokens: int) -> List[LLMProvider]:
+        """Returns providers whose context window fits `tokens`, smallest first."""
+        return self.by_max_context[bisect.bisect_left(self._max_contexts, tokens):]
+
 class ProviderRegistry:
     """
     Loads and provides access to the list of LLM providers from a JSON file.
+
+    Lookups go through an index that is rebuilt whenever the file's mtime
+    changes, so providers can be added or edited without a restart. The new
+    index is swapped in with a single reference assignment, so concurrent
+    readers always see either the old or the new catalog, never a mix.
     """
-    def __init__(self, providers_file: Path):
+    def __init__(self, providers_file: Path, reload_interval: float = PROVIDER_RELOAD_INTERVAL_SECONDS):
         self.providers_file = providers_file
-        self.providers: List[LLMProvider] = self._load_providers()
+        self.reload_interval = reload_interval
+        self._reload_lock = threading.Lock()
+        self._last_check = time.monotonic()
+        # Built on first access so importing the router does not read the file.
+        self._index: Optional[ProviderIndex] = None
+
+    def _file_mtime(self) -> Optional[float]:
+        try:
+            return os.stat(self.providers_file).st_mtime
+        except FileNotFoundError:
+            return None
 
     def _load_providers(self) -> List[LLMProvider]:
         """Loads provider data from the JSON file."""
@@ -24,20 +79,71 @@ class ProviderRegistry:
             data = json.load(f)
         return [LLMProvider(**p) for p in data]
 
+    def _build_index(self) -> ProviderIndex:
+        mtime = self._file_mtime()
+        return ProviderIndex(self._load_providers(), mtime)
+
+    def reload(self) -> bool:
+        """
+        Rebuilds the index if the providers file changed on disk.
+        Returns True if a new index was swapped in. A file that fails to
+        parse leaves the current index in place.
+        """
+        with self._reload_lock:
+            self._last_check = time.monotonic()
+            if self._index is not None and self._file_mtime() == self._index.mtime:
+                return False
+            try:
+                index = self._build_index()
+            except Exception as e:
+                if self._index is None:
+                    raise
+                logger.warning(f"Keeping previous provider catalog, failed to reload {self.providers_file}: {e}")
+                return False
+            self._index = index
+            logger.info(f"Reloaded {len(index.providers)} providers from {self.providers_file}")
+            return True
+
+    @property
+    def index(self) -> ProviderIndex:
+        """The current index, checked for changes at most once per reload interval."""
+        if self._index is None or time.monotonic() - self._last_check >= self.reload_interval:
+            self.reload()
+        return self._index
+
+    @property
+    def providers(self) -> List[LLMProvider]:
+        return self.index.providers
+
     def get_provider(self, name: str, model: str) -> Optional[LLMProvider]:
         """
         Retrieves a specific provider by name and model.
         """
-        for provider in self.providers:
-            if provider.name == name and provider.model == model:
-                return provider
-        return None
+        return self.index.by_key.get((name, model))
 
     def list_providers(self) -> List[LLMProvider]:
         """
         Returns the list of all available providers.
         """
-        return self.providers
+        return self.index.providers
+
+    def providers_with_context(self, tokens: int) -> List[LLMProvider]:
+        """
+        Returns providers whose context window can hold `tokens`, smallest window first.
+        """
+        return self.index.with_min_context(tokens)
+
+    def providers_by_latency(self) -> List[LLMProvider]:
+        """
+        Returns all providers ordered by expected latency, fastest first.
+        """
+        return self.index.by_latency
+
+    def providers_in_cost_tier(self, tier: str) -> List[LLMProvider]:
+        """
+        Returns the providers in a cost tier (see `PROVIDER_COST_TIERS`), cheapest first.
+        """
+        return self.index.by_cost_tier.get(tier, [])
 
 # Initialize a default registry instance
 providers_path = Path(__file__).parent / "providers.json"
@@ -0,0 +1,168 @@
+"""
+Live per-provider latency, error-rate and throughput statistics.
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import Deque, Dict, Optional, Tuple
+
+from .config import (
+    PROVIDER_DEMOTION_ERROR_RATE,
+    PROVIDER_DEMOTION_LATENCY_FACTOR,
+    PROVIDER_STATS_EWMA_ALPHA,
+    PROVIDER_STATS_MIN_SAMPLES,
+    PROVIDER_STATS_WINDOW_SECONDS,
+)
+from .data_models import LLMProvider
+from .metrics import MetricsRegistry, metrics_registry
+
+@dataclass
+class ProviderHealth:
+    """A point-in-time view of a provider's recent behaviour."""
+    samples: int
+    error_rate: float
+    ewma_latency_ms: Optional[float]
+    p95_latency_ms: Optional[float]
+    throughput_per_min: float
+
+class ProviderStats:
+    """
+    Rolling statistics for one provider over a time window.
+
+    Latency is tracked both as an EWMA (for scoring) and as a windowed p95
+    (for demotion and hedging). Samples older than the window are dropped,
+    which is also what lets a demoted provider become eligible again. The
+    snapshot is cached until a sample is added or ages out, so routing
+    decisions between calls do not re-sort the window.
+    """
+    def __init__(self, window_seconds: float, alpha: float):
+        self.window_seconds = window_seconds
+        self.alpha = alpha
+        self.ewma_latency_ms: Optional[float] = None
+        self._samples: Deque[Tuple[float, float, bool]] = deque()
+        self._errors = 0
+        self._snapshot: Optional[ProviderHealth] = None
+
+    def record(self, latency_ms: float, ok: bool, now: float):
+        self._snapshot = None
+        self._samples.append((now, latency_ms, ok))
+        if not ok:
+            self._errors += 1
+        else:
+            if self.ewma_latency_ms is None:
+                self.ewma_latency_ms = latency_ms
+            else:
+                self.ewma_latency_ms += self.alpha * (latency_ms - self.ewma_latency_ms)
+        self._prune(now)
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_seconds
+        while self._samples and self._samples[0][0] < cutoff:
+            _, _, ok = self._samples.popleft()
+            if not ok:
+                self._errors -= 1
+            self._snapshot = None
+
+    def snapshot(self, now: float) -> ProviderHealth:
+        self._prune(now)
+        if self._snapshot is not None:
+            return self._snapshot
+        count = len(self._samples)
+        latencies = sorted(latency for _, latency, ok in self._samples if ok)
+        p95 = None
+        if latencies:
+            p95 = latencies[min(len(latencies) - 1, math.ceil(0.95 * len(latencies)) - 1)]
+        self._snapshot = ProviderHealth(
+            samples=count,
+            error_rate=(self._errors / count) if count else 0.0,
+            ewma_latency_ms=self.ewma_latency_ms,
+            p95_latency_ms=p95,
+            throughput_per_min=count * 60.0 / self.window_seconds,
+        )
+        return self._snapshot
+
+class ProviderStatsTracker:
+    """
+    Collects outcomes of provider calls and answers health questions for the policy engine.
+
+    With a metrics `registry`, every call is also counted by provider and
+    outcome, and the latency of successful calls is observed in a histogram.
+    """
+    def __init__(
+        self,
+        window_seconds: float = PROVIDER_STATS_WINDOW_SECONDS,
+        alpha: float = PROVIDER_STATS_EWMA_ALPHA,
+        min_samples: int = PROVIDER_STATS_MIN_SAMPLES,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        self.window_seconds = window_seconds
+        self.alpha = alpha
+        self.min_samples = min_samples
+        self._lock = threading.Lock()
+        self._stats: Dict[str, ProviderStats] = {}
+        self._requests = self._latency = None
+        if registry is not None:
+            self._requests = registry.counter("llm_provider_requests_total", "Provider calls, by outcome", ("provider", "status"))
+            self._latency = registry.histogram("llm_provider_latency_seconds", "Latency of successful provider calls", ("provider",))
+
+    @staticmethod
+    def key(provider: LLMProvider) -> str:
+        return f"{provider.name}:{provider.model}"
+
+    def record(self, provider: LLMProvider, latency_ms: float, ok: bool):
+        """Records the outcome of one call to a provider."""
+        now = time.monotonic()
+        key = self.key(provider)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = ProviderStats(self.window_seconds, self.alpha)
+            stats.record(latency_ms, ok, now)
+        if self._requests is not None:
+            self._requests.labels(provider=key, status="ok" if ok else "error").inc()
+            if ok:
+                self._latency.labels(provider=key).observe(latency_ms / 1000)
+
+    def health(self, provider: LLMProvider) -> ProviderHealth:
+        """Returns the current statistics for a provider."""
+        with self._lock:
+            stats = self._stats.get(self.key(provider))
+            if stats is None:
+                return ProviderHealth(0, 0.0, None, None, 0.0)
+            return stats.snapshot(time.monotonic())
+
+    def expected_latency_ms(self, provider: LLMProvider, health: Optional[ProviderHealth] = None) -> float:
+        """
+        Observed EWMA latency once there are enough samples, else the declared
+        latency. Pass `health` to reuse a snapshot already taken.
+        """
+        health = health if health is not None else self.health(provider)
+        if health.samples >= self.min_samples and health.ewma_latency_ms is not None:
+            return health.ewma_latency_ms
+        return float(provider.latency_ms)
+
+    def is_demoted(self, provider: LLMProvider, health: Optional[ProviderHealth] = None) -> bool:
+        """
+        A provider is demoted while its recent error rate, or its p95 latency
+        relative to the declared latency, is above the configured limits.
+        Pass `health` to reuse a snapshot already taken.
+        """
+        health = health if health is not None else self.health(provider)
+        if health.samples < self.min_samples:
+            return False
+        if health.error_rate >= PROVIDER_DEMOTION_ERROR_RATE:
+            return True
+        return (
+            health.p95_latency_ms is not None
+            and health.p95_latency_ms > provider.latency_ms * PROVIDER_DEMOTION_LATENCY_FACTOR
+        )
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+
+# Initialize a default tracker instance
+provider_stats = ProviderStatsTracker(registry=metrics_registry)
@@ -0,0 +1,258 @@
+"""
+Per-provider rate limiting for the Adaptive LLM Router.
+
+Each provider can declare requests/min, tokens/min and max concurrency in
+providers.json. Requests and tokens are metered with token buckets; callers
+wait in arrival order, and requests that would queue longer than the
+configured maximum fail with RateLimitExceededError so the router can move
+on to the next provider instead of piling up retries against a 429.
+"""
+
+import asyncio
+import threading
+import time
+import weakref
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import AsyncIterator, Dict, Optional, Tuple
+
+from .config import RATE_LIMIT_MAX_WAIT_SECONDS
+from .data_models import LLMProvider
+from .metrics import MetricsRegistry, metrics_registry
+
+class RateLimitExceededError(Exception):
+    """Raised when a request would wait too long for a provider's rate limits."""
+    pass
+
+class TokenBucket:
+    """
+    Refills continuously at `rate_per_minute` up to one minute's worth of
+    capacity. The level may go negative when a request used more than it
+    reserved, which delays the requests that follow.
+    """
+    def __init__(self, rate_per_minute: float):
+        self.capacity = float(rate_per_minute)
+        self.refill_per_second = rate_per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (0 if it can be taken now)."""
+        self._refill(now)
+        # A request larger than the bucket would never fit; let it through on a full bucket.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.refill_per_second
+
+    def take(self, amount: float):
+        self.level -= amount
+
+    def available(self, now: float) -> float:
+        """The current level, including the refill since the last update."""
+        return min(self.capacity, self.level + (now - self.updated) * self.refill_per_second)
+
+@dataclass
+class QueueStats:
+    """Queueing behaviour of one provider's limiter."""
+    acquired: int = 0
+    rejected: int = 0
+    waiting: int = 0
+    in_flight: int = 0
+    total_wait_seconds: float = 0.0
+    max_wait_seconds: float = 0.0
+
+    @property
+    def mean_wait_seconds(self) -> float:
+        return self.total_wait_seconds / self.acquired if self.acquired else 0.0
+
+class ProviderLimiter:
+    """
+    Enforces one provider's limits. Waiters are served strictly in arrival
+    order: the head of the queue holds a lock while it waits for a
+    concurrency slot and bucket capacity, so a small request cannot
+    starve a large one that arrived first.
+    """
+    def __init__(
+        self,
+        requests_per_minute: Optional[int] = None,
+        tokens_per_minute: Optional[int] = None,
+        max_concurrency: Optional[int] = None,
+    ):
+        self.limits = (requests_per_minute, tokens_per_minute, max_concurrency)
+        self.requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self.tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        self.max_concurrency = max_concurrency
+        self.stats = QueueStats()
+        self._lock = threading.Lock()
+        # asyncio primitives belong to one event loop, so each loop gets its own.
+        self._loop_state: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Tuple[asyncio.Lock, Optional[asyncio.Semaphore]]]" = weakref.WeakKeyDictionary()
+
+    def _primitives(self) -> Tuple[asyncio.Lock, Optional[asyncio.Semaphore]]:
+        loop = asyncio.get_running_loop()
+        state = self._loop_state.get(loop)
+        if state is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+            state = self._loop_state[loop] = (asyncio.Lock(), semaphore)
+        return state
+
+    def _bucket_wait(self, tokens: int) -> float:
+        with self._lock:
+            now = time.monotonic()
+            wait = 0.0
+            if self.requests:
+                wait = max(wait, self.requests.wait_time(1, now))
+            if self.tokens:
+                wait = max(wait, self.tokens.wait_time(tokens, now))
+            if wait <= 0:
+                if self.requests:
+                    self.requests.take(1)
+                if self.tokens:
+                    self.tokens.take(tokens)
+            return wait
+
+    async def _acquire(self, tokens: int):
+        queue_lock, semaphore = self._primitives()
+        async with queue_lock:
+            if semaphore is not None:
+                await semaphore.acquire()
+            try:
+                while True:
+                    wait = self._bucket_wait(tokens)
+                    if wait <= 0:
+                        return
+                    await asyncio.sleep(wait)
+            except BaseException:
+                if semaphore is not None:
+                    semaphore.release()
+                raise
+
+    async def acquire(self, tokens: int, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS):
+        """
+        Waits for a concurrency slot, one request and `tokens` tokens.
+        Raises RateLimitExceededError after `max_wait` seconds.
+        """
+        started = time.monotonic()
+        self.stats.waiting += 1
+        try:
+            await asyncio.wait_for(self._acquire(tokens), timeout=max_wait)
+        except asyncio.TimeoutError:
+            self.stats.rejected += 1
+            raise RateLimitExceededError(f"Waited more than {max_wait}s for rate limit capacity") from None
+        finally:
+            self.stats.waiting -= 1
+        waited = time.monotonic() - started
+        self.stats.acquired += 1
+        self.stats.in_flight += 1
+        self.stats.total_wait_seconds += waited
+        self.stats.max_wait_seconds = max(self.stats.max_wait_seconds, waited)
+
+    def release(self):
+        """Frees the concurrency slot taken by `acquire`."""
+        self.stats.in_flight -= 1
+        _, semaphore = self._primitives()
+        if semaphore is not None:
+            semaphore.release()
+
+    def settle(self, reserved_tokens: int, actual_tokens: int):
+        """Corrects the token bucket once the real usage of a request is known."""
+        if self.tokens:
+            with self._lock:
+                self.tokens.take(actual_tokens - reserved_tokens)
+
+class RateLimiter:
+    """
+    Holds a ProviderLimiter for every provider that declares limits. A
+    provider's limiter is rebuilt when its limits change in providers.json.
+    With a `registry`, each limiter's queue statistics and bucket levels are
+    exported, labeled by provider, and read at scrape time.
+    """
+    def __init__(self, max_wait: float = RATE_LIMIT_MAX_WAIT_SECONDS, registry: Optional[MetricsRegistry] = None):
+        self.max_wait = max_wait
+        self.registry = registry
+        self._lock = threading.Lock()
+        self._limiters: Dict[str, ProviderLimiter] = {}
+        if registry is not None:
+            labels = ("provider",)
+            self._families = {
+                "acquired_total": registry.counter("llm_rate_limit_acquired_total", "Requests admitted by the rate limiter", labels),
+                "rejected_total": registry.counter("llm_rate_limit_rejected_total", "Requests that waited too long for capacity", labels),
+                "wait_seconds_total": registry.counter("llm_rate_limit_wait_seconds_total", "Time admitted requests waited for capacity", labels),
+                "waiting": registry.gauge("llm_rate_limit_waiting", "Requests waiting for capacity", labels),
+                "available_requests": registry.gauge("llm_rate_limit_available_requests", "Requests left in the bucket", labels),
+                "available_tokens": registry.gauge("llm_rate_limit_available_tokens", "Tokens left in the bucket", labels),
+            }
+
+    @staticmethod
+    def key(provider: LLMProvider) -> str:
+        return f"{provider.name}:{provider.model}"
+
+    def limiter(self, provider: LLMProvider) -> Optional[ProviderLimiter]:
+        """Returns the provider's limiter, or None if it declares no limits."""
+        limits = (provider.requests_per_minute, provider.tokens_per_minute, provider.max_concurrency)
+        if not any(limits):
+            return None
+        key = self.key(provider)
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None or limiter.limits != limits:
+                limiter = self._limiters[key] = ProviderLimiter(*limits)
+                if self.registry is not None:
+                    self._export(key, limiter)
+            return limiter
+
+    def _export(self, key: str, limiter: ProviderLimiter):
+        """Exports the limiter's statistics, replacing those of the limiter it was rebuilt from."""
+        stats = limiter.stats
+        functions = {
+            "acquired_total": lambda: stats.acquired,
+            "rejected_total": lambda: stats.rejected,
+            "wait_seconds_total": lambda: stats.total_wait_seconds,
+            "waiting": lambda: stats.waiting,
+        }
+        for name, function in functions.items():
+            self._families[name].labels(provider=key).set_function(function)
+        for name, bucket in (("available_requests", limiter.requests), ("available_tokens", limiter.tokens)):
+            if bucket is None:
+                self._families[name].remove(provider=key)
+            else:
+                self._families[name].labels(provider=key).set_function(lambda bucket=bucket: bucket.available(time.monotonic()))
+
+    async def acquire(self, provider: LLMProvider, tokens: int) -> Optional[ProviderLimiter]:
+        """
+        Waits until the provider has capacity for a request of `tokens`
+        estimated tokens. Returns the limiter to release afterwards, or None
+        if the provider is unlimited.
+        """
+        limiter = self.limiter(provider)
+        if limiter is not None:
+            await limiter.acquire(tokens, self.max_wait)
+        return limiter
+
+    @asynccontextmanager
+    async def limit(self, provider: LLMProvider, tokens: int) -> AsyncIterator[Optional[ProviderLimiter]]:
+        """Holds a rate-limited slot for the provider for the duration of the block."""
+        limiter = await self.acquire(provider, tokens)
+        try:
+            yield limiter
+        finally:
+            if limiter is not None:
+                limiter.release()
+
+    def stats(self, provider: LLMProvider) -> QueueStats:
+        """Returns queueing statistics for a provider (all zero if unlimited)."""
+        with self._lock:
+            limiter = self._limiters.get(self.key(provider))
+        return limiter.stats if limiter is not None else QueueStats()
+
+    def snapshot(self) -> Dict[str, QueueStats]:
+        """Returns queueing statistics for every limited provider seen so far."""
+        with self._lock:
+            return {key: limiter.stats for key, limiter in self._limiters.items()}
+
+# Initialize a default limiter instance
+rate_limiter = RateLimiter(registry=metrics_registry)
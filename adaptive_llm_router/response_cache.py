@@ -0,0 +1,373 @@
+"""
+Two-tier response cache for the Adaptive LLM Router.
+
+The exact tier is keyed by a hash of the normalized prompt, the selected model
+and the meta flags that change the answer. The optional similarity tier finds
+near-identical prompts for the same model using MinHash signatures over word
+shingles, bucketed with LSH banding so lookups only compare a few candidates.
+"""
+
+import atexit
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    RESPONSE_CACHE_KEY_META_FLAGS,
+    RESPONSE_CACHE_MAX_ENTRIES,
+    RESPONSE_CACHE_SIMILARITY_ENABLED,
+    RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+    RESPONSE_CACHE_TTL_SECONDS,
+)
+from .metrics import MetricsRegistry, metrics_registry
+
+try:
+    import fcntl
+except ImportError:  # Windows: no advisory file locks
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+_WHITESPACE = re.compile(r"\s+")
+_MERSENNE_PRIME = (1 << 61) - 1
+_MINHASH_PERMUTATIONS = 64
+_LSH_BANDS = 16
+_LSH_ROWS = _MINHASH_PERMUTATIONS // _LSH_BANDS
+_SHINGLE_SIZE = 3
+
+def _permutation_params() -> List[Tuple[int, int]]:
+    # Derived deterministically so signatures persisted on disk stay comparable
+    # across processes and restarts.
+    params = []
+    for i in range(_MINHASH_PERMUTATIONS):
+        digest = hashlib.blake2b(f"minhash-{i}".encode(), digest_size=16).digest()
+        a = int.from_bytes(digest[:8], "big") % (_MERSENNE_PRIME - 1) + 1
+        b = int.from_bytes(digest[8:], "big") % _MERSENNE_PRIME
+        params.append((a, b))
+    return params
+
+_PERMUTATIONS = _permutation_params()
+
+def normalize_prompt(prompt: str) -> str:
+    """Collapses runs of whitespace so formatting-only differences share a key."""
+    return _WHITESPACE.sub(" ", prompt).strip()
+
+def cache_scope(model: str, meta: Dict[str, Any]) -> str:
+    """
+    Returns the part of the cache key that is independent of the prompt:
+    the selected model plus the meta flags that influence the response.
+    """
+    flags = {k: meta[k] for k in RESPONSE_CACHE_KEY_META_FLAGS if k in meta}
+    return json.dumps({"model": model, "flags": flags}, sort_keys=True, default=str)
+
+def cache_key(prompt: str, model: str, meta: Dict[str, Any]) -> str:
+    """Returns the exact-match key for a prompt sent to a model."""
+    payload = f"{cache_scope(model, meta)}\x00{normalize_prompt(prompt)}"
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def minhash_signature(prompt: str) -> List[int]:
+    """Computes a MinHash signature over lower-cased word shingles of a prompt."""
+    words = normalize_prompt(prompt).lower().split(" ")
+    if len(words) < _SHINGLE_SIZE:
+        shingles = {" ".join(words)}
+    else:
+        shingles = {" ".join(words[i:i + _SHINGLE_SIZE]) for i in range(len(words) - _SHINGLE_SIZE + 1)}
+
+    hashes = [
+        int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big")
+        for s in shingles
+    ]
+    return [
+        min((a * h + b) % _MERSENNE_PRIME for h in hashes)
+        for a, b in _PERMUTATIONS
+    ]
+
+def _estimated_similarity(sig_a: List[int], sig_b: List[int]) -> float:
+    matches = sum(1 for x, y in zip(sig_a, sig_b) if x == y)
+    return matches / len(sig_a)
+
+@dataclass
+class CacheEntry:
+    """A cached LLM response."""
+    key: str
+    scope: str
+    response: Any
+    created_at: float
+    expires_at: float
+    signature: Optional[List[int]] = None
+
+class ResponseCache:
+    """
+    Size-bounded LRU cache of LLM responses with TTL expiry and an on-disk store.
+
+    Entries are appended to a JSON-lines file by a background writer thread, so
+    `set` never touches the disk, and replayed on startup; the file is
+    compacted once it holds more dead lines than live entries. Appends and
+    compaction take an exclusive lock file, so a process rewriting the store
+    never drops another's append. Only prompt hashes and MinHash signatures are written to disk,
+    never the prompt text itself. With a metrics `registry`, the hit, miss,
+    entry and store-size counts are exported and read at scrape time.
+    """
+    def __init__(
+        self,
+        cache_file: Optional[Path] = None,
+        max_entries: int = RESPONSE_CACHE_MAX_ENTRIES,
+        ttl_seconds: float = RESPONSE_CACHE_TTL_SECONDS,
+        similarity_enabled: bool = RESPONSE_CACHE_SIMILARITY_ENABLED,
+        similarity_threshold: float = RESPONSE_CACHE_SIMILARITY_THRESHOLD,
+        registry: Optional[MetricsRegistry] = None,
+    ):
+        self.cache_file = cache_file
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.similarity_enabled = similarity_enabled
+        self.similarity_threshold = similarity_threshold
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self._buckets: Dict[Tuple[str, int, Tuple[int, ...]], set] = {}
+        self._file_lines = 0
+        self.file_bytes = 0
+        self.hits = 0
+        self.similar_hits = 0
+        self.misses = 0
+        self._loaded = False
+        self._write_queue: List[CacheEntry] = []
+        self._write_cond = threading.Condition()
+        self._writing = False
+        self._writer: Optional[threading.Thread] = None
+        if registry is not None:
+            self._export(registry)
+
+    def _export(self, registry: MetricsRegistry):
+        hits = registry.counter("llm_response_cache_hits_total", "Response cache hits, by tier", ("tier",))
+        hits.labels(tier="exact").set_function(lambda: self.hits)
+        hits.labels(tier="similar").set_function(lambda: self.similar_hits)
+        registry.counter("llm_response_cache_misses_total", "Response cache misses").labels().set_function(lambda: self.misses)
+        registry.gauge("llm_response_cache_entries", "Responses held in memory").labels().set_function(lambda: len(self._entries))
+        registry.gauge("llm_response_cache_file_bytes", "Size of the on-disk store").labels().set_function(lambda: self.file_bytes)
+
+    def get(self, prompt: str, model: str, meta: Dict[str, Any]) -> Optional[Any]:
+        """
+        Returns a cached response for the prompt, checking the exact tier first
+        and then, if enabled, the similarity tier. Returns None on a miss.
+        """
+        self._ensure_loaded()
+        key = cache_key(prompt, model, meta)
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry.expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry.response
+                self._remove_locked(key)
+
+        if self.similarity_enabled:
+            scope = cache_scope(model, meta)
+            signature = minhash_signature(prompt)
+            with self._lock:
+                entry = self._find_similar_locked(scope, signature, now)
+                if entry is not None:
+                    self._entries.move_to_end(entry.key)
+                    self.similar_hits += 1
+                    return entry.response
+
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def set(self, prompt: str, model: str, meta: Dict[str, Any], response: Any):
+        """Caches a response and queues it for the on-disk store."""
+        self._ensure_loaded()
+        now = time.time()
+        entry = CacheEntry(
+            key=cache_key(prompt, model, meta),
+            scope=cache_scope(model, meta),
+            response=response,
+            created_at=now,
+            expires_at=now + self.ttl_seconds,
+            signature=minhash_signature(prompt) if self.similarity_enabled else None,
+        )
+        with self._lock:
+            self._insert_locked(entry)
+        self._enqueue_write(entry)
+
+    def flush(self, timeout: float = 5.0) -> bool:
+        """
+        Waits for queued entries to reach the on-disk store.
+        Returns True if they were written within `timeout` seconds.
+        """
+        with self._write_cond:
+            return self._write_cond.wait_for(
+                lambda: not self._write_queue and not self._writing, timeout=timeout
+            )
+
+    def clear(self):
+        """Drops every entry, in memory and on disk."""
+        with self._write_cond:
+            self._write_queue.clear()
+            self._write_cond.wait_for(lambda: not self._writing)
+            with self._lock:
+                self._loaded = True
+                self._entries.clear()
+                self._buckets.clear()
+                self._file_lines = 0
+                self.file_bytes = 0
+            if self.cache_file:
+                with self._file_lock():
+                    if self.cache_file.exists():
+                        self.cache_file.unlink()
+
+    def __len__(self) -> int:
+        self._ensure_loaded()
+        return len(self._entries)
+
+    def _bands(self, scope: str, signature: List[int]):
+        for band in range(_LSH_BANDS):
+            start = band * _LSH_ROWS
+            yield (scope, band, tuple(signature[start:start + _LSH_ROWS]))
+
+    def _find_similar_locked(self, scope: str, signature: List[int], now: float) -> Optional[CacheEntry]:
+        candidates = set()
+        for bucket in self._bands(scope, signature):
+            candidates.update(self._buckets.get(bucket, ()))
+
+        best, best_score = None, self.similarity_threshold
+        for key in candidates:
+            entry = self._entries.get(key)
+            if entry is None or entry.signature is None or entry.expires_at <= now:
+                continue
+            score = _estimated_similarity(signature, entry.signature)
+            if score >= best_score:
+                best, best_score = entry, score
+        return best
+
+    def _insert_locked(self, entry: CacheEntry):
+        if entry.key in self._entries:
+            self._remove_locked(entry.key)
+        self._entries[entry.key] = entry
+        if entry.signature is not None:
+            for bucket in self._bands(entry.scope, entry.signature):
+                self._buckets.setdefault(bucket, set()).add(entry.key)
+        while len(self._entries) > self.max_entries:
+            self._remove_locked(next(iter(self._entries)))
+
+    def _remove_locked(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry.signature is None:
+            return
+        for bucket in self._bands(entry.scope, entry.signature):
+            keys = self._buckets.get(bucket)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._buckets[bucket]
+
+    @staticmethod
+    def _serialize(entry: CacheEntry) -> str:
+        return json.dumps({
+            "key": entry.key,
+            "scope": entry.scope,
+            "response": entry.response,
+            "created_at": entry.created_at,
+            "expires_at": entry.expires_at,
+            "signature": entry.signature,
+        }, separators=(",", ":")) + "\n"
+
+    def _enqueue_write(self, entry: CacheEntry):
+        if not self.cache_file:
+            return
+        with self._write_cond:
+            self._write_queue.append(entry)
+            self._write_cond.notify_all()
+            if self._writer is None:
+                self._writer = threading.Thread(target=self._run_writer, name="response-cache-writer", daemon=True)
+                self._writer.start()
+                atexit.register(self.flush)
+
+    def _run_writer(self):
+        while True:
+            with self._write_cond:
+                self._write_cond.wait_for(lambda: self._write_queue)
+                batch, self._write_queue = self._write_queue, []
+                self._writing = True
+            try:
+                self._append(batch)
+            except OSError as e:
+                logger.warning(f"Response cache write failed: {e}")
+            finally:
+                with self._write_cond:
+                    self._writing = False
+                    self._write_cond.notify_all()
+
+    @contextmanager
+    def _file_lock(self):
+        self.cache_file.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.cache_file.with_suffix(".lock"), "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _append(self, batch: List[CacheEntry]):
+        data = "".join(self._serialize(entry) for entry in batch)
+        with self._file_lock():
+            with open(self.cache_file, "a", encoding="utf-8") as f:
+                f.write(data)
+        with self._lock:
+            self._file_lines += len(batch)
+            self.file_bytes += len(data)
+            compact = self._file_lines > 2 * max(len(self._entries), 1) + 100
+        if compact:
+            self._compact()
+
+    def _compact(self):
+        """Rewrites the store with only the live entries, in LRU order."""
+        with self._lock:
+            live = list(self._entries.values())
+        lines = [self._serialize(entry) for entry in live]
+        tmp_file = self.cache_file.with_suffix(f".{os.getpid()}.tmp")
+        with self._file_lock():
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                f.writelines(lines)
+            os.replace(tmp_file, self.cache_file)
+        with self._lock:
+            self._file_lines = len(lines)
+            self.file_bytes = sum(len(line) for line in lines)
+
+    def _ensure_loaded(self):
+        """Replays the on-disk store on first use, skipping expired and malformed entries."""
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            if not self.cache_file or not self.cache_file.exists():
+                return
+            now = time.time()
+            with open(self.cache_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    self._file_lines += 1
+                    self.file_bytes += len(line)
+                    try:
+                        data = json.loads(line)
+                        entry = CacheEntry(**data)
+                    except (json.JSONDecodeError, TypeError):
+                        continue
+                    if entry.expires_at <= now:
+                        continue
+                    self._insert_locked(entry)
+
+# Initialize a default cache instance
+response_cache_path = Path(__file__).parent / "response_cache.jsonl"
+response_cache = ResponseCache(response_cache_path, registry=metrics_registry)
@@ -0,0 +1,49 @@
+"""
+Coalesces concurrent identical requests into a single in-flight call.
+"""
+
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Tuple
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time; concurrent callers with the same
+    key await the shared result instead of starting their own call.
+
+    The shared call runs as its own task, so a cancelled caller does not
+    cancel the work for the others. Exceptions are delivered to every caller.
+    """
+    def __init__(self):
+        self._inflight: Dict[Tuple[int, str], asyncio.Task] = {}
+        self.calls = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Returns (result, shared), where `shared` is True if the result came
+        from a call started by another caller.
+        """
+        # Tasks are bound to an event loop, so keys are scoped per loop.
+        loop = asyncio.get_running_loop()
+        inflight_key = (id(loop), key)
+
+        task = self._inflight.get(inflight_key)
+        if task is not None:
+            self.coalesced += 1
+            return await asyncio.shield(task), True
+
+        self.calls += 1
+        task = loop.create_task(fn())
+        self._inflight[inflight_key] = task
+        task.add_done_callback(lambda t: self._on_done(inflight_key, t))
+        return await asyncio.shield(task), False
+
+    def _on_done(self, inflight_key: Tuple[int, str], task: asyncio.Task):
+        self._inflight.pop(inflight_key, None)
+        # Mark the exception as retrieved in case every caller was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def in_flight(self) -> int:
+        """Returns the number of calls currently in flight."""
+        return len(self._inflight)
@@ -0,0 +1,118 @@
+"""
+Tiered token estimation for provider selection.
+"""
+
+import asyncio
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Optional
+
+from .config import (
+    TOKEN_ESTIMATE_BYTES_PER_TOKEN,
+    TOKEN_ESTIMATE_CACHE_SIZE,
+    TOKEN_ESTIMATE_MARGIN,
+    TOKEN_ESTIMATE_OFFLOAD_BYTES,
+)
+
+class TokenEstimator:
+    """
+    Estimates token counts as cheaply as the routing decision allows.
+
+    A bytes-per-token heuristic is used whenever no policy threshold lies
+    within its error margin, because the exact count could not change the
+    decision. Only prompts near a threshold are fully encoded; those counts
+    are kept in an LRU keyed by a hash of the prompt, and very large prompts
+    are encoded in a worker thread so the event loop is not blocked.
+    """
+    def __init__(
+        self,
+        encoding_name: str = "cl100k_base",
+        encoding: Optional[Any] = None,
+        cache_size: int = TOKEN_ESTIMATE_CACHE_SIZE,
+        bytes_per_token: float = TOKEN_ESTIMATE_BYTES_PER_TOKEN,
+        margin: float = TOKEN_ESTIMATE_MARGIN,
+        offload_bytes: int = TOKEN_ESTIMATE_OFFLOAD_BYTES,
+    ):
+        self.encoding_name = encoding_name
+        self.cache_size = cache_size
+        self.bytes_per_token = bytes_per_token
+        self.margin = margin
+        self.offload_bytes = offload_bytes
+        self._encoding = encoding
+        self._encoding_lock = threading.Lock()
+        self._cache: "OrderedDict[bytes, int]" = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.heuristic_estimates = 0
+        self.exact_estimates = 0
+        self.cache_hits = 0
+
+    @property
+    def encoding(self):
+        """The tiktoken encoding, loaded on first use."""
+        if self._encoding is None:
+            with self._encoding_lock:
+                if self._encoding is None:
+                    import tiktoken
+                    self._encoding = tiktoken.get_encoding(self.encoding_name)
+        return self._encoding
+
+    def heuristic(self, text: str) -> int:
+        """Approximates the token count from the UTF-8 length."""
+        if not text:
+            return 0
+        return max(1, round(len(text.encode("utf-8")) / self.bytes_per_token))
+
+    def _near_threshold(self, approx: int, thresholds: Iterable[int]) -> bool:
+        low = approx * (1 - self.margin)
+        high = approx * (1 + self.margin)
+        return any(low <= threshold <= high for threshold in thresholds)
+
+    def _cached(self, digest: bytes) -> Optional[int]:
+        with self._cache_lock:
+            count = self._cache.get(digest)
+            if count is not None:
+                self._cache.move_to_end(digest)
+                self.cache_hits += 1
+            return count
+
+    def _store(self, digest: bytes, count: int):
+        with self._cache_lock:
+            self._cache[digest] = count
+            self._cache.move_to_end(digest)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def exact(self, text: str) -> int:
+        """Returns the exact token count, using the LRU when possible."""
+        digest = hashlib.blake2b(text.encode("utf-8"), digest_size=16).digest()
+        count = self._cached(digest)
+        if count is None:
+            count = len(self.encoding.encode(text))
+            self.exact_estimates += 1
+            self._store(digest, count)
+        return count
+
+    def estimate(self, text: str, thresholds: Iterable[int] = ()) -> int:
+        """
+        Returns the heuristic count when it is far from every threshold,
+        otherwise the exact count.
+        """
+        approx = self.heuristic(text)
+        if not self._near_threshold(approx, thresholds):
+            self.heuristic_estimates += 1
+            return approx
+        return self.exact(text)
+
+    async def estimate_async(self, text: str, thresholds: Iterable[int] = ()) -> int:
+        """
+        Like `estimate`, but encodes prompts larger than `offload_bytes` in a
+        worker thread.
+        """
+        approx = self.heuristic(text)
+        if not self._near_threshold(approx, thresholds):
+            self.heuristic_estimates += 1
+            return approx
+        if len(text) < self.offload_bytes:
+            return self.exact(text)
+        return await asyncio.to_thread(self.exact, text)
@@ -0,0 +1,266 @@
+"""
+Lightweight in-process tracing.
+
+A span times one block of work with `time.perf_counter_ns`. The open span is
+kept in a context variable, so spans opened inside it, including in
+coroutines awaited from it and tasks created while it is open, record it as
+their parent. Finished spans are buffered and written to local files by an
+exporter, either as a Chrome trace (chrome://tracing, Perfetto) or as
+OTLP/JSON. Without an exporter, spans only cost two clock reads and a
+context-variable switch.
+"""
+
+import asyncio
+import atexit
+import functools
+import json
+import logging
+import os
+import random
+import threading
+import time
+from contextvars import ContextVar
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+from .config import TRACE_BUFFER_MAX_SPANS
+
+logger = logging.getLogger(__name__)
+
+TRACE_FORMATS = ("chrome", "otlp")
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+def _new_id(bits: int) -> str:
+    return f"{random.getrandbits(bits):0{bits // 4}x}"
+
+def _lane() -> int:
+    """Identifies the asyncio task (or thread) a span runs on, for trace viewers."""
+    try:
+        task = asyncio.current_task()
+    except RuntimeError:
+        task = None
+    return id(task) if task is not None else threading.get_ident()
+
+class Span:
+    """
+    One timed block of work. Use it as a context manager (sync or async);
+    an exception leaving the block marks the span as an error.
+    """
+    __slots__ = (
+        "tracer", "name", "trace_id", "span_id", "parent_id", "attributes",
+        "start_ns", "end_ns", "status", "lane", "_token",
+    )
+
+    def __init__(self, tracer: "Tracer", name: str, parent: Optional["Span"], attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.trace_id = parent.trace_id if parent is not None else _new_id(128)
+        self.span_id = _new_id(64)
+        self.parent_id = parent.span_id if parent is not None else None
+        self.attributes = attributes
+        self.start_ns = 0
+        self.end_ns = 0
+        self.status = "ok"
+        self.lane = 0
+        self._token = None
+
+    @property
+    def duration(self) -> float:
+        """Seconds between entering and leaving the span (so far, if still open)."""
+        end_ns = self.end_ns or time.perf_counter_ns()
+        return (end_ns - self.start_ns) / 1e9
+
+    def set_attribute(self, key: str, value: Any):
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any):
+        self.attributes.update(attributes)
+
+    def __enter__(self) -> "Span":
+        self.lane = _lane()
+        self._token = _current_span.set(self)
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.end_ns = time.perf_counter_ns()
+        if exc_type is not None:
+            self.status = "error"
+            self.attributes.setdefault("error", f"{exc_type.__name__}: {exc_val}")
+        try:
+            _current_span.reset(self._token)
+        except ValueError:
+            # Exited from a different context than it was entered in (e.g. an
+            # abandoned async generator); the entering context is gone anyway.
+            pass
+        self.tracer._finish(self)
+
+    async def __aenter__(self) -> "Span":
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.__exit__(exc_type, exc_val, exc_tb)
+
+class ChromeTraceExporter:
+    """Writes spans as complete ("X") events in the Chrome trace event format."""
+    suffix = ".json"
+
+    def __init__(self, directory: Path):
+        self.directory = directory
+
+    def encode(self, spans: List[Span], epoch_offset_ns: int) -> Dict[str, Any]:
+        pid = os.getpid()
+        events = []
+        for span in spans:
+            events.append({
+                "name": span.name,
+                "cat": span.name.split(".", 1)[0],
+                "ph": "X",
+                "ts": (span.start_ns + epoch_offset_ns) / 1000,
+                "dur": (span.end_ns - span.start_ns) / 1000,
+                "pid": pid,
+                "tid": span.lane,
+                "args": {
+                    **span.attributes,
+                    "trace_id": span.trace_id,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "status": span.status,
+                },
+            })
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, spans: List[Span], epoch_offset_ns: int) -> Path:
+        """Writes one trace file and returns its path."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"trace-{time.time_ns():020d}-{os.getpid()}{self.suffix}"
+        tmp_path = path.with_name(f".{path.name}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.encode(spans, epoch_offset_ns), f, default=str)
+        os.replace(tmp_path, path)
+        return path
+
+class OTLPJsonExporter(ChromeTraceExporter):
+    """Writes spans as an OTLP/JSON `ExportTraceServiceRequest`."""
+    suffix = ".otlp.json"
+
+    def __init__(self, directory: Path, service_name: str = "371_minds_os"):
+        super().__init__(directory)
+        self.service_name = service_name
+
+    @staticmethod
+    def _value(value: Any) -> Dict[str, Any]:
+        if isinstance(value, bool):
+            return {"boolValue": value}
+        if isinstance(value, int):
+            return {"intValue": str(value)}
+        if isinstance(value, float):
+            return {"doubleValue": value}
+        return {"stringValue": str(value)}
+
+    def encode(self, spans: List[Span], epoch_offset_ns: int) -> Dict[str, Any]:
+        otlp_spans = []
+        for span in spans:
+            otlp_span = {
+                "traceId": span.trace_id,
+                "spanId": span.span_id,
+                "name": span.name,
+                "kind": 1,
+                "startTimeUnixNano": str(span.start_ns + epoch_offset_ns),
+                "endTimeUnixNano": str(span.end_ns + epoch_offset_ns),
+                "attributes": [{"key": k, "value": self._value(v)} for k, v in span.attributes.items()],
+                # STATUS_CODE_OK / STATUS_CODE_ERROR
+                "status": {"code": 2 if span.status == "error" else 1},
+            }
+            if span.parent_id:
+                otlp_span["parentSpanId"] = span.parent_id
+            otlp_spans.append(otlp_span)
+        return {"resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": otlp_spans}],
+        }]}
+
+class Tracer:
+    """
+    Creates spans and hands finished ones to the exporter. Spans are
+    buffered and written once `max_spans` have finished, on `flush()`, and
+    at interpreter exit.
+    """
+    def __init__(self, exporter: Optional[ChromeTraceExporter] = None, max_spans: int = TRACE_BUFFER_MAX_SPANS):
+        self.exporter = exporter
+        self.max_spans = max_spans
+        # perf_counter_ns has an arbitrary origin; this maps it onto the wall clock.
+        self.epoch_offset_ns = time.time_ns() - time.perf_counter_ns()
+        self._lock = threading.Lock()
+        self._finished: List[Span] = []
+        self._atexit_registered = False
+
+    def configure(self, exporter: Optional[ChromeTraceExporter]):
+        """Sets the exporter (None disables exporting), flushing spans buffered for the old one."""
+        self.flush()
+        self.exporter = exporter
+
+    def span(self, name: str, **attributes: Any) -> Span:
+        """Returns a span that is a child of the currently open span, if any."""
+        return Span(self, name, _current_span.get(), attributes)
+
+    @staticmethod
+    def current_span() -> Optional[Span]:
+        return _current_span.get()
+
+    def traced(self, name: Optional[str] = None) -> Callable:
+        """Decorator that runs a function or coroutine function inside a span."""
+        def decorator(func: Callable) -> Callable:
+            span_name = name or func.__qualname__
+            if asyncio.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.span(span_name):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.span(span_name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _finish(self, span: Span):
+        if self.exporter is None:
+            return
+        with self._lock:
+            self._finished.append(span)
+            full = len(self._finished) >= self.max_spans
+            if not self._atexit_registered:
+                self._atexit_registered = True
+                atexit.register(self.flush)
+        if full:
+            self.flush()
+
+    def flush(self) -> Optional[Path]:
+        """Exports the buffered spans; returns the file written, if any."""
+        with self._lock:
+            spans, self._finished = self._finished, []
+        if not spans or self.exporter is None:
+            return None
+        try:
+            return self.exporter.export(spans, self.epoch_offset_ns)
+        except OSError as e:
+            logger.warning(f"Dropping {len(spans)} spans, failed to write trace: {e}")
+            return None
+
+def _exporter_from_env() -> Optional[ChromeTraceExporter]:
+    directory = os.getenv("TRACE_EXPORT_DIR")
+    if not directory:
+        return None
+    trace_format = os.getenv("TRACE_EXPORT_FORMAT", "chrome")
+    if trace_format not in TRACE_FORMATS:
+        logger.warning(f"Unknown TRACE_EXPORT_FORMAT '{trace_format}'; use one of {TRACE_FORMATS}.")
+        return None
+    exporter_class = OTLPJsonExporter if trace_format == "otlp" else ChromeTraceExporter
+    return exporter_class(Path(directory))
+
+# Initialize the process-wide tracer; set TRACE_EXPORT_DIR to write traces
+tracer = Tracer(_exporter_from_env())
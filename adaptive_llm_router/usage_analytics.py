@@ -0,0 +1,348 @@
+"""
+Columnar analytics over the LLM usage ledger.
+
+Ledger segments are converted into per-month column files (NumPy `.npy`
+arrays) with the provider, model, agent and status columns dictionary-encoded
+as integer codes. Conversion is incremental: each month remembers the byte
+offset of its JSONL segment it has consumed, so a refresh only parses records
+appended since the last one. Queries memory-map the columns and aggregate
+with vectorized filters and group-bys.
+
+Usage:
+    python -m adaptive_llm_router.usage_analytics --group-by agent,model,day --since 2025-08-01
+"""
+
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+import numpy as np
+
+from .ledger_storage import LedgerStorage
+from .usage_ledger import UsageLedger, usage_ledger
+
+NUMERIC_COLUMNS = {
+    "ts": np.int64,
+    "tokens_in": np.int64,
+    "tokens_out": np.int64,
+    "cost": np.float64,
+}
+CATEGORICAL_COLUMNS = ("provider", "model", "agent", "status")
+COLUMNS = tuple(NUMERIC_COLUMNS) + CATEGORICAL_COLUMNS
+# Group-bys whose packed key space is at most this large are counted into a
+# dense array rather than sorted.
+DENSE_GROUP_LIMIT = 1 << 22
+# Time buckets and their NumPy datetime64 units.
+TIME_BUCKETS = {"hour": "h", "day": "D", "month": "M"}
+
+FilterValue = Union[None, str, Sequence[Optional[str]]]
+
+def _to_epoch_seconds(value: Union[str, datetime]) -> int:
+    """Converts a naive timestamp (as stored in the ledger) to seconds since the epoch."""
+    if isinstance(value, datetime):
+        value = value.isoformat()
+    return int(np.datetime64(value, "us").astype("datetime64[s]").astype(np.int64))
+
+class UsageTable:
+    """
+    An in-memory columnar view of usage records.
+
+    Categorical columns hold integer codes into `dictionaries`; `ts` holds
+    naive timestamps as seconds since the epoch.
+    """
+    def __init__(self, columns: Dict[str, np.ndarray], dictionaries: Dict[str, List[Optional[str]]]):
+        self.columns = columns
+        self.dictionaries = dictionaries
+
+    def __len__(self) -> int:
+        return len(self.columns["ts"])
+
+    def mask(
+        self,
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        **equals: FilterValue,
+    ) -> np.ndarray:
+        """
+        Returns a boolean row mask for records with since <= ts < until whose
+        categorical columns match `equals` (a value or a list of values).
+        """
+        mask = np.ones(len(self), dtype=bool)
+        if since is not None:
+            mask &= self.columns["ts"] >= _to_epoch_seconds(since)
+        if until is not None:
+            mask &= self.columns["ts"] < _to_epoch_seconds(until)
+        for column, wanted in equals.items():
+            if column not in CATEGORICAL_COLUMNS:
+                raise ValueError(f"Cannot filter on column '{column}'.")
+            values = [wanted] if wanted is None or isinstance(wanted, str) else list(wanted)
+            index = {value: code for code, value in enumerate(self.dictionaries[column])}
+            codes = [index[value] for value in values if value in index]
+            mask &= np.isin(self.columns[column], codes)
+        return mask
+
+    def _group_key(self, name: str, rows: np.ndarray) -> np.ndarray:
+        if name in TIME_BUCKETS:
+            buckets = self.columns["ts"][rows].astype("datetime64[s]").astype(f"datetime64[{TIME_BUCKETS[name]}]")
+            return buckets.astype(np.int64)
+        if name in CATEGORICAL_COLUMNS:
+            return self.columns[name][rows].astype(np.int64)
+        raise ValueError(f"Cannot group by '{name}'; use one of {CATEGORICAL_COLUMNS + tuple(TIME_BUCKETS)}.")
+
+    def _decode(self, name: str, code: int) -> Any:
+        if name in TIME_BUCKETS:
+            return str(np.datetime64(code, TIME_BUCKETS[name]))
+        return self.dictionaries[name][code]
+
+    def rollup(
+        self,
+        group_by: Sequence[str] = (),
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        **equals: FilterValue,
+    ) -> List[Dict[str, Any]]:
+        """
+        Aggregates requests, tokens and cost per group, most expensive first.
+        Groups can be any categorical column and/or a time bucket
+        ("hour", "day" or "month").
+        """
+        rows = np.flatnonzero(self.mask(since, until, **equals))
+        if len(rows) == 0:
+            return []
+
+        # Pack the group columns into one int64 key per row (mixed radix), so
+        # the groups and each row's group index come from a single pass.
+        keys = [self._group_key(name, rows) for name in group_by]
+        offsets = [int(k.min()) for k in keys]
+        radices = [int(k.max()) - offset + 1 for k, offset in zip(keys, offsets)]
+        packed = np.zeros(len(rows), dtype=np.int64)
+        for key, offset, radix in zip(keys, offsets, radices):
+            packed = packed * radix + (key - offset)
+
+        key_space = int(np.prod(radices, dtype=np.float64))
+        if key_space <= max(len(rows), DENSE_GROUP_LIMIT):
+            # Small key space: count into a dense array instead of sorting.
+            groups = np.flatnonzero(np.bincount(packed, minlength=key_space))
+            remap = np.empty(key_space, dtype=np.int64)
+            remap[groups] = np.arange(len(groups))
+            inverse = remap[packed]
+        else:
+            groups, inverse = np.unique(packed, return_inverse=True)
+
+        totals = {
+            "requests": np.bincount(inverse, minlength=len(groups)),
+            "tokens_in": np.bincount(inverse, weights=self.columns["tokens_in"][rows], minlength=len(groups)),
+            "tokens_out": np.bincount(inverse, weights=self.columns["tokens_out"][rows], minlength=len(groups)),
+            "cost": np.bincount(inverse, weights=self.columns["cost"][rows], minlength=len(groups)),
+        }
+
+        results = []
+        for i, group in enumerate(groups.tolist()):
+            row: Dict[str, Any] = {}
+            for name, offset, radix in reversed(list(zip(group_by, offsets, radices))):
+                group, code = divmod(group, radix)
+                row[name] = self._decode(name, int(code + offset))
+            row = {name: row[name] for name in group_by}
+            row["requests"] = int(totals["requests"][i])
+            row["tokens_in"] = int(totals["tokens_in"][i])
+            row["tokens_out"] = int(totals["tokens_out"][i])
+            row["cost"] = float(totals["cost"][i])
+            results.append(row)
+        results.sort(key=lambda r: r["cost"], reverse=True)
+        return results
+
+class ColumnarUsageStore:
+    """
+    Maintains column files next to the ledger segments and loads them for queries.
+
+    Each month lives in `column_dir/YYYY-MM/` as one `.npy` file per column
+    plus a `meta.json` with the row count and the segment offset consumed so
+    far. Dictionaries are shared across months and only ever appended to, so
+    codes stay stable. Files are replaced atomically, dictionaries first and
+    `meta.json` last; rows beyond the recorded count are ignored on load, so
+    an interrupted refresh is simply redone.
+    """
+    def __init__(self, ledger: UsageLedger, column_dir: Optional[Path] = None):
+        self.ledger = ledger
+        self.storage: LedgerStorage = ledger.storage
+        self.column_dir = column_dir or self.storage.segment_dir / "columns"
+
+    def _dictionaries_path(self) -> Path:
+        return self.column_dir / "dictionaries.json"
+
+    def _load_dictionaries(self) -> Dict[str, List[Optional[str]]]:
+        path = self._dictionaries_path()
+        if not path.exists():
+            return {column: [] for column in CATEGORICAL_COLUMNS}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def _meta(self, segment_key: str) -> Dict[str, int]:
+        path = self.column_dir / segment_key / "meta.json"
+        if not path.exists():
+            return {"rows": 0, "source_offset": 0}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def _replace_json(path: Path, data: Any):
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+
+    def _load_segment(self, segment_key: str, rows: int, mmap: bool = True) -> Dict[str, np.ndarray]:
+        segment_dir = self.column_dir / segment_key
+        columns = {}
+        for column in COLUMNS:
+            path = segment_dir / f"{column}.npy"
+            if rows == 0 or not path.exists():
+                columns[column] = np.empty(0, dtype=NUMERIC_COLUMNS.get(column, np.int32))
+            else:
+                columns[column] = np.load(path, mmap_mode="r" if mmap else None)[:rows]
+        return columns
+
+    def refresh(self) -> int:
+        """
+        Converts ledger records appended since the last refresh into columns.
+        Returns the number of rows added.
+        """
+        self.ledger.spend  # imports the legacy ledger on first use
+        dictionaries = self._load_dictionaries()
+        lookups = {
+            column: {value: code for code, value in enumerate(dictionaries[column])}
+            for column in CATEGORICAL_COLUMNS
+        }
+        added = 0
+        for segment_key in self.storage.list_segments():
+            meta = self._meta(segment_key)
+            if self.storage.segment_size(segment_key) <= meta["source_offset"]:
+                continue
+
+            new: Dict[str, list] = {column: [] for column in COLUMNS}
+            offset = meta["source_offset"]
+            for record, offset in self.storage.iter_records_from(segment_key, meta["source_offset"]):
+                new["ts"].append(record.get("ts"))
+                new["tokens_in"].append(record.get("tokens_in", 0))
+                new["tokens_out"].append(record.get("tokens_out", 0))
+                new["cost"].append(record.get("cost", 0.0))
+                for column in CATEGORICAL_COLUMNS:
+                    value = record.get(column)
+                    code = lookups[column].get(value)
+                    if code is None:
+                        code = lookups[column][value] = len(dictionaries[column])
+                        dictionaries[column].append(value)
+                    new[column].append(code)
+            if not new["ts"]:
+                continue
+
+            self.column_dir.mkdir(parents=True, exist_ok=True)
+            self._replace_json(self._dictionaries_path(), dictionaries)
+
+            segment_dir = self.column_dir / segment_key
+            segment_dir.mkdir(parents=True, exist_ok=True)
+            existing = self._load_segment(segment_key, meta["rows"], mmap=False)
+            arrays = {
+                "ts": np.array(new["ts"], dtype="datetime64[us]").astype("datetime64[s]").astype(np.int64),
+                "tokens_in": np.array(new["tokens_in"], dtype=np.int64),
+                "tokens_out": np.array(new["tokens_out"], dtype=np.int64),
+                "cost": np.array(new["cost"], dtype=np.float64),
+            }
+            for column in CATEGORICAL_COLUMNS:
+                arrays[column] = np.array(new[column], dtype=np.int32)
+            for column, values in arrays.items():
+                tmp_path = segment_dir / f"{column}.{os.getpid()}.tmp.npy"
+                np.save(tmp_path, np.concatenate([existing[column], values]))
+                os.replace(tmp_path, segment_dir / f"{column}.npy")
+            self._replace_json(segment_dir / "meta.json", {
+                "rows": meta["rows"] + len(new["ts"]),
+                "source_offset": offset,
+            })
+            added += len(new["ts"])
+        return added
+
+    def load(
+        self,
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        refresh: bool = True,
+    ) -> UsageTable:
+        """
+        Returns a table of the months overlapping [since, until). Months
+        outside the range are not read at all.
+        """
+        if refresh:
+            self.refresh()
+        first = str(since)[:7] if since is not None else None
+        last = str(until)[:7] if until is not None else None
+        parts = []
+        for segment_key in self.storage.list_segments():
+            if (first and segment_key < first) or (last and segment_key > last):
+                continue
+            meta = self._meta(segment_key)
+            if meta["rows"]:
+                parts.append(self._load_segment(segment_key, meta["rows"]))
+
+        if parts:
+            columns = {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+        else:
+            columns = {column: np.empty(0, dtype=NUMERIC_COLUMNS.get(column, np.int32)) for column in COLUMNS}
+        return UsageTable(columns, self._load_dictionaries())
+
+    def rollup(
+        self,
+        group_by: Sequence[str] = (),
+        since: Optional[Union[str, datetime]] = None,
+        until: Optional[Union[str, datetime]] = None,
+        **equals: FilterValue,
+    ) -> List[Dict[str, Any]]:
+        """Refreshes the columns and aggregates; see `UsageTable.rollup`."""
+        return self.load(since, until).rollup(group_by, since, until, **equals)
+
+def _format_table(rows: List[Dict[str, Any]]) -> str:
+    if not rows:
+        return "No usage records match."
+    headers = list(rows[0])
+    cells = [[f"{r[h]:.6f}" if h == "cost" else str(r[h]) for h in headers] for r in rows]
+    widths = [max(len(h), *(len(c[i]) for c in cells)) for i, h in enumerate(headers)]
+    lines = ["  ".join(h.ljust(w) for h, w in zip(headers, widths))]
+    lines.append("  ".join("-" * w for w in widths))
+    lines.extend("  ".join(c.ljust(w) for c, w in zip(row, widths)) for row in cells)
+    return "\n".join(lines)
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Cost and token rollups over the LLM usage ledger")
+    parser.add_argument("--group-by", default="agent,model",
+                        help="Comma-separated columns: provider, model, agent, status, hour, day, month")
+    parser.add_argument("--since", help="Include records at or after this date (YYYY-MM-DD[THH:MM])")
+    parser.add_argument("--until", help="Include records before this date (YYYY-MM-DD[THH:MM])")
+    for column in CATEGORICAL_COLUMNS:
+        parser.add_argument(f"--{column}", action="append", help=f"Only include this {column} (repeatable)")
+    parser.add_argument("--limit", type=int, help="Show at most this many groups")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args(argv)
+
+    group_by = [name.strip() for name in args.group_by.split(",") if name.strip()]
+    equals = {column: getattr(args, column) for column in CATEGORICAL_COLUMNS if getattr(args, column)}
+    try:
+        rows = usage_analytics.rollup(group_by, args.since, args.until, **equals)
+    except ValueError as e:
+        parser.error(str(e))
+    if args.limit is not None:
+        rows = rows[:args.limit]
+
+    if args.json:
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    else:
+        print(_format_table(rows))
+
+# Initialize a default analytics store over the default ledger
+usage_analytics = ColumnarUsageStore(usage_ledger)
+
+if __name__ == "__main__":
+    main()
@@ -3,20 +3,188 @@ Persists every request's cost, latency, success, and response quality score.
 """
 
 import json
+import os
+import threading
+import time
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 from datetime import datetime
-import posthog
 
+from .config import SPEND_CHECKPOINT_INTERVAL_RECORDS, SPEND_CHECKPOINT_INTERVAL_SECONDS
 from .data_models import LLMUsage
+from .event_pipeline import event_pipeline
+from .ledger_storage import LedgerStorage
+from .metrics import MetricsRegistry, metrics_registry
+
+class MonthlySpendAccumulator:
+    """
+    Keeps running per-month cost totals so budget checks never rescan the ledger.
+
+    For every segment it remembers the byte offset up to which the segment has
+    been summed. Costs recorded by this process since the last catch-up are
+    held as pending amounts; a catch-up reads only the bytes appended after the
+    stored offset (including records written by other processes) and folds
+    them in. The offsets and totals are persisted as a small checkpoint file so
+    a cold start only needs to read the tail of each segment.
+    """
+    def __init__(
+        self,
+        storage: LedgerStorage,
+        checkpoint_file: Path,
+        checkpoint_every: int = SPEND_CHECKPOINT_INTERVAL_RECORDS,
+        checkpoint_interval: float = SPEND_CHECKPOINT_INTERVAL_SECONDS,
+    ):
+        self.storage = storage
+        self.checkpoint_file = checkpoint_file
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self._lock = threading.Lock()
+        self._offsets: Dict[str, int] = {}
+        self._scanned: Dict[str, float] = {}
+        self._pending: Dict[str, float] = {}
+        self._records_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+        self._seed()
+
+    def _seed(self):
+        """Loads the checkpoint and catches up on every segment."""
+        if self.checkpoint_file.exists():
+            try:
+                checkpoint = json.loads(self.checkpoint_file.read_text())
+            except (json.JSONDecodeError, OSError):
+                checkpoint = {}
+            for segment_key, entry in checkpoint.get("segments", {}).items():
+                self._offsets[segment_key] = int(entry.get("offset", 0))
+                self._scanned[segment_key] = float(entry.get("cost", 0.0))
+
+        with self._lock:
+            for segment_key in self.storage.list_segments():
+                self._catch_up_locked(segment_key)
+            self._write_checkpoint_locked()
+
+    def _catch_up_locked(self, segment_key: str):
+        offset = self._offsets.get(segment_key, 0)
+        if offset > self.storage.segment_size(segment_key):
+            # The segment was truncated or replaced; the checkpoint is stale.
+            offset = 0
+            self._scanned[segment_key] = 0.0
+
+        cost = self._scanned.get(segment_key, 0.0)
+        for record, end_offset in self.storage.iter_records_from(segment_key, offset):
+            cost += record.get('cost', 0.0)
+            offset = end_offset
+
+        self._offsets[segment_key] = offset
+        self._scanned[segment_key] = cost
+        self._pending.pop(segment_key, None)
+
+    def _write_checkpoint_locked(self):
+        checkpoint = {
+            "segments": {
+                key: {"offset": self._offsets[key], "cost": self._scanned.get(key, 0.0)}
+                for key in self._offsets
+            },
+            "written_at": datetime.now().isoformat(),
+        }
+        self.checkpoint_file.parent.mkdir(parents=True, exist_ok=True)
+        tmp_file = self.checkpoint_file.with_suffix(f".{os.getpid()}.tmp")
+        tmp_file.write_text(json.dumps(checkpoint))
+        os.replace(tmp_file, self.checkpoint_file)
+        self._records_since_checkpoint = 0
+        self._last_checkpoint = time.monotonic()
+
+    def add(self, segment_key: str, cost: float):
+        """Adds the cost of a record this process has just appended."""
+        with self._lock:
+            self._add_locked(segment_key, cost)
+            self._maybe_checkpoint_locked()
+
+    def append(self, entries: List[Tuple[str, float, Dict[str, Any]]]):
+        """
+        Appends `(segment_key, cost, record)` entries to the ledger and adds
+        their costs as one step. Holding the lock across both keeps a
+        checkpoint from scanning the new bytes while their costs are still
+        about to become pending, which would count them twice.
+        """
+        with self._lock:
+            self.storage.append_many(record for _, _, record in entries)
+            for segment_key, cost, _ in entries:
+                self._add_locked(segment_key, cost)
+            self._maybe_checkpoint_locked()
+
+    def _add_locked(self, segment_key: str, cost: float):
+        self._pending[segment_key] = self._pending.get(segment_key, 0.0) + cost
+        self._records_since_checkpoint += 1
+
+    def _maybe_checkpoint_locked(self):
+        if (
+            self._records_since_checkpoint >= self.checkpoint_every
+            or time.monotonic() - self._last_checkpoint >= self.checkpoint_interval
+        ):
+            self._checkpoint_locked()
+
+    def _checkpoint_locked(self):
+        for segment_key in set(self._pending) | set(self.storage.list_segments()):
+            self._catch_up_locked(segment_key)
+        self._write_checkpoint_locked()
+
+    def checkpoint(self):
+        """Folds pending costs and other writers' appends in, then persists the totals."""
+        with self._lock:
+            self._checkpoint_locked()
+
+    def get_total(self, segment_key: str) -> float:
+        """
+        Returns the running total for a month in O(1). Appends made by other
+        processes are folded in once the checkpoint interval has elapsed.
+        """
+        with self._lock:
+            if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+                self._checkpoint_locked()
+            return self._scanned.get(segment_key, 0.0) + self._pending.get(segment_key, 0.0)
 
 class UsageLedger:
     """
-    Tracks LLM usage by writing to a JSON file and sending events to PostHog.
+    Tracks LLM usage by appending to segmented ledger files and sending events to PostHog.
+
+    `usage_file` is the legacy JSON-array ledger; its records are imported into
+    the segment store the first time the ledger is used. Nothing is read from
+    disk until then, so importing the router stays cheap. `posthog_client` is
+    anything with posthog's `capture(distinct_id, event, properties)`, normally
+    the shared event pipeline so recording usage never waits on the network.
+    `registry` is passed on to the segment store it creates.
     """
-    def __init__(self, usage_file: Path, posthog_client: Optional[posthog.Posthog] = None):
+    def __init__(
+        self,
+        usage_file: Path,
+        posthog_client: Optional[Any] = None,
+        storage: Optional[LedgerStorage] = None,
+        registry: Optional[MetricsRegistry] = None,
+    ):
         self.usage_file = usage_file
         self.posthog_client = posthog_client
+        self.storage = storage or LedgerStorage(usage_file.parent / usage_file.stem, registry=registry)
+        self._spend: Optional[MonthlySpendAccumulator] = None
+        self._open_lock = threading.Lock()
+
+    @property
+    def spend(self) -> MonthlySpendAccumulator:
+        """The running monthly totals, opened on first use."""
+        if self._spend is None:
+            with self._open_lock:
+                if self._spend is None:
+                    self.storage.import_legacy(self.usage_file)
+                    self._spend = MonthlySpendAccumulator(
+                        self.storage, self.storage.segment_dir / "spend_checkpoint.json"
+                    )
+        return self._spend
+
+    def iter_records(self, segment_key: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        Yields raw ledger records for one month ("YYYY-MM") or for all months.
+        """
+        self.spend  # make sure the legacy ledger has been imported
+        return self.storage.iter_records(segment_key)
 
     def record_usage(self, usage_data: LLMUsage):
         """
@@ -25,26 +193,33 @@ class UsageLedger:
         self._write_to_ledger(usage_data)
         self._capture_posthog_event(usage_data)
 
-    def _write_to_ledger(self, usage_data: LLMUsage):
-        """Appends a usage record to the JSON file."""
-        records = []
-        if self.usage_file.exists():
-            with open(self.usage_file, 'r') as f:
-                try:
-                    records = json.load(f)
-                except json.JSONDecodeError:
-                    records = []
+    def record_usage_batch(self, usage_records: List[LLMUsage]):
+        """
+        Records several usage events with a single ledger append.
+        """
+        self.spend.append([self._ledger_entry(u) for u in usage_records])
+        for usage_data in usage_records:
+            self._capture_posthog_event(usage_data)
 
-        records.append(usage_data.model_dump(mode='json'))
+    def _write_to_ledger(self, usage_data: LLMUsage):
+        """Appends a usage record to its month's segment and updates the running total."""
+        # Open the ledger first so the seeding scan cannot count this record twice.
+        self.spend.append([self._ledger_entry(usage_data)])
 
-        with open(self.usage_file, 'w') as f:
-            json.dump(records, f, indent=2)
+    @staticmethod
+    def _ledger_entry(usage_data: LLMUsage) -> Tuple[str, float, Dict[str, Any]]:
+        return (
+            LedgerStorage.segment_key_for(usage_data.ts),
+            usage_data.cost,
+            usage_data.model_dump(mode='json'),
+        )
 
     def _capture_posthog_event(self, usage_data: LLMUsage):
         """Sends a 'llm_usage' event to PostHog."""
         if self.posthog_client:
             self.posthog_client.capture(
-                "llm_usage",
+                distinct_id=usage_data.agent or "system",
+                event="llm_usage",
                 properties={
                     "provider": usage_data.provider,
                     "model": usage_data.model,
@@ -59,30 +234,16 @@ class UsageLedger:
 
     def get_total_cost_for_current_month(self) -> float:
         """
-        Calculates the total cost of LLM usage for the current calendar month.
+        Returns the total cost of LLM usage for the current calendar month.
         """
-        if not self.usage_file.exists():
-            return 0.0
-
-        with open(self.usage_file, 'r') as f:
-            try:
-                records = json.load(f)
-            except json.JSONDecodeError:
-                return 0.0
+        return self.get_total_cost_for_month(datetime.now().year, datetime.now().month)
 
-        total_cost = 0.0
-        current_month = datetime.now().month
-        current_year = datetime.now().year
-
-        for record in records:
-            # record['ts'] is a string, so we need to parse it
-            record_ts = datetime.fromisoformat(record['ts'])
-            if record_ts.month == current_month and record_ts.year == current_year:
-                total_cost += record.get('cost', 0.0)
-
-        return total_cost
+    def get_total_cost_for_month(self, year: int, month: int) -> float:
+        """
+        Returns the total cost of LLM usage for a given calendar month.
+        """
+        return self.spend.get_total(LedgerStorage.segment_key_for(datetime(year, month, 1)))
 
 # Initialize a default ledger instance
 usage_path = Path(__file__).parent / "llm_usage.json"
-# The PostHog client will be set later during the integration.
-usage_ledger = UsageLedger(usage_path)
+usage_ledger = UsageLedger(usage_path, posthog_client=event_pipeline, registry=metrics_registry)
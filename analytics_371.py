@@ -1,32 +1,157 @@
 # PostHog Analytics Helper for 371 Minds OS
 # Provides unified tracking across all agents and systems
 
+import hashlib
+import json
+import math
+import random
+import threading
 import time
 from datetime import datetime
-from typing import Dict, Optional, Any
+from typing import Dict, Iterable, List, Optional, Any, Tuple
 
-import posthog
+from adaptive_llm_router.event_pipeline import EventPipeline, event_pipeline
+from adaptive_llm_router.metrics import MetricsRegistry, metrics_registry
+from adaptive_llm_router.tracing import tracer
+
+# Fraction of raw events sent, per event name; events not listed are always sent.
+# Agent executions are mostly covered by the periodic summaries below.
+DEFAULT_SAMPLE_RATES = {"agent_execution": 0.01}
+
+# Agent executions and errors are pre-aggregated per (agent_type, status) and
+# sent as "agent_execution_summary" events at most this often.
+AGGREGATION_FLUSH_INTERVAL_SECONDS = 60.0
+
+# Latency percentiles in summary events; they cover the metrics registry's
+# sliding window (METRICS_WINDOW_SECONDS), which matches the flush interval.
+SUMMARY_QUANTILES = (0.50, 0.90, 0.95, 0.99)
+
+# Property limits: longer strings are truncated, nested values larger than
+# MAX_NESTED_PROPERTY_BYTES (as UTF-8 JSON) are replaced by a `{key}_bytes`
+# property holding that encoded size, and
+# properties beyond MAX_PROPERTY_COUNT are dropped.
+MAX_PROPERTY_COUNT = 50
+MAX_STRING_LENGTH = 512
+MAX_NESTED_PROPERTY_BYTES = 1024
+
+# Properties whose values are unique per event; they are sent as short hashes
+# so they can still be joined on without bloating property cardinality.
+HIGH_CARDINALITY_PROPERTIES = ("task_id", "repo_url")
+
+class ExecutionAggregator:
+    """Counts executions per (agent_type, status) between flushes
+
+    Latencies are observed into the registry's `agent_execution_seconds`
+    histogram, so they are also exported with the other metrics; summaries
+    take their percentiles from it.
+    """
+
+    def __init__(self, registry: MetricsRegistry = metrics_registry):
+        self.latency = registry.histogram(
+            "agent_execution_seconds", "Agent execution time, by agent type and status", ("agent_type", "status")
+        )
+        self._lock = threading.Lock()
+        self._windows: Dict[Tuple[str, str], List[float]] = {}  # [count, total, max]
+        self.window_start = time.time()
+
+    def record(self, agent_type: str, status: str, execution_time: float):
+        self.latency.labels(agent_type=agent_type, status=status).observe(execution_time)
+        with self._lock:
+            window = self._windows.get((agent_type, status))
+            if window is None:
+                window = self._windows[(agent_type, status)] = [0, 0.0, execution_time]
+            window[0] += 1
+            window[1] += execution_time
+            window[2] = max(window[2], execution_time)
+
+    def drain(self) -> List[Dict[str, Any]]:
+        """Returns one summary per (agent_type, status) and starts a new window"""
+        with self._lock:
+            windows, self._windows = self._windows, {}
+            window_start, self.window_start = self.window_start, time.time()
+
+        summaries = []
+        for (agent_type, status), (count, total, maximum) in windows.items():
+            quantiles = self.latency.labels(agent_type=agent_type, status=status).quantiles(SUMMARY_QUANTILES)
+            summary = {
+                "agent_type": agent_type,
+                "status": status,
+                "count": count,
+                "execution_time_mean": total / count,
+            }
+            for q, value in quantiles.items():
+                # NaN if a late flush found the values already out of the window
+                summary[f"execution_time_p{round(q * 100)}"] = maximum if math.isnan(value) else min(value, maximum)
+            summary.update({
+                "execution_time_max": maximum,
+                "window_start": datetime.fromtimestamp(window_start).isoformat(),
+                "window_end": datetime.now().isoformat(),
+                "platform": "371_minds_os",
+            })
+            summaries.append(summary)
+        return summaries
+
+def hash_value(value: Any) -> str:
+    """Short, stable hash of a high-cardinality property value"""
+    return hashlib.blake2b(str(value).encode("utf-8"), digest_size=8).hexdigest()
+
+def limit_properties(properties: Dict[str, Any],
+                     hashed: Iterable[str] = HIGH_CARDINALITY_PROPERTIES,
+                     max_count: int = MAX_PROPERTY_COUNT,
+                     max_string_length: int = MAX_STRING_LENGTH,
+                     max_nested_bytes: int = MAX_NESTED_PROPERTY_BYTES) -> Dict[str, Any]:
+    """Applies hashing and size limits to event properties"""
+    hashed = set(hashed)
+    limited: Dict[str, Any] = {}
+    for key, value in properties.items():
+        if len(limited) >= max_count:
+            limited["properties_dropped"] = len(properties) - max_count
+            break
+        if key in hashed and value is not None:
+            limited[key] = hash_value(value)
+        elif isinstance(value, str) and len(value) > max_string_length:
+            limited[key] = value[:max_string_length] + "..."
+        elif isinstance(value, (dict, list, tuple, set)):
+            encoded = json.dumps(
+                value if not isinstance(value, set) else sorted(value, key=str), default=str
+            ).encode("utf-8")
+            if len(encoded) > max_nested_bytes:
+                limited[f"{key}_bytes"] = len(encoded)
+            else:
+                limited[key] = value
+        else:
+            limited[key] = value
+    return limited
 
 # Forward declaration for type hinting
 class Analytics371:
     pass
 
 class TrackExecution:
-    """Context manager to automatically track execution time"""
+    """Context manager that runs a block in a trace span and tracks its execution time
+
+    Works with both `with` and `async with`. Spans opened inside the block
+    (see `adaptive_llm_router.tracing.tracer`) are recorded as its children.
+    """
 
-    def __init__(self, analytics: Analytics371, task_id: str, agent_type: str, user_id: str = "system"):
+    def __init__(self, analytics: Analytics371, task_id: str, agent_type: str, user_id: str = "system",
+                 **attributes: Any):
         self.analytics = analytics
         self.task_id = task_id
         self.agent_type = agent_type
         self.user_id = user_id
-        self.start_time = None
+        self.span = tracer.span(agent_type, task_id=task_id, **attributes)
+
+    def set_attribute(self, key: str, value: Any):
+        self.span.set_attribute(key, value)
 
     def __enter__(self):
-        self.start_time = time.time()
+        self.span.__enter__()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
-        execution_time = time.time() - self.start_time
+        self.span.__exit__(exc_type, exc_val, exc_tb)
+        execution_time = self.span.duration
 
         if exc_type is None:
             # Success
@@ -47,13 +172,87 @@ class TrackExecution:
                 user_id=self.user_id
             )
 
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        self.__exit__(exc_type, exc_val, exc_tb)
+
 class Analytics371:
-    """Centralized analytics system for 371 Minds OS"""
+    """Centralized analytics system for 371 Minds OS
+
+    Events go through the shared event pipeline, so tracking calls only
+    enqueue and never wait on PostHog. Raw events are sampled per event name
+    (sampled events carry a `sample_rate` property for re-weighting), and
+    agent executions are also summarized per agent type and status, with
+    latency percentiles from the `agent_execution_seconds` histogram in
+    `registry`, at most `flush_interval` seconds after they are recorded. Pending summaries are also sent when the pipeline shuts down.
 
-    def __init__(self, api_key: str, host: str = "https://us.i.posthog.com"):
-        posthog.project_api_key = api_key
-        posthog.host = host
-        self.client = posthog
+    The pipeline is shared, so `api_key` only configures it when no other
+    caller has; without a key the existing configuration is left alone.
+    """
+
+    def __init__(self, api_key: Optional[str] = None, host: str = "https://us.i.posthog.com",
+                 pipeline: Optional[EventPipeline] = None,
+                 sample_rates: Optional[Dict[str, float]] = None,
+                 flush_interval: float = AGGREGATION_FLUSH_INTERVAL_SECONDS,
+                 hashed_properties: Iterable[str] = HIGH_CARDINALITY_PROPERTIES,
+                 registry: MetricsRegistry = metrics_registry):
+        self.client = pipeline or event_pipeline
+        if api_key and self.client.sink is None:
+            self.client.configure(api_key, host)
+        self.sample_rates = dict(DEFAULT_SAMPLE_RATES if sample_rates is None else sample_rates)
+        self.flush_interval = flush_interval
+        self.hashed_properties = tuple(hashed_properties)
+        self.aggregator = ExecutionAggregator(registry)
+        self._last_flush = time.monotonic()
+        self._timer: Optional[threading.Timer] = None
+        self._timer_lock = threading.Lock()
+        self.client.add_flush_hook(self.flush)
+
+    def _emit(self, event: str, properties: Dict[str, Any], user_id: str):
+        """Samples, limits and queues one raw event"""
+        rate = self.sample_rates.get(event, 1.0)
+        if rate < 1.0:
+            if random.random() >= rate:
+                return
+            properties["sample_rate"] = rate
+        self.client.capture(
+            distinct_id=user_id,
+            event=event,
+            properties=limit_properties(properties, self.hashed_properties)
+        )
+
+    def _record_execution(self, agent_type: str, status: str, execution_time: float):
+        self.aggregator.record(agent_type, status, execution_time)
+        if time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        """Starts a timer so a quiet window is still flushed after `flush_interval`"""
+        with self._timer_lock:
+            if self._timer is not None:
+                return
+            self._timer = threading.Timer(self.flush_interval, self._timed_flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def _timed_flush(self):
+        with self._timer_lock:
+            self._timer = None
+        self.flush()
+
+    def flush(self):
+        """Sends the pending execution summaries"""
+        self._last_flush = time.monotonic()
+        for summary in self.aggregator.drain():
+            self.client.capture(
+                distinct_id="system",
+                event="agent_execution_summary",
+                properties=summary
+            )
 
     def track_agent_execution(self,
                             task_id: str,
@@ -76,11 +275,8 @@ class Analytics371:
         if metadata:
             properties.update(metadata)
 
-        self.client.capture(
-            distinct_id=user_id,
-            event="agent_execution",
-            properties=properties
-        )
+        self._record_execution(agent_type, status, execution_time)
+        self._emit("agent_execution", properties, user_id)
 
     def track_repository_analysis(self,
                                 task_id: str,
@@ -101,11 +297,7 @@ class Analytics371:
         # Merge context dictionary into properties
         properties.update(context)
 
-        self.client.capture(
-            distinct_id=user_id,
-            event="repository_analyzed",
-            properties=properties
-        )
+        self._emit("repository_analyzed", properties, user_id)
 
     def track_code_generation(self,
                             task_id: str,
@@ -124,11 +316,7 @@ class Analytics371:
             "timestamp": datetime.now().isoformat()
         }
 
-        self.client.capture(
-            distinct_id=user_id,
-            event="code_generated",
-            properties=properties
-        )
+        self._emit("code_generated", properties, user_id)
 
     def track_error(self,
                    task_id: str,
@@ -146,8 +334,5 @@ class Analytics371:
             "timestamp": datetime.now().isoformat()
         }
 
-        self.client.capture(
-            distinct_id=user_id,
-            event="agent_error",
-            properties=properties
-        )
+        self._record_execution(agent_type, "error", execution_time)
+        self._emit("agent_error", properties, user_id)
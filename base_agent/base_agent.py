@@ -10,9 +10,9 @@ import uuid
 from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Dict, List, Optional, Any, Callable
+from typing import AsyncIterator, Dict, List, Optional, Any, Callable
 from datetime import datetime
-from adaptive_llm_router.llm import invoke as alr_invoke
+from adaptive_llm_router.llm import invoke as alr_invoke, invoke_stream as alr_invoke_stream
 
 class AgentType(Enum):
     """Types of agents in the 371 Minds OS"""
@@ -131,6 +131,20 @@ class BaseAgent(ABC):
 
         return await alr_invoke(prompt, meta, user_id=self.agent_id)
 
+    async def llm_invoke_stream(self, prompt: str, meta: Optional[Dict[str, Any]] = None) -> AsyncIterator[str]:
+        """
+        A wrapper to stream a response from the Adaptive LLM Router chunk by chunk.
+        """
+        if meta is None:
+            meta = {}
+
+        meta["agent_name"] = self.agent_type.value
+        if self.current_task:
+            meta["task_id"] = self.current_task.id
+
+        async for chunk in alr_invoke_stream(prompt, meta, user_id=self.agent_id):
+            yield chunk
+
     async def execute_task(self, task: Task) -> Task:
         """Execute a task and update its status"""
         self.is_busy = True
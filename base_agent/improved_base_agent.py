@@ -7,8 +7,15 @@ Incorporates performance optimizations and monitoring capabilities
 """
 
 import asyncio
+import hashlib
+import heapq
+import itertools
 import json
 import logging
+import math
+import pickle
+import random
+import sqlite3
 import uuid
 import time
 import weakref
@@ -16,15 +23,57 @@ from abc import ABC, abstractmethod
 from dataclasses import dataclass, field
 from enum import Enum
 from typing import Dict, List, Optional, Any, Callable
-from datetime import datetime
-from contextlib import asynccontextmanager
+from datetime import date, datetime
+from contextlib import asynccontextmanager, nullcontext
 from adaptive_llm_router.llm import invoke as alr_invoke
+from adaptive_llm_router.circuit_breaker import CircuitBreakerRegistry, circuit_breakers
+from adaptive_llm_router.metrics import MetricsRegistry, merged_quantiles, metrics_registry
+from adaptive_llm_router.config import ROUTING_POLICY_VERSION
+from adaptive_llm_router.response_cache import normalize_prompt
 
 # Performance and monitoring imports
 import psutil
-from collections import defaultdict, deque
+from collections import OrderedDict, defaultdict, deque
 import threading
 
+# Request meta fields that identify a request rather than shape its answer;
+# they are left out of response cache keys.
+VOLATILE_META_FIELDS = frozenset({
+    "task_id", "agent_id", "agent_name", "user_id", "request_id",
+    "trace_id", "timestamp", "cache", "hedge",
+})
+
+def _canonical_default(value: Any) -> Any:
+    if isinstance(value, (set, frozenset)):
+        return sorted(value, key=repr)
+    if isinstance(value, Enum):
+        return value.value
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    # str() of arbitrary objects often embeds an id() that differs per process
+    raise TypeError(f"Cannot build a stable cache key from {type(value).__name__}")
+
+def stable_cache_key(prompt: str, meta: Dict[str, Any], namespace: str = f"policy-{ROUTING_POLICY_VERSION}") -> str:
+    """Content-addressed cache key for an LLM request
+
+    The key is a BLAKE2b digest of the namespace, the whitespace-normalized
+    prompt and canonical JSON of the non-volatile meta fields, so it is the
+    same in every process and across restarts. Bumping the namespace (by
+    default the router's ROUTING_POLICY_VERSION) invalidates old entries.
+    Raises TypeError if a meta value has no stable JSON encoding.
+    """
+    stable_meta = {k: v for k, v in meta.items() if k not in VOLATILE_META_FIELDS}
+    canonical_meta = json.dumps(
+        stable_meta, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=_canonical_default
+    )
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (namespace, normalize_prompt(prompt), canonical_meta):
+        data = part.encode("utf-8")
+        # Length-prefixed so no two different (prompt, meta) pairs hash the same input
+        digest.update(f"{len(data)}:".encode("ascii"))
+        digest.update(data)
+    return digest.hexdigest()
+
 class AgentType(Enum):
     """Types of agents in the 371 Minds OS"""
     INTELLIGENT_ROUTER = "intelligent_router"
@@ -77,6 +126,9 @@ class Task:
     retry_count: int = 0
     max_retries: int = 3
     timeout_seconds: Optional[int] = 300
+    tenant_id: Optional[str] = None  # Fair-queuing group; defaults to payload["user_id"]
+    upstream: Optional[str] = None  # Circuit breaker key of the external API the task depends on; defaults per agent type and task type
+    task_type: str = "default"  # Metrics label; keep the set of values small
     
     @property
     def processing_time(self) -> Optional[float]:
@@ -85,148 +137,426 @@ class Task:
             return (self.completed_at - self.started_at).total_seconds()
         return None
 
-@dataclass
 class PerformanceMetrics:
-    """Agent performance metrics"""
-    tasks_completed: int = 0
-    tasks_failed: int = 0
-    total_processing_time: float = 0.0
-    avg_response_time: float = 0.0
-    current_memory_mb: float = 0.0
-    peak_memory_mb: float = 0.0
-    cpu_usage_percent: float = 0.0
-    error_rate: float = 0.0
-    throughput: float = 0.0  # tasks per second
-    cache_hits: int = 0
-    cache_misses: int = 0
-    
-    def update_response_time(self, processing_time: float):
-        """Update average response time"""
-        total_tasks = self.tasks_completed + self.tasks_failed
-        if total_tasks > 0:
-            self.total_processing_time += processing_time
-            self.avg_response_time = self.total_processing_time / total_tasks
-    
-    def calculate_error_rate(self) -> float:
-        """Calculate current error rate"""
-        total_tasks = self.tasks_completed + self.tasks_failed
-        if total_tasks > 0:
-            self.error_rate = (self.tasks_failed / total_tasks) * 100
-        return self.error_rate
+    """Agent performance metrics, recorded in the shared metrics registry
+    
+    Task outcomes and latencies are labeled by agent type, agent ID and task
+    type and exported with every other agent's metrics. Latency percentiles
+    and throughput cover the registry's sliding window; the attributes here
+    are this agent's view of them. Gauges and watched values are removed by
+    unregister() when the agent shuts down; task counts are kept.
+    """
+    LABELS = ("agent_type", "agent_id")
+    
+    def __init__(self, agent_type: str, agent_id: str, registry: MetricsRegistry = metrics_registry):
+        self.registry = registry
+        self.labels = {"agent_type": agent_type, "agent_id": agent_id}
+        self._tasks = registry.counter(
+            "agent_tasks_total", "Tasks finished, by outcome", self.LABELS + ("task_type", "status")
+        )
+        self._durations = registry.histogram(
+            "agent_task_duration_seconds", "Task processing time", self.LABELS + ("task_type",)
+        )
+        self._retries = registry.counter("agent_task_retries_total", "Task retries scheduled", self.LABELS).labels(**self.labels)
+        memory = registry.gauge("agent_memory_rss_bytes", "Resident memory of the agent process", self.LABELS)
+        cpu = registry.gauge("agent_cpu_percent", "CPU usage of the agent process", self.LABELS)
+        self._memory = memory.labels(**self.labels)
+        self._cpu = cpu.labels(**self.labels)
+        self._gauge_families = [memory, cpu]
+        self._task_counters: Dict[tuple, Any] = {}
+        self._task_histograms: Dict[str, Any] = {}
+        self.current_memory_mb = 0.0
+        self.peak_memory_mb = 0.0
+        self.cpu_usage_percent = 0.0
+    
+    def record_task(self, task_type: str, status: str, processing_time: Optional[float]):
+        """Count a finished task and record how long it took"""
+        counter = self._task_counters.get((task_type, status))
+        if counter is None:
+            counter = self._task_counters[(task_type, status)] = self._tasks.labels(
+                task_type=task_type, status=status, **self.labels
+            )
+        counter.inc()
+        if processing_time is None:
+            return
+        histogram = self._task_histograms.get(task_type)
+        if histogram is None:
+            histogram = self._task_histograms[task_type] = self._durations.labels(task_type=task_type, **self.labels)
+        histogram.observe(processing_time)
+    
+    def record_retry(self):
+        self._retries.inc()
+    
+    def update_resources(self, memory_mb: float, cpu_percent: float):
+        """Record the process's current memory and CPU usage"""
+        self.current_memory_mb = memory_mb
+        self.peak_memory_mb = max(self.peak_memory_mb, memory_mb)
+        self.cpu_usage_percent = cpu_percent
+        self._memory.set(memory_mb * 1024 * 1024)
+        self._cpu.set(cpu_percent)
+    
+    def watch(self, name: str, help_text: str, function: Callable[[], float], kind: str = "gauge"):
+        """Export a value computed at scrape time, labeled with this agent"""
+        family = self.registry.counter(name, help_text, self.LABELS) if kind == "counter" else self.registry.gauge(name, help_text, self.LABELS)
+        family.labels(**self.labels).set_function(function)
+        self._gauge_families.append(family)
+    
+    def unregister(self):
+        """Remove this agent's gauges and watched values from the registry"""
+        for family in self._gauge_families:
+            family.remove(**self.labels)
+        self._gauge_families.clear()
+    
+    def _count(self, status: str) -> int:
+        return int(sum(c.value for (_, s), c in list(self._task_counters.items()) if s == status))
+    
+    @property
+    def tasks_completed(self) -> int:
+        return self._count("completed")
+    
+    @property
+    def tasks_failed(self) -> int:
+        return self._count("failed")
+    
+    @property
+    def error_rate(self) -> float:
+        """Percentage of finished tasks that failed"""
+        completed, failed = self.tasks_completed, self.tasks_failed
+        return failed / (completed + failed) * 100 if completed + failed else 0.0
+    
+    @property
+    def throughput(self) -> float:
+        """Tasks completed per second over the sliding window"""
+        return sum(c.rate() for (_, s), c in list(self._task_counters.items()) if s == "completed")
+    
+    @property
+    def avg_response_time(self) -> float:
+        histograms = list(self._task_histograms.values())
+        count = sum(h.count for h in histograms)
+        return sum(h.sum for h in histograms) / count if count else 0.0
+    
+    def latency_percentiles(self) -> Dict[str, float]:
+        """p50/p95/p99 task processing time over the sliding window, across task types"""
+        histograms = list(self._task_histograms.values())
+        if not histograms:
+            return {f"p{round(q * 100)}": 0.0 for q in self.registry.quantiles}
+        quantiles = merged_quantiles(histograms, self.registry.quantiles)
+        return {f"p{round(q * 100)}": (0.0 if math.isnan(v) else v) for q, v in quantiles.items()}
 
 class ConnectionPool:
-    """Simple connection pool for LLM API calls"""
+    """Bounds an agent's concurrent LLM calls over the process-wide HTTP pool
+
+    The connections themselves (keep-alive, HTTP/2, per-host limits, idle
+    eviction) live in adaptive_llm_router.http_pool and are shared by every
+    agent in the process; this only caps how many of them one agent uses.
+    """
     def __init__(self, max_connections: int = 10):
         self.max_connections = max_connections
-        self.available_connections = asyncio.Queue(maxsize=max_connections)
         self.active_connections = 0
-        self._lock = asyncio.Lock()
+        self._semaphore = asyncio.Semaphore(max_connections)
         
-    async def get_connection(self):
-        """Get a connection from the pool"""
-        async with self._lock:
-            if self.active_connections < self.max_connections:
-                self.active_connections += 1
-                return f"connection_{self.active_connections}"
-            else:
-                # Wait for available connection
-                return await self.available_connections.get()
-    
-    async def return_connection(self, connection):
-        """Return a connection to the pool"""
-        await self.available_connections.put(connection)
-
-class SimpleCache:
-    """Simple TTL cache for agent responses"""
-    def __init__(self, max_size: int = 1000, ttl_seconds: int = 3600):
-        self.cache: Dict[str, tuple] = {}  # key: (value, expiry_time)
-        self.max_size = max_size
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one of the agent's call slots for the duration of the block"""
+        async with self._semaphore:
+            self.active_connections += 1
+            try:
+                yield
+            finally:
+                self.active_connections -= 1
+
+class SQLiteCacheBackend:
+    """On-disk cache tier shared by worker processes on one host
+
+    Values are stored pickled in a SQLite database in WAL mode, so readers
+    in other processes do not block writers. Only point it at a file that
+    trusted processes write to: values are unpickled on read.
+    """
+    def __init__(self, path: str, max_bytes: int = 512 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires_at)")
+            self._local.conn = conn
+        return conn
+
+    def get(self, key: str, now: float) -> Optional[tuple]:
+        """Return (pickled value, expires_at) if the key is present and fresh"""
+        return self._conn().execute(
+            "SELECT value, expires_at FROM cache WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+
+    def set(self, key: str, data: bytes, expires_at: float):
+        with self._conn() as conn:
+            conn.execute("INSERT OR REPLACE INTO cache VALUES (?, ?, ?)", (key, data, expires_at))
+
+    def purge(self, now: float):
+        """Drop expired rows, then the soonest-expiring rows while over max_bytes"""
+        with self._conn() as conn:
+            conn.execute("DELETE FROM cache WHERE expires_at <= ?", (now,))
+            total = conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM cache").fetchone()[0]
+            if total > self.max_bytes:
+                conn.execute(
+                    "DELETE FROM cache WHERE key IN ("
+                    "SELECT key FROM (SELECT key, SUM(LENGTH(value)) OVER (ORDER BY expires_at DESC) AS kept FROM cache) "
+                    "WHERE kept > ?)",
+                    (self.max_bytes,)
+                )
+
+class LRUCache:
+    """Byte-bounded LRU cache with TTL expiry for agent responses
+
+    Entries are kept in an OrderedDict in recency order, so lookups, inserts
+    and evictions are O(1), and in a second OrderedDict in insertion order;
+    since every entry gets the same TTL that is also expiry order, so
+    expired entries are dropped from its head without scanning. An entry's
+    size is the length of its pickled value. With a `backend`, local misses
+    fall through to it and every set is written to it, so worker processes
+    share hits.
+    """
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        ttl_seconds: int = 3600,
+        backend: Optional[SQLiteCacheBackend] = None
+    ):
+        self.max_bytes = max_bytes
         self.ttl_seconds = ttl_seconds
-        self.access_times = deque()
+        self.backend = backend
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key: (value, size, expires_at)
+        self._expiry: "OrderedDict[str, float]" = OrderedDict()
+        self.size_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
         
     def get(self, key: str) -> Optional[Any]:
         """Get value from cache"""
-        if key in self.cache:
-            value, expiry_time = self.cache[key]
-            if time.time() < expiry_time:
+        now = time.time()
+        self._expire(now)
+        entry = self._entries.get(key)
+        if entry is not None and entry[2] > now:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+
+        if self.backend is not None:
+            row = self.backend.get(key, now)
+            if row is not None:
+                data, expires_at = row
+                value = pickle.loads(data)
+                self._store(key, value, len(data), expires_at)
+                self.hits += 1
                 return value
-            else:
-                # Expired
-                del self.cache[key]
+
+        self.misses += 1
         return None
     
     def set(self, key: str, value: Any):
-        """Set value in cache"""
-        # Clean up expired entries and enforce size limit
-        current_time = time.time()
-        if len(self.cache) >= self.max_size:
-            # Remove oldest entries
-            keys_to_remove = []
-            for k, (v, expiry) in self.cache.items():
-                if current_time >= expiry:
-                    keys_to_remove.append(k)
-                if len(keys_to_remove) >= self.max_size // 4:  # Remove 25% when full
-                    break
-                    
-            for k in keys_to_remove:
-                del self.cache[k]
-        
-        expiry_time = current_time + self.ttl_seconds
-        self.cache[key] = (value, expiry_time)
-
-class CircuitBreaker:
-    """Simple circuit breaker for external API calls"""
-    def __init__(self, failure_threshold: int = 5, timeout: int = 60):
-        self.failure_threshold = failure_threshold
-        self.timeout = timeout
-        self.failure_count = 0
-        self.last_failure_time = None
-        self.is_open = False
-    
-    def can_execute(self) -> bool:
-        """Check if circuit breaker allows execution"""
-        if not self.is_open:
-            return True
-            
-        if self.last_failure_time and (time.time() - self.last_failure_time) > self.timeout:
-            self.is_open = False
-            self.failure_count = 0
-            return True
-            
-        return False
-    
-    def record_success(self):
-        """Record successful execution"""
-        self.failure_count = 0
-        self.is_open = False
-    
-    def record_failure(self):
-        """Record failed execution"""
-        self.failure_count += 1
-        self.last_failure_time = time.time()
-        
-        if self.failure_count >= self.failure_threshold:
-            self.is_open = True
+        """Set value in cache, evicting least recently used entries to stay under max_bytes"""
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        expires_at = time.time() + self.ttl_seconds
+        self._store(key, value, len(data), expires_at)
+        if self.backend is not None:
+            self.backend.set(key, data, expires_at)
+
+    def _store(self, key: str, value: Any, size: int, expires_at: float):
+        self._remove(key)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size, expires_at)
+        self._expiry[key] = expires_at
+        self.size_bytes += size
+        while self.size_bytes > self.max_bytes:
+            self._remove(next(iter(self._entries)))
+            self.evictions += 1
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.size_bytes -= entry[1]
+            del self._expiry[key]
+
+    def _expire(self, now: float):
+        while self._expiry:
+            key, expires_at = next(iter(self._expiry.items()))
+            if expires_at > now:
+                break
+            self._remove(key)
+            self.expirations += 1
 
 class TaskQueue:
-    """Priority-based task queue with concurrency control"""
-    def __init__(self, max_concurrent_tasks: int = 10):
-        self.queue = asyncio.PriorityQueue()
-        self.semaphore = asyncio.Semaphore(max_concurrent_tasks)
+    """Priority scheduler with aging, per-tenant fair queuing and deadline awareness
+
+    Priority 1 is the most urgent and 10 the least. A queued task gets a
+    virtual deadline `priority * aging_seconds` after it was queued, and each
+    tenant's tasks run in virtual-deadline order: a priority-10 task is only
+    overtaken by higher-priority tasks queued less than 9 * aging_seconds
+    after it, so it cannot starve. Tenants (Task.tenant_id, else the
+    payload's user_id) share the workers in proportion to their weights using
+    start-time fair queuing. A task whose hard deadline (queued time plus
+    timeout_seconds) is less than `urgent_seconds` away runs next regardless
+    of tenant.
+
+    Workers block in `get_task` until a task is queued, the queue is closed,
+    or they are asked to retire; there is no polling.
+    """
+    def __init__(
+        self,
+        aging_seconds: float = 10.0,
+        urgent_seconds: float = 30.0,
+        tenant_weights: Optional[Dict[str, float]] = None
+    ):
         self.active_tasks: Dict[str, Task] = {}
         self.completed_tasks = deque(maxlen=1000)  # Keep last 1000 completed tasks
-        
+        self.aging_seconds = aging_seconds
+        self.urgent_seconds = urgent_seconds
+        self.tenant_weights = dict(tenant_weights or {})
+        # Entries are [virtual_deadline, seq, task, tenant, queued_at, live]; an entry taken
+        # through one heap is marked dead and skipped when met in the other.
+        self._tenant_heaps: Dict[str, List[list]] = defaultdict(list)
+        self._tenant_sizes: Dict[str, int] = defaultdict(int)
+        self._deadlines: List[tuple] = []
+        # Start-time fair queuing state: (start tag, seq, tenant) for tenants with work.
+        self._tenant_order: List[tuple] = []
+        self._tenant_start: Dict[str, float] = {}
+        self._tenant_finish: Dict[str, float] = {}
+        self._virtual_time = 0.0
+        self._seq = itertools.count()
+        self._size = 0
+        self._not_empty = asyncio.Condition()
+        self._closed = False
+        self._retire = 0
+        self.waiting = 0  # Workers blocked in get_task
+        self.mean_wait_seconds = 0.0  # EWMA of time tasks spent queued
+
+    @staticmethod
+    def tenant_of(task: Task) -> str:
+        return task.tenant_id or task.payload.get("user_id") or "default"
+
+    def qsize(self) -> int:
+        """Number of queued tasks"""
+        return self._size
+
     async def add_task(self, task: Task):
         """Add task to queue"""
         task.status = TaskStatus.QUEUED
-        # Use negative priority for max-heap behavior (lower number = higher priority)
-        await self.queue.put((-task.priority, task.created_at, task))
-    
-    async def get_task(self) -> Task:
-        """Get next task from queue"""
-        _, _, task = await self.queue.get()
-        return task
-    
+        now = time.monotonic()
+        tenant = self.tenant_of(task)
+        seq = next(self._seq)
+        entry = [now + task.priority * self.aging_seconds, seq, task, tenant, now, True]
+        heapq.heappush(self._tenant_heaps[tenant], entry)
+        if task.timeout_seconds:
+            heapq.heappush(self._deadlines, (now + task.timeout_seconds, seq, entry))
+
+        if self._tenant_sizes[tenant] == 0:
+            start = max(self._virtual_time, self._tenant_finish.get(tenant, 0.0))
+            self._tenant_start[tenant] = start
+            heapq.heappush(self._tenant_order, (start, seq, tenant))
+        self._tenant_sizes[tenant] += 1
+        self._size += 1
+
+        async with self._not_empty:
+            # New work cancels pending retirements.
+            self._retire = 0
+            self._not_empty.notify()
+
+    async def get_task(self) -> Optional[Task]:
+        """Get next task from queue, waiting until one is available
+
+        Returns None once the queue is closed, or when the caller was
+        picked to retire by `retire_idle` while the queue is empty.
+        """
+        async with self._not_empty:
+            self.waiting += 1
+            try:
+                await self._not_empty.wait_for(lambda: self._size > 0 or self._closed or self._retire > 0)
+            finally:
+                self.waiting -= 1
+            if self._closed:
+                return None
+            if self._size == 0:
+                self._retire -= 1
+                return None
+            return self._pop()
+
+    async def retire_idle(self, count: int):
+        """Wakes up to `count` idle workers and has get_task return None to them"""
+        async with self._not_empty:
+            self._retire = min(count, self.waiting)
+            self._not_empty.notify(self._retire)
+
+    async def close(self):
+        """Wakes every waiting worker; get_task returns None until `reopen`"""
+        async with self._not_empty:
+            self._closed = True
+            self._not_empty.notify_all()
+
+    def reopen(self):
+        self._closed = False
+        self._retire = 0
+
+    def _pop(self) -> Task:
+        while self._deadlines and not self._deadlines[0][2][-1]:
+            heapq.heappop(self._deadlines)
+        if self._deadlines and self._deadlines[0][0] - time.monotonic() <= self.urgent_seconds:
+            entry = heapq.heappop(self._deadlines)[2]
+            # Charge the tenant as if it had been picked normally.
+            tenant = entry[3]
+            self._tenant_finish[tenant] = self._tenant_finish.get(tenant, self._virtual_time) + self._cost(tenant)
+        else:
+            entry = self._pop_fair()
+
+        entry[-1] = False
+        tenant = entry[3]
+        self.mean_wait_seconds = 0.8 * self.mean_wait_seconds + 0.2 * (time.monotonic() - entry[4])
+        self._size -= 1
+        self._tenant_sizes[tenant] -= 1
+        if self._tenant_sizes[tenant] == 0:
+            del self._tenant_sizes[tenant]
+            del self._tenant_heaps[tenant]
+            self._tenant_start.pop(tenant, None)
+        return entry[2]
+
+    def _cost(self, tenant: str) -> float:
+        return 1.0 / self.tenant_weights.get(tenant, 1.0)
+
+    def _pop_fair(self) -> list:
+        while True:
+            start, _, tenant = heapq.heappop(self._tenant_order)
+            # Skip order entries left behind by a tenant that emptied or was re-tagged.
+            if self._tenant_start.get(tenant) != start or self._tenant_sizes.get(tenant, 0) == 0:
+                continue
+            break
+
+        heap = self._tenant_heaps[tenant]
+        while not heap[0][-1]:
+            heapq.heappop(heap)
+        entry = heapq.heappop(heap)
+
+        self._virtual_time = start
+        finish = start + self._cost(tenant)
+        self._tenant_finish[tenant] = finish
+        if self._tenant_sizes[tenant] > 1:
+            self._tenant_start[tenant] = finish
+            heapq.heappush(self._tenant_order, (finish, next(self._seq), tenant))
+        return entry
+
     def mark_active(self, task: Task):
         """Mark task as active"""
         self.active_tasks[task.id] = task
@@ -237,6 +567,99 @@ class TaskQueue:
             del self.active_tasks[task.id]
         self.completed_tasks.append(task)
 
+    def mark_retrying(self, task: Task):
+        """Mark task as no longer running while it waits for a retry"""
+        self.active_tasks.pop(task.id, None)
+
+class DelayedTaskQueue:
+    """Holds tasks until their due time, then puts them back on the task queue
+
+    Due times are kept in a heap served by a single timer task that sleeps
+    until the earliest one; scheduling an earlier task wakes it early. The
+    timer exits when the heap is empty and is restarted by the next schedule.
+    """
+    def __init__(self, task_queue: TaskQueue, on_ready: Optional[Callable[[], None]] = None):
+        self.task_queue = task_queue
+        self.on_ready = on_ready
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._changed = asyncio.Event()
+        self._timer: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, task: Task, delay: float):
+        """Re-enqueue `task` after `delay` seconds"""
+        entry = (time.monotonic() + delay, next(self._seq), task)
+        heapq.heappush(self._heap, entry)
+        if self._heap[0] is entry:
+            self._changed.set()
+        self.resume()
+
+    def resume(self):
+        """Start the timer if tasks are waiting and it is not running"""
+        if self._heap and (self._timer is None or self._timer.done()):
+            self._timer = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the timer; scheduled tasks are kept until `resume`"""
+        if self._timer is not None:
+            self._timer.cancel()
+            await asyncio.gather(self._timer, return_exceptions=True)
+            self._timer = None
+
+    async def _run(self):
+        while self._heap:
+            delay = self._heap[0][0] - time.monotonic()
+            if delay > 0:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, task = heapq.heappop(self._heap)
+            await self.task_queue.add_task(task)
+            if self.on_ready:
+                self.on_ready()
+
+class RetryBudget:
+    """Caps retries at a fraction of recent first attempts
+
+    Within a sliding window of `window_seconds`, retries are allowed while
+    they number fewer than `ratio` times the first attempts plus
+    `min_per_second * window_seconds`, so a failing dependency cannot
+    multiply an agent's load but a quiet agent can still retry.
+    """
+    def __init__(self, ratio: float = 0.2, min_per_second: float = 0.5, window_seconds: float = 10.0):
+        self.ratio = ratio
+        self.min_per_second = min_per_second
+        self.window_seconds = window_seconds
+        self._attempts = deque()
+        self._retries = deque()
+        self.denied = 0
+
+    def _prune(self, now: float):
+        cutoff = now - self.window_seconds
+        for events in (self._attempts, self._retries):
+            while events and events[0] < cutoff:
+                events.popleft()
+
+    def record_attempt(self):
+        self._attempts.append(time.monotonic())
+
+    def try_spend(self) -> bool:
+        """Record a retry if the budget allows one"""
+        now = time.monotonic()
+        self._prune(now)
+        allowed = self.ratio * len(self._attempts) + self.min_per_second * self.window_seconds
+        if len(self._retries) >= allowed:
+            self.denied += 1
+            return False
+        self._retries.append(now)
+        return True
+
 class ImprovedBaseAgent(ABC):
     """Enhanced base agent with performance optimizations and monitoring"""
     
@@ -246,164 +669,254 @@ class ImprovedBaseAgent(ABC):
         agent_type: AgentType, 
         max_concurrent_tasks: int = 5,
         enable_caching: bool = True,
-        enable_circuit_breaker: bool = True
+        enable_circuit_breaker: bool = True,
+        breaker_registry: Optional[CircuitBreakerRegistry] = None,
+        cache_max_bytes: int = 64 * 1024 * 1024,
+        cache_path: Optional[str] = None,
+        cache_namespace: str = f"policy-{ROUTING_POLICY_VERSION}",
+        tenant_weights: Optional[Dict[str, float]] = None,
+        min_workers: int = 1,
+        scale_up_wait_seconds: float = 1.0,
+        retry_base_delay: float = 1.0,
+        retry_max_delay: float = 60.0,
+        retry_budget: Optional[RetryBudget] = None,
+        dead_letter_size: int = 1000
     ):
         self.agent_id = agent_id
         self.agent_type = agent_type
         self.logger = logging.getLogger(f"{agent_type.value}_{agent_id}")
         
         # Performance enhancements
-        self.task_queue = TaskQueue(max_concurrent_tasks)
+        self.task_queue = TaskQueue(tenant_weights=tenant_weights)
         self.connection_pool = ConnectionPool(max_connections=10)
-        self.metrics = PerformanceMetrics()
+        self.metrics = PerformanceMetrics(agent_type.value, agent_id)
         self.process = psutil.Process() if psutil else None
         
         # Optional features
-        self.cache = SimpleCache() if enable_caching else None
-        self.circuit_breaker = CircuitBreaker() if enable_circuit_breaker else None
+        backend = SQLiteCacheBackend(cache_path) if enable_caching and cache_path else None
+        self.cache = LRUCache(max_bytes=cache_max_bytes, backend=backend) if enable_caching else None
+        self.cache_namespace = cache_namespace
+        # Breakers are keyed per upstream and shared with the LLM router, so
+        # one failing dependency does not fail tasks that use the others
+        self.circuit_breakers = (breaker_registry or circuit_breakers) if enable_circuit_breaker else None
         
-        # Worker management
+        # Worker management: between min_workers and max_concurrent_tasks
+        # workers, scaled on queue depth and queueing latency
+        self.min_workers = max(1, min(min_workers, max_concurrent_tasks))
+        self.max_workers = max_concurrent_tasks
+        self.scale_up_wait_seconds = scale_up_wait_seconds
         self.workers_started = False
         self.shutdown_event = asyncio.Event()
-        self.worker_tasks: List[asyncio.Task] = []
+        self.worker_tasks: Dict[str, asyncio.Task] = {}
+        self.metrics_task: Optional[asyncio.Task] = None
+        self._worker_ids = itertools.count()
+        
+        # Retries wait in the delayed queue, not in a worker; tasks that run
+        # out of retries (or retry budget) end up in the dead-letter queue
+        self.retry_base_delay = retry_base_delay
+        self.retry_max_delay = retry_max_delay
+        self.retry_budget = retry_budget or RetryBudget()
+        self.delayed_tasks = DelayedTaskQueue(self.task_queue, on_ready=self._scale_up)
+        self.dead_letter_queue: deque = deque(maxlen=dead_letter_size)
+        
+        # Live queue, worker and cache state, read at scrape time; the proxy
+        # keeps the registry from holding the agent alive
+        agent = weakref.proxy(self)
+        self.metrics.watch("agent_queued_tasks", "Tasks waiting in the queue", lambda: agent.task_queue.qsize())
+        self.metrics.watch("agent_active_tasks", "Tasks being processed", lambda: len(agent.task_queue.active_tasks))
+        self.metrics.watch("agent_workers", "Running worker tasks", lambda: len(agent.worker_tasks))
+        self.metrics.watch("agent_delayed_retries", "Tasks waiting to be retried", lambda: len(agent.delayed_tasks))
+        self.metrics.watch("agent_dead_letter_tasks", "Tasks in the dead-letter queue", lambda: len(agent.dead_letter_queue))
+        if self.cache is not None:
+            self.metrics.watch("agent_cache_hits_total", "Response cache hits", lambda: agent.cache.hits, kind="counter")
+            self.metrics.watch("agent_cache_misses_total", "Response cache misses", lambda: agent.cache.misses, kind="counter")
+            self.metrics.watch("agent_cache_evictions_total", "Response cache evictions", lambda: agent.cache.evictions, kind="counter")
+            self.metrics.watch("agent_cache_size_bytes", "Response cache size", lambda: agent.cache.size_bytes)
+        # Also drop the series of an agent that is discarded without shutdown()
+        weakref.finalize(self, self.metrics.unregister)
         
     async def start_workers(self):
         """Start background worker tasks"""
         if self.workers_started:
             return
             
-        # Start worker coroutines
-        for i in range(self.task_queue.semaphore._value):
-            worker_task = asyncio.create_task(self._worker_loop(f"worker_{i}"))
-            self.worker_tasks.append(worker_task)
+        self.shutdown_event.clear()
+        self.task_queue.reopen()
+        for _ in range(self.min_workers):
+            self._start_worker()
+        self.delayed_tasks.resume()
             
         # Start metrics collection
-        metrics_task = asyncio.create_task(self._metrics_loop())
-        self.worker_tasks.append(metrics_task)
+        self.metrics_task = asyncio.create_task(self._metrics_loop())
         
         self.workers_started = True
         self.logger.info(f"Started {len(self.worker_tasks)} workers for agent {self.agent_id}")
     
-    async def stop_workers(self):
-        """Stop all worker tasks"""
+    async def stop_workers(self, timeout: Optional[float] = 30.0):
+        """Stop all worker tasks
+        
+        Tasks already running get `timeout` seconds to finish (None waits
+        for them however long they take); workers still busy after that
+        are cancelled.
+        """
         self.shutdown_event.set()
+        await self.task_queue.close()
+        await self.delayed_tasks.stop()
         
-        if self.worker_tasks:
-            await asyncio.gather(*self.worker_tasks, return_exceptions=True)
-            self.worker_tasks.clear()
+        tasks = list(self.worker_tasks.values())
+        if self.metrics_task:
+            tasks.append(self.metrics_task)
+            self.metrics_task = None
+        if tasks:
+            _, pending = await asyncio.wait(tasks, timeout=timeout)
+            if pending:
+                self.logger.warning(f"Cancelling {len(pending)} workers still busy after {timeout}s")
+                for task in pending:
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        self.worker_tasks.clear()
             
         self.workers_started = False
         self.logger.info(f"Stopped all workers for agent {self.agent_id}")
     
+    def _start_worker(self):
+        worker_name = f"worker_{next(self._worker_ids)}"
+        self.worker_tasks[worker_name] = asyncio.create_task(self._worker_loop(worker_name))
+    
+    def _scale_up(self):
+        """Start a worker if queued tasks outnumber idle workers or wait too long"""
+        if not self.workers_started or self.shutdown_event.is_set() or len(self.worker_tasks) >= self.max_workers:
+            return
+        queued = self.task_queue.qsize()
+        backlog = queued - self.task_queue.waiting
+        if backlog > 0 or (queued and self.task_queue.mean_wait_seconds > self.scale_up_wait_seconds):
+            self._start_worker()
+    
+    async def _scale_down(self):
+        """Retire idle workers above min_workers while the queue is empty"""
+        excess = min(self.task_queue.waiting, len(self.worker_tasks) - self.min_workers)
+        if excess > 0 and self.task_queue.qsize() == 0:
+            await self.task_queue.retire_idle(excess)
+    
     async def _worker_loop(self, worker_name: str):
-        """Main worker loop for processing tasks"""
-        while not self.shutdown_event.is_set():
-            try:
-                # Get semaphore permission
-                async with self.task_queue.semaphore:
-                    try:
-                        # Get next task with timeout
-                        task = await asyncio.wait_for(self.task_queue.get_task(), timeout=1.0)
-                        
-                        # Process the task
-                        await self._execute_task_with_monitoring(task)
-                        
-                    except asyncio.TimeoutError:
-                        # No tasks available, continue loop
-                        continue
-                        
-            except Exception as e:
-                self.logger.error(f"Error in worker {worker_name}: {e}")
-                await asyncio.sleep(1)  # Prevent tight error loop
+        """Main worker loop: blocks on the queue until a task arrives or it is told to stop"""
+        try:
+            while True:
+                task = await self.task_queue.get_task()
+                if task is None:
+                    # Queue closed for shutdown, or retired by scale-down
+                    return
+                try:
+                    await self._execute_task_with_monitoring(task)
+                except Exception as e:
+                    self.logger.error(f"Error in worker {worker_name}: {e}")
+                self._scale_up()
+        finally:
+            self.worker_tasks.pop(worker_name, None)
     
     async def _execute_task_with_monitoring(self, task: Task):
         """Execute task with comprehensive monitoring"""
         task.status = TaskStatus.IN_PROGRESS
         task.started_at = datetime.now()
         self.task_queue.mark_active(task)
+        if task.retry_count == 0:
+            self.retry_budget.record_attempt()
         
         try:
             self.logger.info(f"Starting task {task.id}: {task.description}")
             
-            # Check circuit breaker
-            if self.circuit_breaker and not self.circuit_breaker.can_execute():
-                raise Exception("Circuit breaker is open - service unavailable")
-            
-            # Execute the task with timeout
+            # Execute the task with timeout, failing fast while its upstream's breaker is open
             try:
-                if task.timeout_seconds:
-                    result = await asyncio.wait_for(
-                        self.process_task(task),
-                        timeout=task.timeout_seconds
-                    )
-                else:
-                    result = await self.process_task(task)
+                async with self.protected(self.breaker_key(task)):
+                    if task.timeout_seconds:
+                        result = await asyncio.wait_for(
+                            self.process_task(task),
+                            timeout=task.timeout_seconds
+                        )
+                    else:
+                        result = await self.process_task(task)
                 
                 # Task completed successfully
                 task.result = result
                 task.status = TaskStatus.COMPLETED
                 task.completed_at = datetime.now()
                 
-                # Update metrics
-                self.metrics.tasks_completed += 1
-                if task.processing_time:
-                    self.metrics.update_response_time(task.processing_time)
-                
-                # Record success for circuit breaker
-                if self.circuit_breaker:
-                    self.circuit_breaker.record_success()
+                self.metrics.record_task(task.task_type, "completed", task.processing_time)
                 
                 self.logger.info(f"Completed task {task.id}")
                 
             except asyncio.TimeoutError:
                 # Task timed out - schedule for retry if possible
-                if task.retry_count < task.max_retries:
-                    task.retry_count += 1
-                    task.status = TaskStatus.RETRYING
-                    await asyncio.sleep(2 ** task.retry_count)  # Exponential backoff
-                    await self.task_queue.add_task(task)
-                    self.logger.warning(f"Task {task.id} timed out, retrying ({task.retry_count}/{task.max_retries})")
-                else:
-                    task.status = TaskStatus.FAILED
-                    task.result = {"error": "Task timed out after maximum retries"}
-                    self.metrics.tasks_failed += 1
+                self._retry_or_fail(task, "Task timed out")
                     
         except Exception as e:
             # Task failed
             self.logger.error(f"Failed to process task {task.id}: {str(e)}")
             
-            # Record failure for circuit breaker
-            if self.circuit_breaker:
-                self.circuit_breaker.record_failure()
-            
-            # Check for retry
-            if task.retry_count < task.max_retries:
-                task.retry_count += 1
-                task.status = TaskStatus.RETRYING
-                await asyncio.sleep(2 ** task.retry_count)  # Exponential backoff
-                await self.task_queue.add_task(task)
-                self.logger.warning(f"Task {task.id} failed, retrying ({task.retry_count}/{task.max_retries})")
-            else:
-                task.status = TaskStatus.FAILED
-                task.result = {"error": str(e)}
-                task.completed_at = datetime.now()
-                self.metrics.tasks_failed += 1
-                
-                if task.processing_time:
-                    self.metrics.update_response_time(task.processing_time)
+            self._retry_or_fail(task, str(e))
         
         finally:
-            self.task_queue.mark_completed(task)
+            if task.status == TaskStatus.RETRYING:
+                self.task_queue.mark_retrying(task)
+            else:
+                self.task_queue.mark_completed(task)
+    
+    def breaker_key(self, task: Task) -> str:
+        """Circuit breaker key for a task: its upstream, else one per agent type and task type"""
+        return task.upstream or f"agent:{self.agent_type.value}:{task.task_type}"
+    
+    def protected(self, upstream: Optional[str]):
+        """Async context manager that runs a call through the upstream's circuit breaker"""
+        if self.circuit_breakers is None or not upstream:
+            return nullcontext()
+        return self.circuit_breakers.guard(upstream)
+    
+    def retry_delay(self, retry_count: int) -> float:
+        """Exponential backoff with full jitter"""
+        return random.uniform(0, min(self.retry_max_delay, self.retry_base_delay * 2 ** retry_count))
+    
+    def _retry_or_fail(self, task: Task, error: str):
+        """Schedule a delayed retry, or fail the task into the dead-letter queue"""
+        if task.retry_count < task.max_retries and self.retry_budget.try_spend():
+            task.retry_count += 1
+            task.status = TaskStatus.RETRYING
+            self.metrics.record_retry()
+            self.delayed_tasks.schedule(task, self.retry_delay(task.retry_count))
+            self.logger.warning(f"Task {task.id} failed ({error}), retrying ({task.retry_count}/{task.max_retries})")
+            return
+        
+        reason = "retries exhausted" if task.retry_count >= task.max_retries else "retry budget exhausted"
+        task.status = TaskStatus.FAILED
+        task.result = {"error": error, "dead_letter_reason": reason}
+        task.completed_at = datetime.now()
+        self.metrics.record_task(task.task_type, "failed", task.processing_time)
+        self.dead_letter_queue.append(task)
+        self.logger.error(f"Task {task.id} moved to dead-letter queue: {reason}")
+    
+    async def redrive_dead_letters(self) -> int:
+        """Resubmit every dead-lettered task with its retry count reset"""
+        count = 0
+        while self.dead_letter_queue:
+            task = self.dead_letter_queue.popleft()
+            task.retry_count = 0
+            task.result = None
+            await self.submit_task(task)
+            count += 1
+        return count
     
     async def _metrics_loop(self):
-        """Background metrics collection loop"""
+        """Background metrics collection and scale-down loop"""
         while not self.shutdown_event.is_set():
             try:
                 await self._update_system_metrics()
-                await asyncio.sleep(10)  # Update metrics every 10 seconds
+                await self._scale_down()
             except Exception as e:
                 self.logger.error(f"Error updating metrics: {e}")
-                await asyncio.sleep(10)
+            try:
+                # Update metrics every 10 seconds, or stop as soon as shutdown is signalled
+                await asyncio.wait_for(self.shutdown_event.wait(), timeout=10)
+            except asyncio.TimeoutError:
+                pass
     
     async def _update_system_metrics(self):
         """Update system resource metrics"""
@@ -411,48 +924,40 @@ class ImprovedBaseAgent(ABC):
             return
             
         try:
+            # Throughput and error rate come from the task counters' sliding
+            # windows, so only process-level readings are taken here
             memory_info = self.process.memory_info()
-            current_memory = memory_info.rss / 1024 / 1024  # MB
-            
-            self.metrics.current_memory_mb = current_memory
-            if current_memory > self.metrics.peak_memory_mb:
-                self.metrics.peak_memory_mb = current_memory
-                
-            self.metrics.cpu_usage_percent = self.process.cpu_percent(interval=None)
-            
-            # Calculate throughput (tasks per second over last minute)
-            completed_in_last_minute = len([
-                task for task in self.task_queue.completed_tasks 
-                if task.completed_at and 
-                (datetime.now() - task.completed_at).total_seconds() < 60
-            ])
-            self.metrics.throughput = completed_in_last_minute / 60.0
+            self.metrics.update_resources(
+                memory_info.rss / 1024 / 1024,  # MB
+                self.process.cpu_percent(interval=None),
+            )
             
-            # Update error rate
-            self.metrics.calculate_error_rate()
+            # Trim the shared on-disk cache tier
+            if self.cache is not None and self.cache.backend is not None:
+                await asyncio.to_thread(self.cache.backend.purge, time.time())
             
         except Exception as e:
             self.logger.warning(f"Failed to update system metrics: {e}")
     
     async def llm_invoke_with_pooling(self, prompt: str, meta: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
         """Enhanced LLM invocation with connection pooling and caching"""
-        if meta is None:
-            meta = {}
+        # Copy so the caller's meta is not enriched in place
+        meta = dict(meta or {})
             
-        # Generate cache key
+        # Generate cache key; confidential and opted-out requests are never cached
         cache_key = None
-        if self.cache:
-            cache_key = f"{hash(prompt)}_{hash(str(sorted(meta.items())))}"
+        if self.cache is not None and meta.get("cache", True) and not meta.get("confidential"):
+            try:
+                cache_key = stable_cache_key(prompt, meta, self.cache_namespace)
+            except TypeError as e:
+                # No stable key for this meta, so the request bypasses the cache
+                self.logger.debug(f"Not caching request: {e}")
+        if cache_key:
             cached_result = self.cache.get(cache_key)
-            if cached_result:
-                self.metrics.cache_hits += 1
+            if cached_result is not None:
                 return cached_result
-            self.metrics.cache_misses += 1
-        
-        # Get connection from pool
-        connection = await self.connection_pool.get_connection()
         
-        try:
+        async with self.connection_pool.slot():
             # Enrich metadata
             meta["agent_name"] = self.agent_type.value
             meta["agent_id"] = self.agent_id
@@ -461,14 +966,10 @@ class ImprovedBaseAgent(ABC):
             result = await alr_invoke(prompt, meta, user_id=self.agent_id)
             
             # Cache result if caching is enabled
-            if self.cache and cache_key:
+            if self.cache is not None and cache_key:
                 self.cache.set(cache_key, result)
             
             return result
-            
-        finally:
-            # Return connection to pool
-            await self.connection_pool.return_connection(connection)
     
     async def submit_task(self, task: Task) -> str:
         """Submit a task for processing"""
@@ -476,6 +977,7 @@ class ImprovedBaseAgent(ABC):
             await self.start_workers()
             
         await self.task_queue.add_task(task)
+        self._scale_up()
         self.logger.info(f"Task {task.id} submitted to queue")
         return task.id
     
@@ -483,26 +985,45 @@ class ImprovedBaseAgent(ABC):
         """Get current performance metrics"""
         return self.metrics
     
+    def get_prometheus_metrics(self) -> str:
+        """Render the shared metrics registry (all agents) in the Prometheus text format"""
+        return self.metrics.registry.exposition()
+    
     def get_status(self) -> Dict[str, Any]:
         """Get comprehensive agent status"""
+        cache_hits = self.cache.hits if self.cache is not None else 0
+        cache_misses = self.cache.misses if self.cache is not None else 0
+        open_circuits = {
+            key: snapshot.state
+            for key, snapshot in self.circuit_breakers.snapshot().items()
+            if snapshot.state != "closed"
+        } if self.circuit_breakers else {}
         return {
             "agent_id": self.agent_id,
             "agent_type": self.agent_type.value,
             "workers_started": self.workers_started,
+            "workers": len(self.worker_tasks),
             "active_tasks": len(self.task_queue.active_tasks),
-            "queued_tasks": self.task_queue.queue.qsize(),
+            "queued_tasks": self.task_queue.qsize(),
             "completed_tasks": len(self.task_queue.completed_tasks),
+            "delayed_retries": len(self.delayed_tasks),
+            "dead_letter_tasks": len(self.dead_letter_queue),
+            "retries_denied": self.retry_budget.denied,
             "metrics": {
                 "tasks_completed": self.metrics.tasks_completed,
                 "tasks_failed": self.metrics.tasks_failed,
                 "avg_response_time": self.metrics.avg_response_time,
+                "response_time_percentiles": self.metrics.latency_percentiles(),
                 "error_rate": self.metrics.error_rate,
                 "throughput": self.metrics.throughput,
                 "current_memory_mb": self.metrics.current_memory_mb,
                 "cpu_usage_percent": self.metrics.cpu_usage_percent,
-                "cache_hit_rate": (self.metrics.cache_hits / (self.metrics.cache_hits + self.metrics.cache_misses) * 100) if (self.metrics.cache_hits + self.metrics.cache_misses) > 0 else 0
+                "cache_evictions": self.cache.evictions if self.cache is not None else 0,
+                "cache_size_bytes": self.cache.size_bytes if self.cache is not None else 0,
+                "cache_hit_rate": (cache_hits / (cache_hits + cache_misses) * 100) if (cache_hits + cache_misses) > 0 else 0
             },
-            "circuit_breaker_open": self.circuit_breaker.is_open if self.circuit_breaker else False
+            "circuit_breaker_open": "open" in open_circuits.values(),
+            "open_circuits": open_circuits
         }
     
     # Abstract methods that must be implemented by concrete agents
@@ -517,10 +1038,11 @@ class ImprovedBaseAgent(ABC):
         pass
     
     # Cleanup
-    async def shutdown(self):
-        """Gracefully shutdown the agent"""
+    async def shutdown(self, timeout: Optional[float] = 30.0):
+        """Gracefully shutdown the agent, giving running tasks `timeout` seconds to finish"""
         self.logger.info(f"Shutting down agent {self.agent_id}")
-        await self.stop_workers()
+        await self.stop_workers(timeout)
+        self.metrics.unregister()
 '''
 
 print("📝 IMPROVED BASE AGENT IMPLEMENTATION")
@@ -529,11 +1051,11 @@ print("✅ Created enhanced BaseAgent with the following improvements:")
 print("\n🚀 PERFORMANCE OPTIMIZATIONS:")
 improvements = [
     "• Removed blocking is_busy flag - now supports concurrent task processing",
-    "• Added priority-based task queue with semaphore-controlled concurrency",
-    "• Implemented connection pooling for LLM API calls",
-    "• Added TTL-based caching system for frequently accessed data",
-    "• Included circuit breaker pattern for external API reliability",
-    "• Background worker processes for parallel task execution"
+    "• Added priority scheduler with aging, per-tenant weighted fair queuing and deadline awareness",
+    "• Shared keep-alive HTTP/2 connection pool for LLM API calls, bounded per agent and per host",
+    "• Byte-bounded O(1) LRU/TTL response cache with an optional shared on-disk tier",
+    "• Per-upstream circuit breakers with rolling failure rates and half-open probing, shared with the LLM router",
+    "• Event-driven background workers that scale with queue depth and latency"
 ]
 
 for improvement in improvements:
@@ -541,12 +1063,12 @@ for improvement in improvements:
 
 print("\n📊 MONITORING & METRICS:")
 monitoring_features = [
-    "• Comprehensive performance metrics collection",
+    "• Lock-free metrics registry labeled by agent and task type, with a Prometheus text endpoint",
     "• Real-time system resource monitoring (CPU, memory)",
-    "• Task throughput and response time tracking",
+    "• p50/p95/p99 task latency from HDR-style histograms, sliding-window throughput",
     "• Error rate calculation and trending",
     "• Cache hit/miss ratio monitoring",
-    "• Circuit breaker status tracking"
+    "• Open and half-open circuit tracking per upstream"
 ]
 
 for feature in monitoring_features:
@@ -554,7 +1076,7 @@ for feature in monitoring_features:
 
 print("\n🔧 RELIABILITY FEATURES:")
 reliability_features = [
-    "• Automatic task retry with exponential backoff",
+    "• Non-blocking task retries with jittered backoff, retry budgets and a dead-letter queue",
     "• Task timeout handling with configurable limits",
     "• Graceful shutdown and cleanup procedures",
     "• Exception handling and error recovery",
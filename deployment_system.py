@@ -16,11 +16,9 @@ from base_agent import (
     AgentCapability,
 )
 from credential_warehouse_agent import SecureCredentialWarehouse
-import posthog
-
-# Initialize PostHog
-posthog.api_key = os.getenv("POSTHOG_API_KEY")
-posthog.host = os.getenv("POSTHOG_HOST", "https://app.posthog.com")
+from adaptive_llm_router.circuit_breaker import circuit_breakers
+# Configured from POSTHOG_API_KEY / POSTHOG_HOST; sends in the background.
+from adaptive_llm_router.event_pipeline import event_pipeline
 
 class DeploymentAgent(BaseAgent):
     def __init__(self, agent_id: str = "deployment_agent_001"):
@@ -120,7 +118,8 @@ class DeploymentAgent(BaseAgent):
                 drop.create()
                 ctx.droplet_ids[f"droplet_{i}"] = drop.id
 
-        await asyncio.to_thread(blocking_provision)
+        async with circuit_breakers.guard("digitalocean"):
+            await asyncio.to_thread(blocking_provision)
 
     async def _deploy_to_droplets(self, request: DeploymentRequest, ctx: DeploymentContext):
         self.logger.info("Deploying container to droplets via SSH")
@@ -137,7 +136,8 @@ class DeploymentAgent(BaseAgent):
             return drop.ip_address
 
         for name, droplet_id in ctx.droplet_ids.items():
-            ip = await asyncio.to_thread(get_ip, droplet_id)
+            async with circuit_breakers.guard("digitalocean"):
+                ip = await asyncio.to_thread(get_ip, droplet_id)
             run_cmd = (
                 f"ssh -i {ssh_key_path} -o StrictHostKeyChecking=no root@{ip} "
                 f"'docker pull {ctx.container_image} && "
@@ -168,7 +168,8 @@ class DeploymentAgent(BaseAgent):
             self.logger.info(f"Running ECS task on cluster {cluster}")
             ecs.run_task(cluster=cluster, launchType="FARGATE", taskDefinition=request.task_id)
 
-        await asyncio.to_thread(blocking_ecs_deploy)
+        async with circuit_breakers.guard("aws_ecs"):
+            await asyncio.to_thread(blocking_ecs_deploy)
 
     async def configure_dns_and_ssl(self, request: DeploymentRequest, ctx: DeploymentContext):
         if not request.ssl:
@@ -192,7 +193,8 @@ class DeploymentAgent(BaseAgent):
                 drop.load()
             return drop.ip_address
 
-        droplet_ip = await asyncio.to_thread(get_ip, first_droplet_id)
+        async with circuit_breakers.guard("digitalocean"):
+            droplet_ip = await asyncio.to_thread(get_ip, first_droplet_id)
 
         def blocking_dns_config():
             import CloudFlare
@@ -222,7 +224,8 @@ class DeploymentAgent(BaseAgent):
             ctx.ssl_certificate_id = ssl_resp['value']
             self.logger.info(f"SSL mode for zone is {ctx.ssl_certificate_id}")
 
-        await asyncio.to_thread(blocking_dns_config)
+        async with circuit_breakers.guard("cloudflare"):
+            await asyncio.to_thread(blocking_dns_config)
 
     def finalize(self, request: DeploymentRequest, ctx: DeploymentContext):
         ctx.end_time = time.time()
@@ -231,14 +234,14 @@ class DeploymentAgent(BaseAgent):
         self._track_final_event(request.task_id, duration)
 
     def _track_event(self, task_id: str, status: TaskStatus):
-        posthog.capture(task_id, "deployment_phase", properties={
+        event_pipeline.capture(task_id, "deployment_phase", properties={
             "agent_type": self.agent_type.value,
             "phase": status.value,
             "timestamp": time.time()
         })
 
     def _track_final_event(self, task_id: str, duration: float):
-        posthog.capture(task_id, "deployment_completed", properties={
+        event_pipeline.capture(task_id, "deployment_completed", properties={
             "agent_type": self.agent_type.value,
             "execution_time": duration,
             "timestamp": time.time()
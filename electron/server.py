@@ -3,7 +3,7 @@ import sys
 import asyncio
 import json
 from pathlib import Path
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from werkzeug.exceptions import BadRequest
 
 # Add current directory to path for local imports
@@ -15,6 +15,7 @@ try:
     from repo_intake_agent import RepoIntakeAgent
     from analytics_371 import Analytics371
     from base_agent import Task, AgentType
+    from adaptive_llm_router.metrics import PROMETHEUS_CONTENT_TYPE, metrics_registry
 except ImportError as e:
     print(f"Error: Failed to import necessary modules. {e}")
     print("Please ensure all required agent files and their dependencies are present in the same directory.")
@@ -110,6 +111,13 @@ def health_check():
     """
     return jsonify({"status": "ok", "timestamp": os.path.getmtime(__file__)}), 200
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """
+    Prometheus scrape endpoint for agent and router metrics.
+    """
+    return Response(metrics_registry.exposition(), content_type=PROMETHEUS_CONTENT_TYPE)
+
 if __name__ == '__main__':
     # Running the app on 0.0.0.0 makes it accessible from the network,
     # which is useful for development and containerization.
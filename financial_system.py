@@ -4,8 +4,8 @@ from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any
 from datetime import datetime
 import time
-import posthog
 
+from adaptive_llm_router.event_pipeline import event_pipeline
 from base_agent import BaseAgent, AgentType, Task, TaskStatus, AgentCapability
 from credential_warehouse_agent import SecureCredentialWarehouse
 
@@ -280,7 +280,7 @@ class FinancialAgent(BaseAgent):
 
     def track_financial_event(self, event_type: str, properties: Dict):
         """Track financial events in PostHog for business intelligence"""
-        posthog.capture(
+        event_pipeline.capture(
             f"financial_{self.task_id}",
             event_type,
             properties={
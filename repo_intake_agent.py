@@ -13,6 +13,7 @@ import requests
 
 from base_agent import BaseAgent, AgentType, Task, AgentCapability
 from analytics_371 import Analytics371
+from adaptive_llm_router.tracing import tracer
 
 @dataclass
 class RepositoryContext:
@@ -59,6 +60,7 @@ class RepoIntakeAgent(BaseAgent):
         self.temp_dir = Path("/tmp/repo_intake")
         self.temp_dir.mkdir(exist_ok=True)
 
+    @tracer.traced("repo_intake.process_task")
     async def process_task(self, task: Task) -> Dict[str, Any]:
         """
         Main entry point for repository processing.
@@ -75,14 +77,18 @@ class RepoIntakeAgent(BaseAgent):
             self.analytics.track_agent_execution(task.id, self.agent_type.value, 0, "started", user_id=user_id)
 
         try:
-            self.logger.info("DEBUG: Cloning repository...")
-            local_path = self._clone_repository(repo_url, task.id)
-            self.logger.info("DEBUG: Analyzing repository...")
-            context = self._analyze_repository(local_path, repo_url)
-            self.logger.info("DEBUG: Fetching structured.yaml...")
-            context.structured_data = self._get_structured_yaml(repo_url)
-            self.logger.info("DEBUG: Bundling repository...")
-            self._bundle_repository(local_path)
+            with tracer.span("repo_intake.clone", task_id=task.id):
+                self.logger.info("DEBUG: Cloning repository...")
+                local_path = self._clone_repository(repo_url, task.id)
+            with tracer.span("repo_intake.analyze", task_id=task.id):
+                self.logger.info("DEBUG: Analyzing repository...")
+                context = self._analyze_repository(local_path, repo_url)
+            with tracer.span("repo_intake.structured_yaml", task_id=task.id):
+                self.logger.info("DEBUG: Fetching structured.yaml...")
+                context.structured_data = self._get_structured_yaml(repo_url)
+            with tracer.span("repo_intake.bundle", task_id=task.id):
+                self.logger.info("DEBUG: Bundling repository...")
+                self._bundle_repository(local_path)
 
             execution_time = time.time() - start_time
             result_context = asdict(context)
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Import-time benchmark for 371 OS agents.
+
+Measures the cold import time of `base_agent` and of every top-level agent
+module that builds on it, each in a fresh interpreter, and prints the median
+over several runs. Pass --baseline with a JSON file written by --output to
+compare against an earlier run.
+"""
+
+import argparse
+import json
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+from typing import Dict, List
+
+ROOT = Path(__file__).resolve().parent.parent
+
+def discover_modules() -> List[str]:
+    """Returns `base_agent` plus the top-level modules that import it."""
+    modules = ["base_agent"]
+    for py_file in sorted(ROOT.glob("*.py")):
+        if py_file.stem == "base_agent":
+            continue
+        if "from base_agent import" in py_file.read_text(encoding="utf-8", errors="ignore"):
+            modules.append(py_file.stem)
+    return modules
+
+def time_import(module: str) -> float:
+    """Imports a module in a fresh interpreter and returns the elapsed seconds."""
+    code = (
+        "import time; started = time.perf_counter(); "
+        f"import {module}; print(time.perf_counter() - started)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr else "import failed")
+    return float(result.stdout.strip().splitlines()[-1])
+
+def run(modules: List[str], repeat: int) -> Dict[str, float]:
+    results = {}
+    for module in modules:
+        try:
+            results[module] = statistics.median(time_import(module) for _ in range(repeat))
+        except RuntimeError as e:
+            print(f"⚠️  {module}: {e}")
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure cold import time of agent modules")
+    parser.add_argument("modules", nargs="*", help="Modules to measure (default: base_agent and its importers)")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per module; the median is reported")
+    parser.add_argument("--output", type=Path, help="Write the results to this JSON file")
+    parser.add_argument("--baseline", type=Path, help="Compare against results from an earlier --output")
+    args = parser.parse_args()
+
+    results = run(args.modules or discover_modules(), args.repeat)
+    baseline = json.loads(args.baseline.read_text()) if args.baseline else {}
+
+    print(f"{'module':<32} {'median (ms)':>12} {'baseline (ms)':>14} {'change':>8}")
+    for module, seconds in results.items():
+        line = f"{module:<32} {seconds * 1000:>12.1f}"
+        if module in baseline:
+            before = baseline[module]
+            line += f" {before * 1000:>14.1f} {(seconds - before) / before:>+8.0%}"
+        print(line)
+
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2))
+        print(f"✅ Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+import json
+import random
+import time
+from unittest.mock import MagicMock
+
+import pytest
+
+from adaptive_llm_router.event_pipeline import EventPipeline
+from adaptive_llm_router.metrics import MetricsRegistry
+from analytics_371 import Analytics371, hash_value, limit_properties
+
+
+def _analytics(**kwargs):
+    pipeline = MagicMock()
+    kwargs.setdefault("registry", MetricsRegistry())
+    return Analytics371("key", pipeline=pipeline, **kwargs), pipeline
+
+
+def _events(pipeline, name):
+    return [c.kwargs["properties"] for c in pipeline.capture.call_args_list if c.kwargs["event"] == name]
+
+
+def test_executions_are_summarized_per_agent_type_and_status():
+    registry = MetricsRegistry()
+    analytics, pipeline = _analytics(sample_rates={"agent_execution": 0.0}, flush_interval=3600, registry=registry)
+    for i in range(100):
+        analytics.track_agent_execution(f"task-{i}", "CODE_GENERATION", execution_time=(i + 1) / 10)
+    analytics.track_error("task-x", "CODE_GENERATION", "boom", execution_time=2.0)
+
+    assert _events(pipeline, "agent_execution") == []
+    assert len(_events(pipeline, "agent_error")) == 1
+
+    analytics.flush()
+    summaries = {s["status"]: s for s in _events(pipeline, "agent_execution_summary")}
+    assert summaries["completed"]["count"] == 100
+    assert summaries["completed"]["execution_time_p95"] == pytest.approx(9.5, rel=0.02)
+    assert summaries["completed"]["execution_time_max"] == 10.0
+    assert summaries["error"]["count"] == 1
+    assert 'agent_execution_seconds_count{agent_type="CODE_GENERATION",status="completed"} 100' in registry.exposition()
+
+    # The window was drained, so a second flush sends nothing new.
+    analytics.flush()
+    assert len(_events(pipeline, "agent_execution_summary")) == 2
+
+
+def test_summaries_flush_when_interval_elapses():
+    analytics, pipeline = _analytics(sample_rates={}, flush_interval=0)
+    analytics.track_agent_execution("task-1", "DEPLOYMENT", execution_time=1.0)
+
+    assert len(_events(pipeline, "agent_execution")) == 1
+    assert len(_events(pipeline, "agent_execution_summary")) == 1
+
+
+def test_sampled_events_carry_their_rate():
+    analytics, pipeline = _analytics(sample_rates={"code_generated": 0.5})
+    random.seed(1)
+    for i in range(400):
+        analytics.track_code_generation(f"task-{i}", "python", 3, execution_time=1.0)
+
+    sent = _events(pipeline, "code_generated")
+    assert 150 < len(sent) < 250
+    assert all(p["sample_rate"] == 0.5 for p in sent)
+
+
+def test_repository_context_is_limited_and_identifiers_hashed():
+    analytics, pipeline = _analytics()
+    context = {
+        "languages": {f"lang{i}": i for i in range(500)},
+        "description": "x" * 5000,
+        "file_count": 12,
+    }
+    analytics.track_repository_analysis("task-1", "https://github.com/org/repo", context, execution_time=4.0)
+
+    properties = _events(pipeline, "repository_analyzed")[0]
+    assert properties["task_id"] == hash_value("task-1")
+    assert properties["repo_url"] == hash_value("https://github.com/org/repo")
+    assert "languages" not in properties
+    assert properties["languages_bytes"] == len(json.dumps(context["languages"]).encode("utf-8"))
+    assert len(properties["description"]) < 600
+    assert properties["file_count"] == 12
+
+
+def test_property_count_is_capped():
+    limited = limit_properties({f"p{i}": i for i in range(80)}, max_count=50)
+    assert len(limited) == 51
+    assert limited["properties_dropped"] == 30
+
+
+def test_shared_pipeline_configuration_is_not_overridden():
+    configured = EventPipeline(sink=MagicMock())
+    sink = configured.sink
+    Analytics371(pipeline=configured)
+    Analytics371("other-key", pipeline=configured)
+    assert configured.sink is sink
+
+    unconfigured = EventPipeline()
+    Analytics371(pipeline=unconfigured)
+    assert unconfigured.sink is None
+    Analytics371("key", pipeline=unconfigured)
+    assert unconfigured.sink.api_key == "key"
+
+
+def test_pending_summaries_are_sent_on_pipeline_shutdown():
+    sink = MagicMock()
+    pipeline = EventPipeline(sink=sink)
+    analytics = Analytics371(pipeline=pipeline, sample_rates={"agent_execution": 0.0}, flush_interval=3600)
+    analytics.track_agent_execution("task-1", "DEPLOYMENT", execution_time=1.0)
+
+    pipeline.shutdown()
+
+    sent = [event for call in sink.send.call_args_list for event in call.args[0]]
+    assert [event["event"] for event in sent] == ["agent_execution_summary"]
+    assert sent[0]["properties"]["count"] == 1
+
+
+def test_quiet_window_is_flushed_by_timer():
+    analytics, pipeline = _analytics(sample_rates={"agent_execution": 0.0}, flush_interval=0.05)
+    analytics.track_agent_execution("task-1", "DEPLOYMENT", execution_time=1.0)
+    assert _events(pipeline, "agent_execution_summary") == []
+
+    deadline = time.monotonic() + 2.0
+    while not _events(pipeline, "agent_execution_summary") and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(_events(pipeline, "agent_execution_summary")) == 1
@@ -0,0 +1,88 @@
+from datetime import datetime
+
+import pytest
+
+from adaptive_llm_router.budget_guard import BudgetExceededError, BudgetManager
+
+
+class _Ledger:
+    """Stands in for the usage ledger with a settable monthly total."""
+    def __init__(self, spend=0.0):
+        self.spend = spend
+
+    def get_total_cost_for_current_month(self):
+        return self.spend
+
+
+def test_reservations_cannot_overshoot_the_cap():
+    """Test that concurrent reservations are counted against the cap before any cost is recorded."""
+    manager = BudgetManager(1.0, _Ledger())
+
+    manager.reserve(0.4)
+    manager.reserve(0.4)
+    with pytest.raises(BudgetExceededError):
+        manager.reserve(0.4)
+    assert manager.get_remaining_budget_percentage() == pytest.approx(0.2)
+
+
+def test_release_and_reconcile_free_the_reservation():
+    """Test that failed calls release their hold and finished calls hand over to the ledger."""
+    ledger = _Ledger()
+    manager = BudgetManager(1.0, ledger)
+
+    failed = manager.reserve(0.5)
+    manager.release(failed)
+    manager.release(failed)
+    assert manager.reserved == 0
+
+    finished = manager.reserve(0.5)
+    ledger.spend = 0.3
+    assert manager.reconcile(finished, 0.3) == pytest.approx(-0.2)
+    assert manager.headroom() == pytest.approx(0.7)
+
+
+def test_forecast_extrapolates_month_to_date_burn_rate():
+    """Test that a month half spent by its midpoint is forecast to land near the cap."""
+    now = datetime(2025, 6, 16).timestamp()
+    manager = BudgetManager(20.0, _Ledger(spend=7.5))
+
+    # 7.5 USD over 15 days projects to 15 USD over 30 days.
+    assert manager.forecast_month_end_spend(now) == pytest.approx(15.0, rel=0.01)
+
+
+def test_recent_burn_rate_triggers_downgrade():
+    """Test that a spike in spend over the trailing window downgrades routing before the cap."""
+    ledger = _Ledger(spend=1.0)
+    manager = BudgetManager(20.0, ledger, burn_window_seconds=3600)
+    start = datetime(2025, 6, 16).timestamp()
+
+    manager.burn_rate(start)
+    ledger.spend = 3.0
+    # 2 USD in the last hour, sustained for the rest of the month, far exceeds the cap.
+    assert manager.burn_rate(start + 3600) == pytest.approx(2.0 / 3600)
+    assert manager.forecast_month_end_spend(start + 3600) > 20.0
+
+
+def test_burn_rate_samples_at_most_once_per_interval():
+    """Test that frequent rate checks do not grow the spend sample history."""
+    ledger = _Ledger(spend=1.0)
+    manager = BudgetManager(20.0, ledger, burn_window_seconds=3600, sample_interval=1.0)
+    start = datetime(2025, 6, 16).timestamp()
+
+    for i in range(1000):
+        ledger.spend = 1.0 + i * 0.001
+        manager.burn_rate(start + i * 0.001)
+    assert len(manager._spend_samples) == 1
+
+    manager.burn_rate(start + 1.0)
+    assert len(manager._spend_samples) == 2
+
+
+def test_early_month_spend_does_not_force_downgrade():
+    """Test that a single cheap call right after the month starts is not extrapolated to the cap."""
+    now = datetime(2025, 7, 1, 0, 1).timestamp()
+    manager = BudgetManager(20.0, _Ledger(spend=0.01), burn_window_seconds=3600)
+
+    # 1 cent per hour sustained over the month is about 7.4 USD, not hundreds.
+    assert manager.forecast_month_end_spend(now) == pytest.approx(0.01 + 0.01 / 3600 * (31 * 86400 - 60), rel=0.01)
+    assert manager.forecast_month_end_spend(now) < 20.0
@@ -0,0 +1,96 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+
+from adaptive_llm_router.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerRegistry,
+    CircuitOpenError,
+)
+from adaptive_llm_router.policy_engine import rank_providers
+from adaptive_llm_router.provider_registry import provider_registry
+
+
+def _fail(breaker, times):
+    for _ in range(times):
+        assert breaker.allow()
+        breaker.record_failure()
+
+
+def test_opens_on_failure_rate_not_single_failures():
+    """Test that the breaker opens only once the windowed failure rate crosses the threshold."""
+    breaker = CircuitBreaker(min_requests=4, failure_rate=0.5)
+    for _ in range(3):
+        breaker.record_success()
+    _fail(breaker, 2)
+    assert breaker.state == "closed"
+    _fail(breaker, 1)
+    assert breaker.state == "open"
+    assert not breaker.allow()
+    assert breaker.snapshot().opened_count == 1
+
+
+def test_half_open_limits_probes_and_closes_after_successes():
+    """Test that a cooled-down breaker admits a limited number of probes and closes when they succeed."""
+    breaker = CircuitBreaker(min_requests=2, open_seconds=0.0, half_open_probes=2)
+    _fail(breaker, 2)
+    assert breaker.state == "half_open"
+
+    assert breaker.allow() and breaker.allow()
+    assert not breaker.allow()
+    assert not breaker.is_available()
+    breaker.release()
+    assert breaker.is_available()
+    breaker.record_success()
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == "closed"
+    assert breaker.snapshot().requests == 0
+
+
+def test_failed_probe_reopens():
+    """Test that a failing probe sends the breaker straight back to open."""
+    breaker = CircuitBreaker(min_requests=2, open_seconds=60.0, half_open_probes=3)
+    _fail(breaker, 2)
+    breaker.open_seconds = 0.0
+    assert breaker.allow()
+    breaker.open_seconds = 60.0
+    breaker.record_failure()
+    assert breaker.state == "open"
+    assert breaker.snapshot().opened_count == 2
+
+
+@pytest.mark.asyncio
+async def test_guard_isolates_keys_and_ignores_cancellation():
+    """Test that guarded calls only trip their own key and cancellation records no outcome."""
+    registry = CircuitBreakerRegistry(min_requests=2)
+    for _ in range(2):
+        with pytest.raises(RuntimeError):
+            async with registry.guard("digitalocean"):
+                raise RuntimeError("api down")
+    with pytest.raises(CircuitOpenError):
+        async with registry.guard("digitalocean"):
+            pass
+    async with registry.guard("cloudflare"):
+        pass
+
+    with pytest.raises(asyncio.CancelledError):
+        async with registry.guard("aws_ecs"):
+            raise asyncio.CancelledError()
+    assert registry.snapshot()["aws_ecs"].requests == 0
+    assert not registry.is_available("digitalocean")
+    assert registry.is_available("cloudflare")
+
+
+def test_open_breaker_excludes_provider_from_ranking():
+    """Test that the router skips a provider whose breaker is open."""
+    registry = CircuitBreakerRegistry(min_requests=1)
+    with patch("adaptive_llm_router.policy_engine.circuit_breakers", registry), \
+         patch("adaptive_llm_router.policy_engine.budget_manager.get_remaining_budget_percentage", return_value=1.0), \
+         patch("adaptive_llm_router.policy_engine.budget_manager.should_downgrade", return_value=False):
+        top = rank_providers({}, 100, 50)[0]
+        _fail(registry.for_provider(top), 1)
+        ranked = rank_providers({}, 100, 50)
+    assert top not in ranked
+    assert ranked
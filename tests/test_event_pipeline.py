@@ -0,0 +1,120 @@
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from adaptive_llm_router.event_pipeline import EventPipeline, PostHogBatchSink
+
+
+class _PostHogStandIn:
+    """A local HTTP server that records the batches posted to /batch/."""
+    def __init__(self):
+        self.batches = []
+        self.delay = 0.0
+        batches = self.batches
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+                time.sleep(stand_in.delay)
+                batches.append(body["batch"])
+                self.send_response(200)
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    @property
+    def host(self):
+        return f"http://127.0.0.1:{self.port}"
+
+    def events(self):
+        return [event["event"] for batch in self.batches for event in batch]
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def posthog_server():
+    server = _PostHogStandIn()
+    yield server
+    server.close()
+
+
+def test_events_are_sent_in_batches(posthog_server):
+    """Test that queued events are delivered in batches of at most batch_size."""
+    pipeline = EventPipeline(PostHogBatchSink("key", posthog_server.host), batch_size=10, flush_interval=0.05)
+
+    for i in range(25):
+        assert pipeline.capture("agent", f"event_{i}", {"i": i})
+    assert pipeline.flush(timeout=5)
+    pipeline.shutdown()
+
+    assert posthog_server.events() == [f"event_{i}" for i in range(25)]
+    assert max(len(batch) for batch in posthog_server.batches) <= 10
+    assert pipeline.stats.sent == 25
+
+
+def test_capture_does_not_wait_for_a_slow_sink(posthog_server):
+    """Test that capture returns immediately even while the sink is slow."""
+    posthog_server.delay = 0.5
+    pipeline = EventPipeline(PostHogBatchSink("key", posthog_server.host), batch_size=1, flush_interval=0.05)
+
+    started = time.monotonic()
+    for i in range(20):
+        pipeline.capture("agent", "event")
+    assert time.monotonic() - started < 0.1
+    pipeline.shutdown(timeout=0)
+
+
+def test_full_queue_drops_oldest_events():
+    """Test that the drop_oldest policy keeps the newest events when the queue is full."""
+    pipeline = EventPipeline(PostHogBatchSink("key", "http://127.0.0.1:9"), max_queue=3, batch_size=100, flush_interval=60)
+
+    for i in range(5):
+        pipeline.capture("agent", f"event_{i}")
+
+    assert [e["event"] for e in pipeline._queue] == ["event_2", "event_3", "event_4"]
+    assert pipeline.stats.dropped == 2
+    pipeline.shutdown(timeout=0)
+
+
+def test_unavailable_sink_spools_and_replays(tmp_path):
+    """Test that batches are spooled while the sink is down and replayed when it comes back."""
+    server = _PostHogStandIn()
+    host = server.host
+    server.close()
+    pipeline = EventPipeline(
+        PostHogBatchSink("key", host, timeout=0.5),
+        batch_size=2,
+        flush_interval=0.05,
+        spool_dir=tmp_path,
+        max_backoff=0.1,
+    )
+    for i in range(4):
+        pipeline.capture("agent", f"event_{i}")
+    assert pipeline.flush(timeout=5)
+    assert pipeline.stats.spooled == 4
+    assert list(tmp_path.glob("events-*.jsonl"))
+
+    revived = _PostHogStandIn()
+    try:
+        pipeline.sink = PostHogBatchSink("key", revived.host)
+        deadline = time.monotonic() + 5
+        while pipeline.stats.replayed < 4 and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert sorted(revived.events()) == [f"event_{i}" for i in range(4)]
+        assert not list(tmp_path.glob("events-*.jsonl"))
+    finally:
+        pipeline.shutdown()
+        revived.close()
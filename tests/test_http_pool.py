@@ -0,0 +1,117 @@
+import asyncio
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import httpx
+import pytest
+
+from adaptive_llm_router.http_pool import HTTPClientPool, PooledTransport
+
+
+class _SlowServer:
+    """A local keep-alive HTTP server that records concurrency and client ports."""
+    def __init__(self, delay: float = 0.05):
+        self.delay = delay
+        self.active = 0
+        self.max_active = 0
+        self.ports = set()
+        lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                with lock:
+                    server.active += 1
+                    server.max_active = max(server.max_active, server.active)
+                    server.ports.add(self.client_address[1])
+                time.sleep(server.delay)
+                with lock:
+                    server.active -= 1
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"ok")
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_address[1]}/"
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+@pytest.mark.asyncio
+async def test_per_host_cap_and_connection_reuse():
+    """Test that requests to one host are capped and reuse kept-alive connections."""
+    server = _SlowServer()
+    transport = PooledTransport(max_per_host=2, http2=False)
+    try:
+        async with httpx.AsyncClient(transport=transport) as client:
+            for _ in range(2):
+                responses = await asyncio.gather(*(client.get(server.url) for _ in range(8)))
+                assert all(r.text == "ok" for r in responses)
+        assert server.max_active == 2
+        assert len(server.ports) == 2
+        assert transport.in_flight == 0
+    finally:
+        server.close()
+
+
+@pytest.mark.asyncio
+async def test_pool_replaces_transport_after_repeated_errors():
+    """Test that a host failing repeatedly causes the pool to open fresh connections."""
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        dead_url = f"http://127.0.0.1:{s.getsockname()[1]}/"
+
+    pool = HTTPClientPool()
+    client = pool.client()
+    transport = pool.transport()
+    assert pool.transport() is transport
+    for _ in range(3):
+        with pytest.raises(httpx.ConnectError):
+            await client.get(dead_url)
+
+    assert pool.client() is client
+    assert pool.transport() is not transport
+    assert pool.stats()["recycled"] == 1
+    await pool.aclose()
+
+
+def test_client_is_shared_by_event_loops_in_other_threads():
+    """Test that one client serves loops in several threads, each over its own transport."""
+    server = _SlowServer(delay=0.01)
+    pool = HTTPClientPool()
+    transports, errors = [], []
+
+    async def fetch():
+        response = await pool.client().get(server.url)
+        assert response.text == "ok"
+        transports.append(pool.transport())
+        await pool.aclose()
+
+    def run():
+        try:
+            asyncio.run(fetch())
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=run) for _ in range(4)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        server.close()
+
+    assert errors == []
+    assert len({id(t) for t in transports}) == 4
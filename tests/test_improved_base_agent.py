@@ -0,0 +1,440 @@
+import asyncio
+import contextlib
+import io
+import os
+import pickle
+import runpy
+import subprocess
+import sys
+import types
+from datetime import date
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import pytest
+
+from adaptive_llm_router.circuit_breaker import CircuitBreakerRegistry
+
+AGENT_SCRIPT = Path(__file__).resolve().parent.parent / "base_agent" / "improved_base_agent.py"
+
+
+@pytest.fixture(scope="module")
+def agent_module():
+    """Exec the improved base agent source held by the script into a fresh module."""
+    with contextlib.redirect_stdout(io.StringIO()):
+        namespace = runpy.run_path(str(AGENT_SCRIPT))
+    module = types.ModuleType("improved_base_agent")
+    exec(compile(namespace["improved_base_agent_code"], str(AGENT_SCRIPT), "exec"), module.__dict__)
+    return module
+
+
+def _task(agent_module, task_id, priority=5, tenant="a", **kwargs):
+    return agent_module.Task(
+        id=str(task_id),
+        description="",
+        agent_type=agent_module.AgentType.CEO,
+        payload={},
+        priority=priority,
+        tenant_id=tenant,
+        **kwargs,
+    )
+
+
+async def _drain(queue, count):
+    return [(await queue.get_task()).id for _ in range(count)]
+
+
+@pytest.mark.asyncio
+async def test_tasks_run_in_priority_order(agent_module):
+    """Test that queued tasks of one tenant are served most urgent first, FIFO within a priority."""
+    queue = agent_module.TaskQueue(aging_seconds=10)
+    for task_id, priority in enumerate([10, 5, 1, 5]):
+        await queue.add_task(_task(agent_module, task_id, priority))
+
+    assert await _drain(queue, 4) == ["2", "1", "3", "0"]
+    assert queue.qsize() == 0
+
+
+@pytest.mark.asyncio
+async def test_aged_low_priority_task_is_not_starved(agent_module):
+    """Test that a low-priority task runs before urgent tasks queued long enough after it."""
+    queue = agent_module.TaskQueue(aging_seconds=0.001)
+    await queue.add_task(_task(agent_module, "old", priority=10))
+    await asyncio.sleep(0.02)
+    await queue.add_task(_task(agent_module, "new", priority=1))
+
+    assert await _drain(queue, 2) == ["old", "new"]
+
+
+@pytest.mark.asyncio
+async def test_tenants_share_the_queue_by_weight(agent_module):
+    """Test that a flooding tenant does not delay another, and weights set each tenant's share."""
+    queue = agent_module.TaskQueue(tenant_weights={"b": 2})
+    for i in range(20):
+        await queue.add_task(_task(agent_module, f"a{i}", tenant="a"))
+    for i in range(5):
+        await queue.add_task(_task(agent_module, f"b{i}", tenant="b"))
+
+    served = await _drain(queue, 9)
+    assert sorted(t for t in served if t.startswith("b")) == [f"b{i}" for i in range(5)]
+    # Tenant a keeps its own FIFO order while sharing.
+    assert [t for t in served if t.startswith("a")] == ["a0", "a1", "a2", "a3"]
+
+
+@pytest.mark.asyncio
+async def test_task_near_its_deadline_runs_next(agent_module):
+    """Test that a task whose timeout is within urgent_seconds jumps the queue regardless of priority and tenant."""
+    queue = agent_module.TaskQueue(urgent_seconds=30)
+    for i in range(5):
+        await queue.add_task(_task(agent_module, f"n{i}", priority=1))
+    await queue.add_task(_task(agent_module, "urgent", priority=10, tenant="c", timeout_seconds=20))
+
+    assert await _drain(queue, 3) == ["urgent", "n0", "n1"]
+    assert queue.qsize() == 3
+
+
+def _failing_agent(agent_module, **kwargs):
+    class FailingAgent(agent_module.ImprovedBaseAgent):
+        attempts = 0
+
+        async def process_task(self, task):
+            self.attempts += 1
+            raise RuntimeError("upstream down")
+
+        async def health_check(self):
+            return True
+
+    settings = dict(enable_caching=False, enable_circuit_breaker=False, retry_base_delay=0.0)
+    settings.update(kwargs)
+    return FailingAgent("failing", agent_module.AgentType.CEO, **settings)
+
+
+async def _wait_for(condition, timeout=2.0):
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    while not condition() and loop.time() < deadline:
+        await asyncio.sleep(0.005)
+    assert condition()
+
+
+def _blocking_agent(agent_module, **kwargs):
+    class BlockingAgent(agent_module.ImprovedBaseAgent):
+        async def process_task(self, task):
+            await self.release.wait()
+            return {"ok": True}
+
+        async def health_check(self):
+            return True
+
+    agent = BlockingAgent("blocking", agent_module.AgentType.CEO, enable_caching=False, **kwargs)
+    agent.release = asyncio.Event()
+    return agent
+
+
+@pytest.mark.asyncio
+async def test_idle_worker_wakes_when_a_task_is_added(agent_module):
+    """Test that a worker blocked on the queue is woken by add_task rather than by polling."""
+    queue = agent_module.TaskQueue()
+    getter = asyncio.ensure_future(queue.get_task())
+    await _wait_for(lambda: queue.waiting == 1)
+    assert not getter.done()
+
+    await queue.add_task(_task(agent_module, "wake"))
+    task = await asyncio.wait_for(getter, timeout=0.1)
+    assert task.id == "wake"
+    assert queue.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_workers_scale_up_with_backlog_and_down_when_idle(agent_module):
+    """Test that a backlog starts workers up to max_concurrent_tasks and idle ones retire to min_workers."""
+    agent = _blocking_agent(agent_module, max_concurrent_tasks=3, min_workers=1)
+    try:
+        await agent.start_workers()
+        assert len(agent.worker_tasks) == 1
+        for i in range(5):
+            await agent.submit_task(_task(agent_module, f"t{i}"))
+        await _wait_for(lambda: len(agent.task_queue.active_tasks) == 3)
+        assert len(agent.worker_tasks) == 3
+        assert agent.task_queue.qsize() == 2
+
+        agent.release.set()
+        await _wait_for(lambda: len(agent.task_queue.completed_tasks) == 5 and agent.task_queue.waiting == 3)
+        await agent._scale_down()
+        await _wait_for(lambda: len(agent.worker_tasks) == 1)
+    finally:
+        await agent.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_stop_workers_cancels_tasks_still_running_after_the_timeout(agent_module):
+    """Test that shutdown does not wait past its timeout for a task that never finishes."""
+    agent = _blocking_agent(agent_module)
+    await agent.submit_task(_task(agent_module, "stuck", timeout_seconds=None))
+    await _wait_for(lambda: agent.task_queue.active_tasks)
+
+    await asyncio.wait_for(agent.stop_workers(timeout=0.05), timeout=1.0)
+    assert agent.worker_tasks == {}
+    assert not agent.workers_started
+
+
+@pytest.mark.asyncio
+async def test_delayed_tasks_are_requeued_when_due(agent_module):
+    """Test that delayed tasks reach the queue in due order and not before their delay."""
+    loop = asyncio.get_running_loop()
+    queue = agent_module.TaskQueue()
+    ready = []
+    delayed = agent_module.DelayedTaskQueue(queue, on_ready=lambda: ready.append(loop.time()))
+    start = loop.time()
+    delayed.schedule(_task(agent_module, "late"), 0.1)
+    delayed.schedule(_task(agent_module, "early"), 0.02)
+    assert len(delayed) == 2 and queue.qsize() == 0
+
+    await _wait_for(lambda: len(ready) == 2)
+    assert await _drain(queue, 2) == ["early", "late"]
+    assert ready[0] - start >= 0.02
+    assert ready[1] - start >= 0.1
+    assert len(delayed) == 0
+
+
+def test_retry_budget_is_exhausted_and_grows_with_attempts(agent_module):
+    """Test that retries beyond the budget are denied, and first attempts add to the budget."""
+    budget = agent_module.RetryBudget(ratio=0.5, min_per_second=1.0, window_seconds=2.0)
+    assert budget.try_spend() and budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.denied == 1
+
+    for _ in range(2):
+        budget.record_attempt()
+    assert budget.try_spend()
+    assert not budget.try_spend()
+    assert budget.denied == 2
+
+
+@pytest.mark.asyncio
+async def test_task_is_dead_lettered_after_max_retries(agent_module):
+    """Test that a failing task is retried max_retries times and then moved to the dead-letter queue."""
+    agent = _failing_agent(agent_module)
+    task = _task(agent_module, "doomed", max_retries=2)
+    try:
+        await agent.submit_task(task)
+        await _wait_for(lambda: agent.dead_letter_queue)
+    finally:
+        await agent.shutdown()
+
+    assert agent.attempts == 3
+    assert list(agent.dead_letter_queue) == [task]
+    assert task.status == agent_module.TaskStatus.FAILED
+    assert task.retry_count == 2
+    assert task.result == {"error": "upstream down", "dead_letter_reason": "retries exhausted"}
+
+
+@pytest.mark.asyncio
+async def test_task_is_dead_lettered_when_retry_budget_runs_out(agent_module):
+    """Test that a task is dead-lettered without retrying when the retry budget is spent."""
+    agent = _failing_agent(agent_module, retry_budget=agent_module.RetryBudget(ratio=0.0, min_per_second=0.0))
+    task = _task(agent_module, "throttled", max_retries=5)
+    try:
+        await agent.submit_task(task)
+        await _wait_for(lambda: agent.dead_letter_queue)
+    finally:
+        await agent.shutdown()
+
+    assert agent.attempts == 1
+    assert task.retry_count == 0
+    assert task.result["dead_letter_reason"] == "retry budget exhausted"
+    assert agent.get_status()["retries_denied"] == 1
+
+
+@pytest.mark.asyncio
+async def test_tasks_without_upstream_fail_fast_on_the_agent_breaker(agent_module):
+    """Test that tasks naming no upstream share a breaker per agent and task type, reported by get_status."""
+    breakers = CircuitBreakerRegistry(min_requests=2, failure_rate=0.5, open_seconds=60)
+    agent = _failing_agent(
+        agent_module, enable_circuit_breaker=True, breaker_registry=breakers, max_concurrent_tasks=1
+    )
+    try:
+        for i in range(4):
+            await agent.submit_task(_task(agent_module, f"t{i}", max_retries=0))
+        await _wait_for(lambda: len(agent.dead_letter_queue) == 4)
+    finally:
+        await agent.shutdown()
+
+    assert agent.attempts == 2
+    status = agent.get_status()
+    assert status["circuit_breaker_open"] is True
+    assert status["open_circuits"] == {"agent:ceo:default": "open"}
+
+
+@pytest.mark.asyncio
+async def test_shutdown_removes_the_agent_gauges(agent_module):
+    """Test that a stopped agent's gauges and watched values leave the shared registry."""
+    agent = _failing_agent(agent_module)
+    series = 'agent_workers{agent_type="ceo",agent_id="failing"}'
+    await agent.start_workers()
+    assert series in agent.get_prometheus_metrics()
+
+    await agent.shutdown()
+    assert series not in agent.get_prometheus_metrics()
+
+
+def test_disk_cache_is_shared_across_instances(agent_module, tmp_path):
+    """Test that a value set through one cache is read back by another cache on the same file."""
+    path = str(tmp_path / "cache.db")
+    writer = agent_module.LRUCache(backend=agent_module.SQLiteCacheBackend(path))
+    writer.set("key", {"content": "hello"})
+
+    reader = agent_module.LRUCache(backend=agent_module.SQLiteCacheBackend(path))
+    assert reader.get("key") == {"content": "hello"}
+    assert reader.hits == 1
+    # The hit was promoted into the reader's memory tier.
+    assert len(reader) == 1
+
+
+def test_disk_cache_expires_and_purges_entries(agent_module, tmp_path):
+    """Test that expired rows are not returned and purge drops them, then the soonest-expiring rows over max_bytes."""
+    backend = agent_module.SQLiteCacheBackend(str(tmp_path / "cache.db"), max_bytes=10)
+    backend.set("stale", b"x" * 4, expires_at=100.0)
+    backend.set("soon", b"x" * 4, expires_at=300.0)
+    backend.set("later", b"x" * 4, expires_at=400.0)
+    backend.set("latest", b"x" * 4, expires_at=500.0)
+
+    assert backend.get("stale", now=200.0) is None
+    assert backend.get("soon", now=200.0) == (b"x" * 4, 300.0)
+
+    backend.purge(now=200.0)
+    keys = {row[0] for row in backend._conn().execute("SELECT key FROM cache")}
+    assert keys == {"later", "latest"}
+
+    expired = agent_module.LRUCache(ttl_seconds=-1, backend=backend)
+    expired.set("gone", "value")
+    assert agent_module.LRUCache(backend=backend).get("gone") is None
+
+
+def _pickled_size(value):
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def test_cache_evicts_least_recently_used_to_stay_under_max_bytes(agent_module):
+    """Test that inserts evict least recently used entries until the cache fits in max_bytes."""
+    value = "x" * 100
+    size = _pickled_size(value)
+    cache = agent_module.LRUCache(max_bytes=3 * size)
+    for key in ("a", "b", "c"):
+        cache.set(key, value)
+    assert cache.get("a") == value  # "b" is now least recently used
+
+    cache.set("d", value)
+    assert cache.get("b") is None
+    assert [key for key in ("a", "c", "d") if cache.get(key) is not None] == ["a", "c", "d"]
+    assert cache.evictions == 1
+
+    # A larger entry evicts as many of the oldest entries as it takes.
+    cache.set("big", "y" * 150)
+    assert cache.get("a") is None and cache.get("c") is None
+    assert cache.get("d") == value and cache.get("big") is not None
+    assert cache.size_bytes == size + _pickled_size("y" * 150) <= cache.max_bytes
+    assert cache.evictions == 3
+
+
+def test_cache_entries_expire_after_ttl(agent_module):
+    """Test that entries are dropped once their TTL has passed."""
+    cache = agent_module.LRUCache(ttl_seconds=60)
+    with patch("time.time", return_value=1000.0):
+        cache.set("key", "value")
+    with patch("time.time", return_value=1059.0):
+        assert cache.get("key") == "value"
+    with patch("time.time", return_value=1061.0):
+        assert cache.get("key") is None
+    assert cache.expirations == 1
+    assert len(cache) == 0 and cache.size_bytes == 0
+
+
+def test_cache_size_is_recounted_on_overwrite(agent_module):
+    """Test that overwriting a key replaces its size instead of adding to it."""
+    cache = agent_module.LRUCache()
+    cache.set("key", "x" * 10)
+    cache.set("key", "x" * 1000)
+    assert cache.size_bytes == _pickled_size("x" * 1000)
+    cache.set("key", "x")
+    assert cache.size_bytes == _pickled_size("x")
+    assert len(cache) == 1
+
+    # A value larger than the whole cache is not stored, and drops the old entry.
+    small = agent_module.LRUCache(max_bytes=50)
+    small.set("key", "x")
+    small.set("key", "x" * 100)
+    assert small.get("key") is None
+    assert small.size_bytes == 0
+
+
+KEY_META = {"model": "gpt-4o", "temperature": 0.2, "tools": {"search", "code"}, "options": {"b": 1, "a": [1, 2]}}
+
+KEY_SCRIPT = """
+import contextlib, io, runpy, sys, types
+with contextlib.redirect_stdout(io.StringIO()):
+    namespace = runpy.run_path(sys.argv[1])
+module = types.ModuleType("improved_base_agent")
+exec(compile(namespace["improved_base_agent_code"], sys.argv[1], "exec"), module.__dict__)
+meta = {"options": {"a": [1, 2], "b": 1}, "tools": {"code", "search"}, "temperature": 0.2, "model": "gpt-4o"}
+print(module.stable_cache_key("Summarize   this", meta))
+"""
+
+
+def test_cache_key_ignores_ordering_and_volatile_fields(agent_module):
+    """Test that dict and set ordering, prompt whitespace and volatile meta fields do not change the key."""
+    key = agent_module.stable_cache_key("Summarize this", KEY_META)
+    reordered = dict(reversed(list(KEY_META.items())), options={"a": [1, 2], "b": 1}, tools={"code", "search"})
+    assert agent_module.stable_cache_key("Summarize   this ", reordered) == key
+    assert agent_module.stable_cache_key("Summarize this", dict(KEY_META, task_id="t-1", user_id="u-1")) == key
+
+
+def test_cache_key_changes_with_content(agent_module):
+    """Test that a different prompt, meta value or namespace gives a different key."""
+    key = agent_module.stable_cache_key("Summarize this", KEY_META)
+    assert agent_module.stable_cache_key("Summarize that", KEY_META) != key
+    assert agent_module.stable_cache_key("Summarize this", dict(KEY_META, temperature=0.3)) != key
+    assert agent_module.stable_cache_key("Summarize this", dict(KEY_META, options={"b": 1, "a": [2, 1]})) != key
+    assert agent_module.stable_cache_key("Summarize this", KEY_META, namespace="policy-next") != key
+
+
+def test_cache_key_is_the_same_in_another_process(agent_module):
+    """Test that a process with a different hash seed computes the same key."""
+    env = dict(os.environ, PYTHONHASHSEED="12345")
+    result = subprocess.run(
+        [sys.executable, "-c", KEY_SCRIPT, str(AGENT_SCRIPT)],
+        cwd=AGENT_SCRIPT.parent.parent, env=env, capture_output=True, text=True, timeout=120, check=True,
+    )
+    assert result.stdout.strip().splitlines()[-1] == agent_module.stable_cache_key("Summarize this", KEY_META)
+
+
+def test_cache_key_rejects_values_without_a_stable_encoding(agent_module):
+    """Test that objects and non-string keys raise TypeError rather than hashing an unstable repr."""
+    with pytest.raises(TypeError):
+        agent_module.stable_cache_key("prompt", {"client": object()})
+    with pytest.raises(TypeError):
+        agent_module.stable_cache_key("prompt", {"options": {("a", "b"): 1}})
+    assert agent_module.stable_cache_key("prompt", {"day": date(2024, 1, 2)}) == \
+        agent_module.stable_cache_key("prompt", {"day": "2024-01-02"})
+
+
+@pytest.mark.asyncio
+async def test_uncacheable_meta_bypasses_the_cache(agent_module):
+    """Test that a request whose meta has no stable key is sent uncached instead of failing."""
+    class Agent(agent_module.ImprovedBaseAgent):
+        async def process_task(self, task):
+            return {}
+
+        async def health_check(self):
+            return True
+
+    agent = Agent("cacheless", agent_module.AgentType.CEO, enable_circuit_breaker=False)
+    invoke = AsyncMock(return_value={"content": "ok"})
+    with patch.object(agent_module, "alr_invoke", invoke):
+        for _ in range(2):
+            assert await agent.llm_invoke_with_pooling("prompt", {"client": object()}) == {"content": "ok"}
+        for _ in range(2):
+            assert await agent.llm_invoke_with_pooling("prompt", {"model": "gpt-4o"}) == {"content": "ok"}
+
+    assert invoke.await_count == 3
+    assert len(agent.cache) == 1
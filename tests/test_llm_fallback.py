@@ -0,0 +1,124 @@
+import asyncio
+from types import SimpleNamespace
+from unittest.mock import patch
+
+import litellm
+import pytest
+
+from adaptive_llm_router import llm
+from adaptive_llm_router.budget_guard import BudgetManager
+from adaptive_llm_router.circuit_breaker import CircuitBreakerRegistry
+from adaptive_llm_router.config import MONTHLY_BUDGET_CAP
+from adaptive_llm_router.provider_stats import ProviderStatsTracker
+from adaptive_llm_router.rate_limiter import ProviderLimiter, RateLimiter
+from adaptive_llm_router.response_cache import ResponseCache
+from adaptive_llm_router.usage_ledger import UsageLedger
+
+
+def _response(model):
+    return SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content=f"from {model}"))],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20),
+    )
+
+
+@pytest.fixture
+def router(tmp_path):
+    """Isolates the router's ledger, budget, cache, provider stats and circuit breakers."""
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+    budget = BudgetManager(MONTHLY_BUDGET_CAP, ledger)
+    stats = ProviderStatsTracker()
+    breakers = CircuitBreakerRegistry()
+    with patch.object(llm, "usage_ledger", ledger), \
+         patch.object(llm, "budget_manager", budget), \
+         patch.object(llm, "response_cache", ResponseCache(None)), \
+         patch.object(llm, "provider_stats", stats), \
+         patch.object(llm, "circuit_breakers", breakers), \
+         patch("adaptive_llm_router.policy_engine.budget_manager", budget), \
+         patch("adaptive_llm_router.policy_engine.provider_stats", stats), \
+         patch("adaptive_llm_router.policy_engine.circuit_breakers", breakers):
+        yield ledger
+
+
+def _statuses(ledger):
+    return [(r["model"], r["status"]) for r in ledger.storage.iter_records()]
+
+
+@pytest.mark.asyncio
+async def test_failed_provider_falls_back_to_next_in_chain(router):
+    """Test that a provider error moves on to the next ranked provider."""
+    chain = llm.rank_providers({}, 10, 5)
+
+    async def acompletion(model, messages, **kwargs):
+        if model == f"{chain[0].name}/{chain[0].model}":
+            raise RuntimeError("upstream down")
+        return _response(model)
+
+    with patch.object(litellm, "acompletion", acompletion):
+        result = await llm.invoke("hello", {"agent_name": "test_agent"})
+
+    assert result == f"from {chain[1].name}/{chain[1].model}"
+    assert _statuses(router) == [(chain[0].model, "error"), (chain[1].model, "fallback")]
+    assert llm.budget_manager.reserved == 0
+    assert llm.response_cache.get("hello", f"{chain[0].name}:{chain[0].model}", {}) is None
+    assert llm.response_cache.get("hello", f"{chain[1].name}:{chain[1].model}", {}) == result
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_hedged(router):
+    """Test that a hedge request wins against a provider slower than its p95."""
+    chain = llm.rank_providers({}, 10, 5)
+
+    async def acompletion(model, messages, **kwargs):
+        if model == f"{chain[0].name}/{chain[0].model}":
+            await asyncio.sleep(10)
+        return _response(model)
+
+    with patch.object(litellm, "acompletion", acompletion), \
+         patch.object(llm, "_hedge_delay", lambda provider: 0.01):
+        result = await llm.invoke("hello", {"agent_name": "test_agent", "hedge": True})
+
+    assert result == f"from {chain[1].name}/{chain[1].model}"
+    assert _statuses(router) == [(chain[0].model, "hedge_cancelled"), (chain[1].model, "hedged")]
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_provider_falls_back(router):
+    """Test that a provider whose rate-limit queue is full is skipped without an error record."""
+    chain = llm.rank_providers({}, 10, 5)
+    busy = ProviderLimiter(max_concurrency=1)
+    await busy.acquire(0)
+    limiter = RateLimiter(max_wait=0.01)
+
+    async def acompletion(model, messages, **kwargs):
+        return _response(model)
+
+    with patch.object(litellm, "acompletion", acompletion), \
+         patch.object(llm, "rate_limiter", limiter), \
+         patch.object(limiter, "limiter", lambda provider: busy if provider is chain[0] else None):
+        result = await llm.invoke("hello", {"agent_name": "test_agent"})
+
+    assert result == f"from {chain[1].name}/{chain[1].model}"
+    assert _statuses(router) == [(chain[0].model, "rate_limited"), (chain[1].model, "fallback")]
+
+
+@pytest.mark.asyncio
+async def test_invoke_many_records_failures(router):
+    """Test that prompts failing inside invoke_many are written to the ledger and provider stats."""
+    async def acompletion(model, messages, **kwargs):
+        raise RuntimeError("upstream down")
+
+    def batch_completion(model, messages, **kwargs):
+        raise RuntimeError("upstream down")
+
+    with patch.object(litellm, "acompletion", acompletion), \
+         patch.object(litellm, "batch_completion", batch_completion):
+        results = [r async for r in llm.invoke_many(["first prompt", "second prompt"], {"agent_name": "test_agent"})]
+
+    assert all(isinstance(result, RuntimeError) for _, result in results)
+    records = list(router.storage.iter_records())
+    assert [r["status"] for r in records] == ["error", "error"]
+    assert all(r["tokens_in"] > 0 for r in records)
+    provider = llm.provider_registry.get_provider(records[0]["provider"], records[0]["model"])
+    assert llm.provider_stats.health(provider).error_rate == 1.0
+    assert llm.budget_manager.reserved == 0
@@ -0,0 +1,177 @@
+import math
+import threading
+import urllib.request
+from types import SimpleNamespace
+from unittest.mock import patch
+from wsgiref.simple_server import WSGIRequestHandler, make_server
+
+import litellm
+import pytest
+
+from adaptive_llm_router import llm
+from adaptive_llm_router.budget_guard import BudgetManager
+from adaptive_llm_router.circuit_breaker import CircuitBreakerRegistry
+from adaptive_llm_router.config import MONTHLY_BUDGET_CAP
+from adaptive_llm_router.metrics import (
+    PROMETHEUS_CONTENT_TYPE,
+    MetricsRegistry,
+    _Sharded,
+    merged_quantiles,
+    metrics_registry,
+)
+from adaptive_llm_router.provider_stats import ProviderStatsTracker
+from adaptive_llm_router.rate_limiter import RateLimiter
+from adaptive_llm_router.response_cache import ResponseCache
+from adaptive_llm_router.usage_ledger import UsageLedger
+
+
+def test_histogram_quantiles_within_relative_error():
+    """Test that percentiles of values spanning several orders of magnitude stay within the bucket error."""
+    registry = MetricsRegistry(sub_buckets=64)
+    histogram = registry.histogram("latency_seconds", "Latency").labels()
+    values = [0.001 * 1.01 ** i for i in range(1000)]
+    for value in values:
+        histogram.observe(value)
+
+    for q, estimate in histogram.quantiles((0.5, 0.95, 0.99)).items():
+        exact = values[int(q * (len(values) - 1))]
+        assert abs(estimate - exact) / exact <= 1 / 64
+    assert histogram.count == 1000
+    assert histogram.sum == pytest.approx(sum(values))
+
+
+def test_counters_merge_thread_shards():
+    """Test that increments from many threads are all counted without a lock."""
+    registry = MetricsRegistry()
+    counter = registry.counter("events_total", "Events").labels()
+
+    def work():
+        for _ in range(10000):
+            counter.inc()
+
+    threads = [threading.Thread(target=work) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert counter.value == 40000
+    assert counter.rate() > 0
+
+
+def test_window_forgets_old_values(monkeypatch):
+    """Test that rates and percentiles only cover the sliding window while totals are kept."""
+    clock = [1000.0]
+    monkeypatch.setattr("adaptive_llm_router.metrics.time.monotonic", lambda: clock[0])
+    registry = MetricsRegistry(window_seconds=60.0, window_slots=6)
+    counter = registry.counter("tasks_total", "Tasks").labels()
+    histogram = registry.histogram("task_seconds", "Task time").labels()
+
+    for _ in range(30):
+        counter.inc()
+        histogram.observe(10.0)
+    clock[0] += 120.0
+    histogram.observe(0.5)
+
+    assert counter.value == 30
+    assert counter.rate() == 0
+    assert histogram.quantiles((0.99,))[0.99] == pytest.approx(0.5, rel=0.01)
+    assert histogram.count == 31
+    assert math.isnan(merged_quantiles([registry.histogram("idle_seconds", "Idle").labels()], (0.5,))[0.5])
+
+
+def test_prometheus_exposition():
+    """Test the text format for labeled counters, gauges and histograms."""
+    registry = MetricsRegistry()
+    tasks = registry.counter("agent_tasks_total", "Tasks finished", ("agent_type", "status"))
+    tasks.labels(agent_type="ceo", status="completed").inc(3)
+    registry.gauge("queue_depth", "Queued tasks").labels().set_function(lambda: 7)
+    registry.gauge("broken", "Fails at scrape time").labels().set_function(lambda: 1 / 0)
+    registry.histogram("task_seconds", "Task time", ("agent_type",)).labels(agent_type='say "hi"').observe(0.25)
+
+    text = registry.exposition()
+    assert "# TYPE agent_tasks_total counter" in text
+    assert 'agent_tasks_total{agent_type="ceo",status="completed"} 3.0' in text
+    assert "queue_depth 7.0" in text
+    assert "\nbroken " not in text
+    assert "# TYPE task_seconds summary" in text
+    assert 'task_seconds{agent_type="say \\"hi\\"",quantile="0.99"}' in text
+    assert 'task_seconds_count{agent_type="say \\"hi\\""} 1' in text
+
+    assert registry.counter("agent_tasks_total", "Tasks finished", ("agent_type", "status")) is tasks
+    with pytest.raises(ValueError):
+        registry.gauge("agent_tasks_total", "Tasks finished")
+    with pytest.raises(ValueError):
+        tasks.labels(agent_type="ceo")
+    with pytest.raises(TypeError):
+        _Sharded(registry.window)
+
+
+class _QuietHandler(WSGIRequestHandler):
+    def log_message(self, *args):
+        pass
+
+
+def _scrape(registry):
+    server = make_server("127.0.0.1", 0, registry.wsgi_app, handler_class=_QuietHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        with urllib.request.urlopen(f"http://127.0.0.1:{server.server_port}/metrics", timeout=5) as response:
+            return response.headers["Content-Type"], response.read().decode("utf-8")
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.mark.asyncio
+async def test_router_series_are_served_after_a_call(tmp_path):
+    """Test that a router call shows up in the limiter, breaker, cache, ledger and provider series of a scrape."""
+    registry = MetricsRegistry()
+    ledger = UsageLedger(tmp_path / "llm_usage.json", registry=registry)
+    budget = BudgetManager(MONTHLY_BUDGET_CAP, ledger)
+    stats = ProviderStatsTracker(registry=registry)
+    breakers = CircuitBreakerRegistry(registry=registry)
+    response = SimpleNamespace(
+        choices=[SimpleNamespace(message=SimpleNamespace(content="hi"))],
+        usage=SimpleNamespace(prompt_tokens=10, completion_tokens=20),
+    )
+
+    async def acompletion(model, messages, **kwargs):
+        return response
+
+    with patch.object(llm, "usage_ledger", ledger), \
+         patch.object(llm, "budget_manager", budget), \
+         patch.object(llm, "response_cache", ResponseCache(tmp_path / "cache.jsonl", registry=registry)), \
+         patch.object(llm, "rate_limiter", RateLimiter(registry=registry)), \
+         patch.object(llm, "provider_stats", stats), \
+         patch.object(llm, "circuit_breakers", breakers), \
+         patch("adaptive_llm_router.policy_engine.budget_manager", budget), \
+         patch("adaptive_llm_router.policy_engine.provider_stats", stats), \
+         patch("adaptive_llm_router.policy_engine.circuit_breakers", breakers), \
+         patch.object(litellm, "acompletion", acompletion):
+        provider = llm.rank_providers({}, 10, 5)[0]
+        for _ in range(2):
+            assert await llm.invoke("hello", {"agent_name": "test_agent"}) == "hi"
+        llm.response_cache.flush()
+    ledger.storage.sync()
+
+    content_type, text = _scrape(registry)
+    key = f"{provider.name}:{provider.model}"
+    assert content_type == PROMETHEUS_CONTENT_TYPE
+    assert f'llm_provider_requests_total{{provider="{key}",status="ok"}} 1.0' in text
+    assert f'llm_provider_latency_seconds_count{{provider="{key}"}} 1' in text
+    assert f'llm_rate_limit_acquired_total{{provider="{key}"}} 1.0' in text
+    assert f'circuit_breaker_state{{key="llm:{key}",state="closed"}} 1.0' in text
+    assert f'circuit_breaker_opened_total{{key="llm:{key}"}} 0.0' in text
+    assert 'llm_response_cache_hits_total{tier="exact"} 1.0' in text
+    assert "llm_response_cache_misses_total 1.0" in text
+    assert "llm_response_cache_file_bytes 0.0" not in text
+    # One record for the provider call and one for the cache hit.
+    assert "llm_ledger_records_appended_total 2.0" in text
+    assert "llm_ledger_fsyncs_total 1.0" in text
+
+    # The process-wide registry behind /metrics carries the default instances' series.
+    default_text = metrics_registry.exposition()
+    for name in ("llm_provider_requests_total", "circuit_breaker_state", "llm_response_cache_hits_total",
+                 "llm_ledger_fsyncs_total", "llm_rate_limit_acquired_total"):
+        assert f"# TYPE {name} " in default_text
@@ -0,0 +1,75 @@
+from unittest.mock import patch
+
+from adaptive_llm_router.policy_engine import rank_providers, select_provider
+from adaptive_llm_router.provider_registry import provider_registry
+from adaptive_llm_router.provider_stats import ProviderStatsTracker
+
+
+def _select(meta, est_in=100, stats=None, budget=1.0, downgrade=False):
+    stats = stats or ProviderStatsTracker()
+    with patch("adaptive_llm_router.policy_engine.provider_stats", stats), \
+         patch("adaptive_llm_router.policy_engine.budget_manager.get_remaining_budget_percentage", return_value=budget), \
+         patch("adaptive_llm_router.policy_engine.budget_manager.should_downgrade", return_value=downgrade):
+        return select_provider(meta, est_in, est_in // 2), rank_providers(meta, est_in, est_in // 2)
+
+
+def test_confidential_requests_stay_local():
+    """Test that confidential requests are only routed to reserved local providers."""
+    selected, ranked = _select({"confidential": True})
+    assert selected == "localai:phi-4-14b"
+    assert {p.name for p in ranked} == {"localai"}
+
+
+def test_low_budget_prefers_cheapest_provider():
+    """Test that low-budget mode weights cost above everything else."""
+    selected, _ = _select({}, budget=0.01)
+    assert selected == "openrouter:mistral-7b"
+
+
+def test_forecast_overrun_downgrades_quality_requests():
+    """Test that a forecast budget overrun routes even high-quality requests to the cheapest model."""
+    selected, _ = _select({"quality": "high"}, downgrade=True)
+    assert selected == "openrouter:mistral-7b"
+
+
+def test_failing_provider_is_demoted():
+    """Test that a provider with a high recent error rate is ranked last."""
+    stats = ProviderStatsTracker(min_samples=3)
+    healthy_choice, _ = _select({}, stats=stats)
+    failing = provider_registry.get_provider(*healthy_choice.split(":"))
+    for _ in range(3):
+        stats.record(failing, 100, ok=False)
+
+    selected, ranked = _select({}, stats=stats)
+    assert selected != healthy_choice
+    assert ranked[-1] is failing
+
+
+def test_slow_provider_is_demoted():
+    """Test that a provider whose p95 far exceeds its declared latency is demoted."""
+    stats = ProviderStatsTracker(min_samples=3)
+    provider = provider_registry.get_provider("openrouter", "gpt-4o-mini")
+    for _ in range(3):
+        stats.record(provider, provider.latency_ms * 10, ok=True)
+
+    assert stats.is_demoted(provider)
+    assert stats.health(provider).p95_latency_ms == provider.latency_ms * 10
+
+
+def test_health_is_taken_once_per_provider_and_cached():
+    """Test that ranking snapshots each provider once and the snapshot is reused until the next sample."""
+    stats = ProviderStatsTracker(min_samples=1)
+    provider = provider_registry.get_provider("openrouter", "gpt-4o-mini")
+    stats.record(provider, 100, ok=True)
+
+    with patch.object(stats, "health", wraps=stats.health) as health:
+        _, ranked = _select({}, stats=stats)
+    calls = [c.args[0] for c in health.call_args_list]
+    # select_provider and rank_providers each rank once.
+    assert len(calls) == 2 * len({id(p) for p in calls}) == 2 * len(ranked)
+
+    first = stats.health(provider)
+    assert stats.health(provider) is first
+    stats.record(provider, 300, ok=True)
+    assert stats.health(provider) is not first
+    assert stats.health(provider).p95_latency_ms == 300
@@ -0,0 +1,64 @@
+import json
+import os
+
+from adaptive_llm_router.provider_registry import ProviderRegistry
+
+
+def _provider(name, model, cost=0.001, max_context=32000, latency_ms=500):
+    return {
+        "name": name,
+        "model": model,
+        "cost_in": cost,
+        "cost_out": cost,
+        "max_context": max_context,
+        "latency_ms": latency_ms,
+        "endpoint_env": "TEST_API_KEY",
+    }
+
+
+def test_lookup_and_secondary_indexes(tmp_path):
+    """Test the (name, model) index and the context/latency/cost indexes."""
+    providers_file = tmp_path / "providers.json"
+    providers_file.write_text(json.dumps([
+        _provider("openrouter", "big", cost=0.01, max_context=200000, latency_ms=900),
+        _provider("openrouter", "small", cost=0.0002, max_context=32000, latency_ms=300),
+        _provider("localai", "local", cost=0.0, max_context=8000, latency_ms=100),
+    ]))
+    registry = ProviderRegistry(providers_file)
+
+    assert registry.get_provider("openrouter", "small").latency_ms == 300
+    assert registry.get_provider("openrouter", "missing") is None
+    assert [p.model for p in registry.providers_with_context(30000)] == ["small", "big"]
+    assert [p.model for p in registry.providers_by_latency()] == ["local", "small", "big"]
+    assert [p.model for p in registry.providers_in_cost_tier("free")] == ["local"]
+    assert [p.model for p in registry.providers_in_cost_tier("high")] == ["big"]
+
+
+def test_registry_hot_reloads_on_mtime_change(tmp_path):
+    """Test that edits to providers.json are picked up without a restart."""
+    providers_file = tmp_path / "providers.json"
+    providers_file.write_text(json.dumps([_provider("openrouter", "small")]))
+    registry = ProviderRegistry(providers_file, reload_interval=0)
+
+    providers_file.write_text(json.dumps([
+        _provider("openrouter", "small"),
+        _provider("requesty", "new-model"),
+    ]))
+    stat = providers_file.stat()
+    os.utime(providers_file, (stat.st_atime, stat.st_mtime + 10))
+
+    assert registry.get_provider("requesty", "new-model") is not None
+
+
+def test_invalid_reload_keeps_previous_catalog(tmp_path):
+    """Test that a malformed providers.json does not wipe the catalog."""
+    providers_file = tmp_path / "providers.json"
+    providers_file.write_text(json.dumps([_provider("openrouter", "small")]))
+    registry = ProviderRegistry(providers_file, reload_interval=0)
+    assert len(registry.list_providers()) == 1
+
+    providers_file.write_text("[{not json")
+    stat = providers_file.stat()
+    os.utime(providers_file, (stat.st_atime, stat.st_mtime + 10))
+
+    assert registry.get_provider("openrouter", "small") is not None
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from adaptive_llm_router.rate_limiter import (
+    ProviderLimiter,
+    RateLimitExceededError,
+    TokenBucket,
+)
+
+
+def test_token_bucket_wait_time():
+    """Test that the bucket reports how long until capacity refills."""
+    bucket = TokenBucket(rate_per_minute=60)
+    now = bucket.updated
+
+    assert bucket.wait_time(60, now) == 0
+    bucket.take(60)
+    assert bucket.wait_time(1, now) == pytest.approx(1.0)
+    assert bucket.wait_time(1, now + 1.0) == 0
+    # Oversized requests only wait for a full bucket.
+    assert bucket.wait_time(1000, now + 1.0) == pytest.approx(59.0)
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_holds_until_release():
+    """Test that max_concurrency blocks further requests until a slot is freed."""
+    limiter = ProviderLimiter(max_concurrency=1)
+    await limiter.acquire(10)
+
+    second = asyncio.create_task(limiter.acquire(10))
+    await asyncio.sleep(0.05)
+    assert not second.done()
+    assert limiter.stats.waiting == 1
+
+    limiter.release()
+    await second
+    assert limiter.stats.acquired == 2
+    assert limiter.stats.in_flight == 1
+
+
+@pytest.mark.asyncio
+async def test_request_waiting_too_long_is_rejected():
+    """Test that a request is rejected once it exceeds the maximum queueing delay."""
+    limiter = ProviderLimiter(requests_per_minute=1)
+    await limiter.acquire(10)
+
+    with pytest.raises(RateLimitExceededError):
+        await limiter.acquire(10, max_wait=0.05)
+    assert limiter.stats.rejected == 1
+    assert limiter.stats.waiting == 0
+
+
+@pytest.mark.asyncio
+async def test_waiters_are_served_in_arrival_order():
+    """Test that a small request does not overtake a larger one queued before it."""
+    limiter = ProviderLimiter(tokens_per_minute=6000)
+    await limiter.acquire(6000)
+    limiter.release()
+
+    order = []
+
+    async def request(name, tokens):
+        await limiter.acquire(tokens)
+        order.append(name)
+        limiter.release()
+
+    await asyncio.gather(request("large", 20), request("small", 1))
+    assert order == ["large", "small"]
+    assert limiter.stats.max_wait_seconds > 0
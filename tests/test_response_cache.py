@@ -0,0 +1,87 @@
+import threading
+import time
+from unittest.mock import patch
+
+from adaptive_llm_router.response_cache import ResponseCache, cache_key
+
+
+def test_exact_hit_ignores_whitespace_and_respects_model(tmp_path):
+    """Test that exact-tier keys normalize whitespace but not the model or flags."""
+    cache = ResponseCache(tmp_path / "cache.jsonl")
+    cache.set("Summarize   this\nrepo", "openrouter:qwen2-72b", {}, "summary")
+
+    assert cache.get("Summarize this repo", "openrouter:qwen2-72b", {}) == "summary"
+    assert cache.get("Summarize this repo", "openrouter:mistral-7b", {}) is None
+    assert cache.get("Summarize this repo", "openrouter:qwen2-72b", {"quality": "high"}) is None
+    assert cache_key("a", "m", {"task_id": "1"}) == cache_key("a", "m", {"task_id": "2"})
+
+
+def test_lru_eviction_and_ttl(tmp_path):
+    """Test that the cache stays within its size bound and expires entries."""
+    cache = ResponseCache(tmp_path / "cache.jsonl", max_entries=2)
+    cache.set("one", "m", {}, 1)
+    cache.set("two", "m", {}, 2)
+    cache.get("one", "m", {})
+    cache.set("three", "m", {}, 3)
+
+    assert len(cache) == 2
+    assert cache.get("two", "m", {}) is None
+    assert cache.get("one", "m", {}) == 1
+
+    short_lived = ResponseCache(None, ttl_seconds=0.01)
+    short_lived.set("one", "m", {}, 1)
+    time.sleep(0.02)
+    assert short_lived.get("one", "m", {}) is None
+
+
+def test_similarity_tier_matches_near_duplicates(tmp_path):
+    """Test that near-identical prompts hit the MinHash tier."""
+    cache = ResponseCache(tmp_path / "cache.jsonl", similarity_enabled=True, similarity_threshold=0.7)
+    base = " ".join(f"word{i}" for i in range(200))
+    cache.set(base + " please", "m", {}, "answer")
+
+    assert cache.get(base + " thanks", "m", {}) == "answer"
+    assert cache.similar_hits == 1
+    assert cache.get("a completely different question", "m", {}) is None
+
+
+def test_entries_survive_restart(tmp_path):
+    """Test that cached responses are reloaded from the on-disk store."""
+    cache_file = tmp_path / "cache.jsonl"
+    cache = ResponseCache(cache_file)
+    cache.set("hello", "m", {}, "world")
+    assert cache.flush()
+
+    assert ResponseCache(cache_file).get("hello", "m", {}) == "world"
+    assert "hello" not in cache_file.read_text()
+
+
+def test_store_is_written_off_the_calling_thread(tmp_path):
+    """Test that set leaves the file append to the background writer."""
+    cache = ResponseCache(tmp_path / "cache.jsonl")
+    append = cache._append
+    writers = []
+
+    def record_thread(batch):
+        writers.append(threading.current_thread())
+        append(batch)
+
+    with patch.object(cache, "_append", side_effect=record_thread):
+        cache.set("hello", "m", {}, "world")
+        assert cache.flush()
+
+    assert writers and threading.current_thread() not in writers
+    assert len((tmp_path / "cache.jsonl").read_text().splitlines()) == 1
+
+
+def test_store_is_compacted_to_live_entries(tmp_path):
+    """Test that overwriting one key many times compacts the store."""
+    cache_file = tmp_path / "cache.jsonl"
+    cache = ResponseCache(cache_file)
+    for i in range(150):
+        cache.set("hello", "m", {}, f"world {i}")
+        assert cache.flush()
+
+    assert len(cache_file.read_text().splitlines()) < 50
+    assert cache.file_bytes == cache_file.stat().st_size
+    assert ResponseCache(cache_file).get("hello", "m", {}) == "world 149"
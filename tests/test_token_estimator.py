@@ -0,0 +1,48 @@
+import pytest
+
+from adaptive_llm_router.token_estimator import TokenEstimator
+
+
+class CountingEncoding:
+    """Splits on whitespace and counts how often it is asked to encode."""
+
+    def __init__(self):
+        self.calls = 0
+
+    def encode(self, text):
+        self.calls += 1
+        return text.split()
+
+
+def test_heuristic_is_used_far_from_thresholds():
+    """Test that prompts far from every threshold are never encoded."""
+    encoding = CountingEncoding()
+    estimator = TokenEstimator(encoding=encoding)
+
+    assert estimator.estimate("word " * 100, thresholds=[8000]) == 125
+    assert encoding.calls == 0
+    assert estimator.heuristic_estimates == 1
+
+
+def test_exact_count_near_threshold_is_cached():
+    """Test that prompts near a threshold are encoded once and then served from the LRU."""
+    encoding = CountingEncoding()
+    estimator = TokenEstimator(encoding=encoding, cache_size=1)
+    prompt = "word " * 100
+
+    assert estimator.estimate(prompt, thresholds=[120]) == 100
+    assert estimator.estimate(prompt, thresholds=[120]) == 100
+    assert encoding.calls == 1
+    assert estimator.cache_hits == 1
+
+    estimator.estimate("other " * 100, thresholds=[150])
+    estimator.estimate(prompt, thresholds=[120])
+    assert encoding.calls == 3
+
+
+@pytest.mark.asyncio
+async def test_large_prompts_are_encoded_off_the_event_loop():
+    """Test that the async estimator gives the same exact count for offloaded prompts."""
+    estimator = TokenEstimator(encoding=CountingEncoding(), offload_bytes=10)
+
+    assert await estimator.estimate_async("word " * 100, thresholds=[120]) == 100
@@ -0,0 +1,75 @@
+import asyncio
+import json
+from unittest.mock import MagicMock
+
+import pytest
+
+from adaptive_llm_router.tracing import ChromeTraceExporter, OTLPJsonExporter, Tracer
+from analytics_371 import TrackExecution
+
+
+@pytest.mark.asyncio
+async def test_parent_propagates_across_await_and_tasks(tmp_path):
+    """Test that spans opened in awaited coroutines and child tasks get the right parent."""
+    tracer = Tracer(ChromeTraceExporter(tmp_path))
+
+    async def step(name):
+        with tracer.span(name):
+            await asyncio.sleep(0.01)
+
+    with tracer.span("root", task_id="t1") as root:
+        await step("awaited")
+        await asyncio.gather(step("fan_a"), step("fan_b"))
+    with tracer.span("other_root"):
+        pass
+
+    path = tracer.flush()
+    events = {e["name"]: e for e in json.loads(path.read_text())["traceEvents"]}
+    assert events["root"]["args"]["parent_id"] is None
+    assert events["root"]["args"]["task_id"] == "t1"
+    for name in ("awaited", "fan_a", "fan_b"):
+        assert events[name]["args"]["parent_id"] == root.span_id
+        assert events[name]["args"]["trace_id"] == root.trace_id
+        assert events[name]["dur"] >= 10000
+    assert events["other_root"]["args"]["trace_id"] != root.trace_id
+    assert tracer.current_span() is None
+
+
+def test_otlp_export_and_error_status(tmp_path):
+    """Test that the OTLP exporter writes parent IDs and marks failed spans."""
+    tracer = Tracer(OTLPJsonExporter(tmp_path))
+    with pytest.raises(ValueError):
+        with tracer.span("outer", retries=2):
+            with tracer.span("inner"):
+                raise ValueError("bad input")
+
+    spans = json.loads(tracer.flush().read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {s["name"]: s for s in spans}
+    assert by_name["inner"]["parentSpanId"] == by_name["outer"]["spanId"]
+    assert "parentSpanId" not in by_name["outer"]
+    assert by_name["outer"]["status"]["code"] == 2
+    assert {"key": "retries", "value": {"intValue": "2"}} in by_name["outer"]["attributes"]
+    assert int(by_name["inner"]["endTimeUnixNano"]) >= int(by_name["inner"]["startTimeUnixNano"])
+
+
+def test_spans_are_not_buffered_without_exporter():
+    tracer = Tracer()
+    with tracer.span("noop"):
+        pass
+    assert tracer.flush() is None
+
+
+def test_track_execution_reports_span_duration():
+    """Test that TrackExecution tracks the duration measured by its span."""
+    analytics = MagicMock()
+    with TrackExecution(analytics, "task-1", "CODE_GENERATION") as tracked:
+        tracked.set_attribute("files", 3)
+    args = analytics.track_agent_execution.call_args.args
+    assert args[:2] == ("task-1", "CODE_GENERATION")
+    assert args[2] == tracked.span.duration
+    assert tracked.span.attributes == {"task_id": "task-1", "files": 3}
+
+    with pytest.raises(RuntimeError):
+        with TrackExecution(analytics, "task-2", "CODE_GENERATION"):
+            raise RuntimeError("boom")
+    assert analytics.track_error.call_args.args[2] == "boom"
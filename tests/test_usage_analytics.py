@@ -0,0 +1,74 @@
+from datetime import datetime
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from adaptive_llm_router.data_models import LLMUsage
+from adaptive_llm_router.usage_analytics import ColumnarUsageStore
+from adaptive_llm_router.usage_ledger import UsageLedger
+
+
+def _usage(agent, model, cost, ts, status="ok"):
+    return LLMUsage(
+        provider="openrouter",
+        model=model,
+        tokens_in=100,
+        tokens_out=50,
+        cost=cost,
+        agent=agent,
+        status=status,
+        ts=ts,
+    )
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+    ledger.record_usage_batch([
+        _usage("qa_agent", "gpt-4o-mini", 0.5, datetime(2025, 7, 31, 23, 0)),
+        _usage("qa_agent", "gpt-4o-mini", 0.25, datetime(2025, 8, 1, 9, 0)),
+        _usage("qa_agent", "mistral-7b", 0.1, datetime(2025, 8, 1, 10, 0)),
+        _usage("cfo_cash", "gpt-4o-mini", 1.0, datetime(2025, 8, 2, 12, 0), status="fallback"),
+        _usage(None, "gpt-4o-mini", 0.0, datetime(2025, 8, 2, 12, 30), status="cache_hit"),
+    ])
+    return ledger
+
+
+def test_rollup_by_agent_and_day(ledger):
+    """Test that cost and tokens are summed per agent and day within the time range."""
+    store = ColumnarUsageStore(ledger)
+
+    rows = store.rollup(["agent", "day"], since="2025-08-01", until="2025-08-03")
+
+    assert rows == [
+        {"agent": "cfo_cash", "day": "2025-08-02", "requests": 1, "tokens_in": 100, "tokens_out": 50, "cost": 1.0},
+        {"agent": "qa_agent", "day": "2025-08-01", "requests": 2, "tokens_in": 200, "tokens_out": 100, "cost": pytest.approx(0.35)},
+        {"agent": None, "day": "2025-08-02", "requests": 1, "tokens_in": 100, "tokens_out": 50, "cost": 0.0},
+    ]
+
+
+def test_rollup_filters_on_dictionary_columns(ledger):
+    """Test that categorical filters accept single values and lists, and unknown values match nothing."""
+    store = ColumnarUsageStore(ledger)
+
+    assert store.rollup(["model"], status=["ok", "fallback"]) == [
+        {"model": "gpt-4o-mini", "requests": 3, "tokens_in": 300, "tokens_out": 150, "cost": 1.75},
+        {"model": "mistral-7b", "requests": 1, "tokens_in": 100, "tokens_out": 50, "cost": pytest.approx(0.1)},
+    ]
+    assert store.rollup(["model"], agent="nobody") == []
+
+
+def test_refresh_only_converts_new_records(ledger, tmp_path):
+    """Test that column files are extended incrementally as the ledger grows."""
+    store = ColumnarUsageStore(ledger)
+    assert store.refresh() == 5
+    assert store.refresh() == 0
+
+    ledger.record_usage(_usage("qa_agent", "qwen2-72b", 2.0, datetime(2025, 8, 3)))
+    assert store.refresh() == 1
+
+    # A fresh store over the same files sees every row and the same codes.
+    totals = ColumnarUsageStore(ledger).load(refresh=False).rollup()
+    assert totals[0]["requests"] == 6
+    assert totals[0]["cost"] == pytest.approx(3.85)
@@ -0,0 +1,184 @@
+import json
+import threading
+import time
+from datetime import datetime
+from unittest.mock import MagicMock, patch
+
+from adaptive_llm_router.data_models import LLMUsage
+from adaptive_llm_router.ledger_storage import LedgerStorage
+from adaptive_llm_router.usage_ledger import UsageLedger
+
+
+def _usage(cost: float, ts: datetime = None) -> LLMUsage:
+    data = dict(provider="openrouter", model="qwen2-72b", tokens_in=10, tokens_out=20, cost=cost)
+    if ts:
+        data["ts"] = ts
+    return LLMUsage(**data)
+
+
+def test_records_are_appended_to_monthly_segments(tmp_path):
+    """Test that records land in one JSONL segment per month."""
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+
+    ledger.record_usage(_usage(0.5, datetime(2025, 7, 31, 23, 59)))
+    ledger.record_usage(_usage(0.25, datetime(2025, 8, 1, 0, 1)))
+    ledger.record_usage(_usage(0.25, datetime(2025, 8, 2)))
+    ledger.storage.close()
+
+    assert ledger.storage.list_segments() == ["2025-07", "2025-08"]
+    august = ledger.storage.segment_path("2025-08").read_text().splitlines()
+    assert len(august) == 2
+    assert json.loads(august[0])["cost"] == 0.25
+
+
+def test_current_month_total_reads_only_current_segment(tmp_path):
+    """Test that the monthly total ignores records from other months."""
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+
+    ledger.record_usage(_usage(1.0, datetime(2020, 1, 1)))
+    ledger.record_usage(_usage(0.5))
+    ledger.record_usage(_usage(0.25))
+
+    assert ledger.get_total_cost_for_current_month() == 0.75
+
+
+def test_legacy_json_ledger_is_imported_once(tmp_path):
+    """Test that the legacy JSON array is migrated into segments exactly once."""
+    legacy = tmp_path / "llm_usage.json"
+    legacy.write_text(json.dumps([
+        _usage(0.1, datetime(2025, 8, 11)).model_dump(mode="json"),
+        _usage(0.2, datetime(2025, 8, 12)).model_dump(mode="json"),
+    ]))
+
+    first = UsageLedger(legacy)
+    list(first.iter_records())
+    first.storage.close()
+    ledger = UsageLedger(legacy)
+
+    records = list(ledger.iter_records("2025-08"))
+    assert [r["cost"] for r in records] == [0.1, 0.2]
+
+
+def test_torn_trailing_line_is_skipped(tmp_path):
+    """Test that a partially written final line does not break reads."""
+    storage = LedgerStorage(tmp_path)
+    storage.append({"ts": "2025-08-01T00:00:00", "cost": 1.0})
+    storage.close()
+    with open(storage.segment_path("2025-08"), "a") as f:
+        f.write('{"ts": "2025-08-01T00:00:01", "co')
+
+    assert [r["cost"] for r in storage.iter_records()] == [1.0]
+
+
+def test_monthly_total_is_seeded_from_checkpoint(tmp_path):
+    """Test that a cold start resumes from the persisted spend checkpoint."""
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+    ledger.record_usage(_usage(0.5))
+    ledger.record_usage(_usage(0.25))
+    ledger.spend.checkpoint()
+
+    segment_key = LedgerStorage.segment_key_for(datetime.now())
+    checkpoint = json.loads((ledger.storage.segment_dir / "spend_checkpoint.json").read_text())
+    assert checkpoint["segments"][segment_key]["offset"] == ledger.storage.segment_size(segment_key)
+
+    restarted = UsageLedger(tmp_path / "llm_usage.json")
+    assert restarted.get_total_cost_for_current_month() == 0.75
+
+
+def test_monthly_total_includes_appends_from_other_writers(tmp_path):
+    """Test that a checkpoint folds in records appended by another process."""
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+    other = UsageLedger(tmp_path / "llm_usage.json")
+
+    ledger.record_usage(_usage(0.5))
+    other.record_usage(_usage(0.25))
+    ledger.spend.checkpoint()
+
+    assert ledger.get_total_cost_for_current_month() == 0.75
+
+
+def test_checkpoint_during_append_does_not_double_count(tmp_path):
+    """Test that a checkpoint racing an append counts the record once."""
+    ledger = UsageLedger(tmp_path / "llm_usage.json")
+    spend = ledger.spend
+    append_many = ledger.storage.append_many
+    checkpointer = threading.Thread(target=spend.checkpoint)
+
+    def append_then_checkpoint(records):
+        append_many(records)
+        checkpointer.start()
+        checkpointer.join(timeout=0.2)
+
+    with patch.object(ledger.storage, "append_many", side_effect=append_then_checkpoint):
+        ledger.record_usage(_usage(0.5))
+    checkpointer.join()
+
+    assert ledger.get_total_cost_for_current_month() == 0.5
+
+
+def test_usage_event_is_captured_with_distinct_id(tmp_path):
+    """Test that usage events use posthog's capture(distinct_id, event, properties) shape."""
+    client = MagicMock()
+    ledger = UsageLedger(tmp_path / "llm_usage.json", posthog_client=client)
+
+    ledger.record_usage(_usage(0.5))
+
+    kwargs = client.capture.call_args.kwargs
+    assert kwargs["event"] == "llm_usage"
+    assert kwargs["distinct_id"] == "system"
+    assert kwargs["properties"]["cost"] == 0.5
+
+
+def test_idle_appends_are_synced_by_timer(tmp_path):
+    """Test that a batch smaller than the fsync batch size is still synced once traffic stops."""
+    # A frozen clock keeps the append from syncing inline however slow the
+    # test runs, so only the timer can sync it.
+    storage = LedgerStorage(tmp_path, fsync_batch_size=100, fsync_interval=0.05, clock=lambda: 1000.0)
+    with patch.object(storage, "_sync_locked", wraps=storage._sync_locked) as sync:
+        storage.append({"ts": "2025-08-01T00:00:00", "cost": 1.0})
+        assert sync.call_count == 0
+        deadline = time.monotonic() + 5.0
+        while storage._unsynced and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert storage._unsynced == 0
+        assert sync.call_count == 1
+    storage.close()
+
+
+def test_append_after_torn_line_is_not_lost(tmp_path):
+    """Test that a record appended after an interrupted write is read back, not glued to the torn line."""
+    storage = LedgerStorage(tmp_path)
+    storage.segment_path("2025-08").write_bytes(
+        b'{"ts":"2025-08-01T00:00:00","cost":1.0}\n{"ts":"2025-08-01T00:00:01","co'
+    )
+    records = list(storage.iter_records_from("2025-08"))
+    assert [record["cost"] for record, _ in records] == [1.0]
+
+    storage.append({"ts": "2025-08-02T00:00:00", "cost": 2.0})
+    resumed = list(storage.iter_records_from("2025-08", records[-1][1]))
+    assert [record["cost"] for record, _ in resumed] == [2.0]
+    assert [record["cost"] for record in storage.iter_records("2025-08")] == [1.0, 2.0]
+    storage.close()
+
+
+def test_concurrent_legacy_imports_run_once(tmp_path):
+    """Test that processes opening the ledger together import the legacy file only once."""
+    legacy = tmp_path / "llm_usage.json"
+    legacy.write_text(json.dumps([_usage(0.01, datetime(2025, 8, 11)).model_dump(mode="json")] * 50))
+    barrier = threading.Barrier(4)
+    imported = []
+
+    def open_ledger():
+        storage = LedgerStorage(tmp_path / "llm_usage")
+        barrier.wait()
+        imported.append(storage.import_legacy(legacy))
+        storage.close()
+
+    threads = [threading.Thread(target=open_ledger) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(imported) == [0, 0, 0, 50]
+    assert len(list(LedgerStorage(tmp_path / "llm_usage").iter_records())) == 50